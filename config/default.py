@@ -34,7 +34,15 @@ SQLALCHEMY_TRACK_MODIFICATIONS = False
 ASSETS_LOAD_DIR = os.path.join(base, "skylines", "frontend", "static")
 
 SKYLINES_FILES_PATH = os.path.join(base, "htdocs", "files")
-SKYLINES_ELEVATION_PATH = os.path.join(base, "htdocs", "srtm")
+
+# compression of new IGC files (None or "gzip"). The files are decompressed
+# transparently, so this can be changed at any time.
+SKYLINES_FILES_COMPRESSION = None
+
+# directory with the unzipped SRTM `.hgt` tiles (see `srtm/extract.sh`). If it
+# does not exist or a tile is missing, the elevations are looked up in the
+# `elevations` table.
+SKYLINES_ELEVATION_PATH = os.path.join(base, "srtm", "unzipped")
 SKYLINES_MAPSERVER_PATH = os.path.join(base, "mapserver")
 
 SKYLINES_TEMPORARY_DIR = "/tmp"
@@ -42,12 +50,40 @@ SKYLINES_TEMPORARY_DIR = "/tmp"
 # how many entries should a list have?
 SKYLINES_LISTS_DISPLAY_LENGTH = 50
 
+# how long the number of entries of a list is cached (in seconds)
+SKYLINES_LISTS_COUNT_CACHE_TIMEOUT = 300
+
 SKYLINES_MAP_TILE_URL = "https://www.skylines.aero/mapproxy"
 
 BROKER_URL = "redis://localhost:6379/0"
 CELERY_RESULT_BACKEND = "redis://localhost:6379/0"
 CELERYD_LOG_LEVEL = "INFO"
 
+# pilot lookup cache of the live tracking server
+SKYLINES_TRACKING_CACHE_SIZE = 10000
+SKYLINES_TRACKING_CACHE_TTL = 300  # seconds
+
+# write-behind queue of the live tracking server
+SKYLINES_TRACKING_BATCH_SIZE = 100  # fixes per INSERT
+SKYLINES_TRACKING_BATCH_INTERVAL = 0.5  # seconds
+SKYLINES_TRACKING_QUEUE_SIZE = 10000  # fixes
+
+# radius of traffic requests for nearby pilots
+SKYLINES_TRACKING_TRAFFIC_RADIUS = 50000  # meters
+
+# used by the API to tell the tracking server about changed tracking keys
+SKYLINES_TRACKING_REDIS_URL = "redis://localhost:6379/0"
+
+# fraction of the received packets that the tracking server logs
+SKYLINES_TRACKING_LOG_RATE = 1.0
+
+# local HTTP address serving the counters and latencies of the tracking server
+SKYLINES_TRACKING_STATS_ADDRESS = "127.0.0.1:5598"
+
+# number of processes analysing the files of ZIP uploads in parallel,
+# the files are analysed by the request handler if this is not set
+SKYLINES_UPLOAD_PROCESSES = None
+
 # limits for AnalyseFlight
 SKYLINES_ANALYSIS_ITER = 10e6  # iteration limit, should be around 10e6 to 50e6
 SKYLINES_ANALYSIS_MEMORY = 256  # approx memory limit in MB
@@ -66,3 +102,15 @@ SKYLINES_AIRSPACE_CHECK = (
     "TMZ",
     "MATZ",
 )
+
+# directory in which the in-memory indexes of the airspace and the timezones
+# are cached for other processes, if set
+SKYLINES_INDEX_PATH = None
+
+# look up the timezones of the flights in an in-memory index instead of the
+# tz_world table
+SKYLINES_TIMEZONE_INDEX = True
+
+# the in-memory indexes of the airspace, the map items and the airports are
+# checked for changes of their tables at most this often (in seconds)
+SKYLINES_INDEX_CHECK_INTERVAL = 60
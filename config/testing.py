@@ -7,3 +7,8 @@ TESTING = True
 SQLALCHEMY_DATABASE_URI = "postgresql:///skylines_test"
 SQLALCHEMY_ECHO = False
 SKYLINES_FILES_PATH = mkdtemp(suffix="skylines-uploads")
+
+SKYLINES_TRACKING_REDIS_URL = None
+SKYLINES_TRACKING_STATS_ADDRESS = None
+SKYLINES_INDEX_CHECK_INTERVAL = 0
+SKYLINES_LISTS_COUNT_CACHE_TIMEOUT = None
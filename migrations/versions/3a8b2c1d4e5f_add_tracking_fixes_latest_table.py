@@ -0,0 +1,41 @@
+# revision identifiers, used by Alembic.
+revision = "3a8b2c1d4e5f"
+down_revision = "70a6f5e6f0e1"
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.types import DateTime, Integer
+
+
+def upgrade():
+    op.create_table(
+        "tracking_fixes_latest",
+        sa.Column("pilot_id", Integer(), nullable=False),
+        sa.Column("fix_id", Integer(), nullable=False),
+        sa.Column("time", DateTime(), nullable=False),
+        sa.Column("time_visible", DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["pilot_id"], ["users.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["fix_id"], ["tracking_fixes.id"], ondelete="CASCADE"),
+        sa.PrimaryKeyConstraint("pilot_id"),
+    )
+    op.create_index(
+        "ix_tracking_fixes_latest_time",
+        "tracking_fixes_latest",
+        ["time"],
+        unique=False,
+    )
+
+    op.execute(
+        """
+        INSERT INTO tracking_fixes_latest (pilot_id, fix_id, time, time_visible)
+        SELECT DISTINCT ON (pilot_id) pilot_id, id, time, time_visible
+        FROM tracking_fixes
+        WHERE location IS NOT NULL
+        ORDER BY pilot_id, time DESC
+        """
+    )
+
+
+def downgrade():
+    op.drop_index("ix_tracking_fixes_latest_time", table_name="tracking_fixes_latest")
+    op.drop_table("tracking_fixes_latest")
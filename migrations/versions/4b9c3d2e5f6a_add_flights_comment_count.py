@@ -0,0 +1,25 @@
+# revision identifiers, used by Alembic.
+revision = "4b9c3d2e5f6a"
+down_revision = "3a8b2c1d4e5f"
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column("flights", sa.Column("comment_count", sa.Integer()))
+
+    op.execute(
+        """
+        UPDATE flights SET comment_count = (
+            SELECT count(*) FROM flight_comments
+            WHERE flight_comments.flight_id = flights.id
+        )
+        """
+    )
+
+    op.alter_column("flights", "comment_count", nullable=False)
+
+
+def downgrade():
+    op.drop_column("flights", "comment_count")
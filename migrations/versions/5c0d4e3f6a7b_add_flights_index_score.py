@@ -0,0 +1,34 @@
+# revision identifiers, used by Alembic.
+revision = "5c0d4e3f6a7b"
+down_revision = "4b9c3d2e5f6a"
+
+from alembic import op
+import sqlalchemy as sa
+
+
+def upgrade():
+    op.add_column("flights", sa.Column("index_score", sa.Float()))
+
+    op.execute(
+        """
+        UPDATE flights SET index_score = CASE
+            WHEN models.dmst_index > 0
+            THEN flights.olc_plus_score * 100.0 / models.dmst_index
+            ELSE flights.olc_plus_score
+        END
+        FROM flights AS f LEFT OUTER JOIN models ON models.id = f.model_id
+        WHERE f.id = flights.id
+        """
+    )
+
+    op.create_index(
+        "flights_date_local_index_score",
+        "flights",
+        ["date_local", "index_score"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("flights_date_local_index_score", table_name="flights")
+    op.drop_column("flights", "index_score")
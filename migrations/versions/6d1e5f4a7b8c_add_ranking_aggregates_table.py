@@ -0,0 +1,54 @@
+# revision identifiers, used by Alembic.
+revision = "6d1e5f4a7b8c"
+down_revision = "5c0d4e3f6a7b"
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.types import Float, Integer, SmallInteger
+
+
+def upgrade():
+    op.create_table(
+        "ranking_aggregates",
+        sa.Column("kind", SmallInteger(), nullable=False),
+        sa.Column("year", Integer(), nullable=False),
+        sa.Column("subject_id", Integer(), nullable=False),
+        sa.Column("count", Integer(), nullable=False),
+        sa.Column("total", Float(), nullable=True),
+        sa.PrimaryKeyConstraint("kind", "year", "subject_id"),
+    )
+    op.create_index(
+        "ranking_aggregates_kind_year_total",
+        "ranking_aggregates",
+        ["kind", "year", "total"],
+        unique=False,
+    )
+
+    # used to recalculate the rows of an airport
+    op.create_index(
+        "ix_flights_takeoff_airport_id",
+        "flights",
+        ["takeoff_airport_id"],
+        unique=False,
+    )
+
+    # privacy_level 0 is public, kind 0-2 are pilots, clubs and airports
+    for kind, column in enumerate(["pilot_id", "club_id", "takeoff_airport_id"]):
+        op.execute(
+            """
+            INSERT INTO ranking_aggregates (kind, year, subject_id, count, total)
+            SELECT {kind}, CAST(date_part('year', date_local) AS INTEGER),
+                   {column}, count(id), sum(index_score)
+            FROM flights
+            WHERE privacy_level = 0 AND {column} IS NOT NULL
+            GROUP BY 2, 3
+            """.format(
+                kind=kind, column=column
+            )
+        )
+
+
+def downgrade():
+    op.drop_index("ix_flights_takeoff_airport_id", table_name="flights")
+    op.drop_index("ranking_aggregates_kind_year_total", table_name="ranking_aggregates")
+    op.drop_table("ranking_aggregates")
@@ -0,0 +1,78 @@
+# revision identifiers, used by Alembic.
+revision = "7e2f6a5b8c9d"
+down_revision = "6d1e5f4a7b8c"
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.types import BigInteger, Integer, SmallInteger
+
+
+def upgrade():
+    op.create_table(
+        "statistics_pilots",
+        sa.Column("kind", SmallInteger(), nullable=False),
+        sa.Column("subject_id", Integer(), nullable=False),
+        sa.Column("year", Integer(), nullable=False),
+        sa.Column("pilot_id", Integer(), nullable=False),
+        sa.Column("flights", Integer(), nullable=False),
+        sa.Column("distance", BigInteger(), nullable=False),
+        sa.Column("duration", BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("kind", "subject_id", "year", "pilot_id"),
+    )
+    op.create_table(
+        "statistics_rollups",
+        sa.Column("kind", SmallInteger(), nullable=False),
+        sa.Column("subject_id", Integer(), nullable=False),
+        sa.Column("year", Integer(), nullable=False),
+        sa.Column("flights", Integer(), nullable=False),
+        sa.Column("pilots", Integer(), nullable=False),
+        sa.Column("distance", BigInteger(), nullable=False),
+        sa.Column("duration", BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint("kind", "subject_id", "year"),
+    )
+
+    # kind 0-2 are pilots, clubs and airports, 3 is global. Year 0 covers all
+    # years, pilot 0 the flights without a registered pilot. privacy_level 0
+    # is public.
+    subjects = [(0, "pilot_id"), (1, "club_id"), (2, "takeoff_airport_id"), (3, "0")]
+    years = ["CAST(date_part('year', date_local) AS INTEGER)", "0"]
+
+    for kind, subject in subjects:
+        for year in years:
+            # constants can't be grouped by
+            group_by = [c for c in (subject, year) if c != "0"]
+
+            op.execute(
+                """
+                INSERT INTO statistics_pilots
+                    (kind, subject_id, year, pilot_id, flights, distance, duration)
+                SELECT {kind}, {subject}, {year}, coalesce(pilot_id, 0), count(id),
+                       coalesce(sum(olc_classic_distance), 0),
+                       coalesce(sum(EXTRACT(epoch FROM landing_time - takeoff_time)), 0)
+                FROM flights
+                WHERE privacy_level = 0 AND {subject} IS NOT NULL
+                GROUP BY {group_by}
+                """.format(
+                    kind=kind,
+                    subject=subject,
+                    year=year,
+                    group_by=", ".join(group_by + ["coalesce(pilot_id, 0)"]),
+                )
+            )
+
+    op.execute(
+        """
+        INSERT INTO statistics_rollups
+            (kind, subject_id, year, flights, pilots, distance, duration)
+        SELECT kind, subject_id, year, sum(flights),
+               sum(CASE WHEN pilot_id != 0 THEN 1 ELSE 0 END),
+               sum(distance), sum(duration)
+        FROM statistics_pilots
+        GROUP BY kind, subject_id, year
+        """
+    )
+
+
+def downgrade():
+    op.drop_table("statistics_rollups")
+    op.drop_table("statistics_pilots")
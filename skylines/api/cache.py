@@ -1,3 +1,3 @@
-from flask_caching import Cache
+# flake8: noqa
 
-cache = Cache()
+from skylines.lib.cache import cache
@@ -4,6 +4,7 @@ from skylines.api.json import jsonify
 from skylines.database import db
 from skylines.api.oauth import oauth
 from skylines.model import User
+from skylines.tracking.cache import invalidate_tracking_keys
 
 account_blueprint = Blueprint("account", "skylines")
 
@@ -26,4 +27,6 @@ def delete_account():
     current_user.delete()
     db.session.commit()
 
+    invalidate_tracking_keys(current_user.tracking_key)
+
     return jsonify()
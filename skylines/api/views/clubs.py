@@ -7,6 +7,7 @@ from skylines.api.oauth import oauth
 from skylines.lib.dbutil import get_requested_record
 from skylines.model import Club, User
 from skylines.model.notification import create_club_join_event
+from skylines.tracking.cache import invalidate_tracking_keys
 
 from skylines.schemas import ClubSchema, ValidationError
 
@@ -70,6 +71,8 @@ def create_club():
 
     db.session.commit()
 
+    invalidate_tracking_keys(current_user.tracking_key)
+
     return jsonify(id=club.id)
 
 
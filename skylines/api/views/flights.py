@@ -1,9 +1,9 @@
 import math
-from datetime import datetime, timedelta
+from datetime import datetime
 
-from flask import Blueprint, request, abort, current_app, make_response
+from flask import Blueprint, request, abort, current_app, make_response, g
 
-from sqlalchemy import func, literal_column
+from sqlalchemy import func
 from sqlalchemy.sql.expression import or_, and_
 from sqlalchemy.orm import joinedload, contains_eager, undefer_group
 from sqlalchemy.orm.util import aliased
@@ -12,16 +12,14 @@ from redis.exceptions import ConnectionError
 
 from skylines.api.json import jsonify
 from skylines.database import db
-from skylines.api.cache import cache
 from skylines.api.oauth import oauth
 from skylines.lib import files
 from skylines.lib.types import is_string
-from skylines.lib.table_tools import Pager, Sorter
+from skylines.lib.table_tools import Pager, Sorter, cached_count
 from skylines.lib.dbutil import get_requested_record
-from skylines.lib.xcsoar_ import analyse_flight
+from skylines.lib.xcsoar_ import analyse_flight, encoded_path
 from skylines.lib.datetime import from_seconds_of_day
 from skylines.lib.geo import METERS_PER_DEGREE
-from skylines.lib.geoid import egm96_height
 from skylines.model import (
     User,
     Club,
@@ -32,9 +30,10 @@ from skylines.model import (
     FlightComment,
     Notification,
     Event,
-    Elevation,
     Location,
     FlightMeetings,
+    RankingAggregate,
+    StatisticsRollup,
 )
 from skylines.model.notification import create_flight_comment_notifications
 from skylines.schemas import (
@@ -52,8 +51,6 @@ from skylines.schemas import (
 )
 from skylines.worker import tasks
 
-import xcsoar
-
 flights_blueprint = Blueprint("flights", "skylines")
 
 
@@ -82,31 +79,12 @@ def _create_list(
     pilot_alias = aliased(User, name="pilot")
     owner_alias = aliased(User, name="owner")
 
-    subq = (
-        db.session.query(FlightComment.flight_id, func.count("*").label("count"))
-        .group_by(FlightComment.flight_id)
-        .subquery()
-    )
-
     current_user = User.get(request.user_id) if request.user_id else None
 
     flights = (
-        db.session.query(Flight, subq.c.count)
+        db.session.query(Flight)
         .filter(Flight.is_listable(current_user))
         .join(Flight.igc_file)
-        .options(contains_eager(Flight.igc_file))
-        .join(owner_alias, IGCFile.owner)
-        .options(contains_eager(Flight.igc_file, IGCFile.owner, alias=owner_alias))
-        .outerjoin(pilot_alias, Flight.pilot)
-        .options(contains_eager(Flight.pilot, alias=pilot_alias))
-        .options(joinedload(Flight.co_pilot))
-        .outerjoin(Flight.club)
-        .options(contains_eager(Flight.club))
-        .outerjoin(Flight.takeoff_airport)
-        .options(contains_eager(Flight.takeoff_airport))
-        .outerjoin(Flight.model)
-        .options(contains_eager(Flight.model))
-        .outerjoin((subq, Flight.comments))
     )
 
     if date:
@@ -126,6 +104,25 @@ def _create_list(
     if filter is not None:
         flights = flights.filter(filter)
 
+    # the joins below don't change the number of rows, so they are left out
+    # of the count
+    flights_count = cached_count(flights)
+
+    flights = (
+        flights.options(contains_eager(Flight.igc_file))
+        .join(owner_alias, IGCFile.owner)
+        .options(contains_eager(Flight.igc_file, IGCFile.owner, alias=owner_alias))
+        .outerjoin(pilot_alias, Flight.pilot)
+        .options(contains_eager(Flight.pilot, alias=pilot_alias))
+        .options(joinedload(Flight.co_pilot))
+        .outerjoin(Flight.club)
+        .options(contains_eager(Flight.club))
+        .outerjoin(Flight.takeoff_airport)
+        .options(contains_eager(Flight.takeoff_airport))
+        .outerjoin(Flight.model)
+        .options(contains_eager(Flight.model))
+    )
+
     valid_columns = {
         "date": getattr(Flight, "date_local"),
         "score": getattr(Flight, "index_score"),
@@ -137,8 +134,6 @@ def _create_list(
         "time": getattr(Flight, "takeoff_time"),
     }
 
-    flights_count = flights.count()
-
     flights = Sorter.sort(
         flights,
         "flights",
@@ -147,24 +142,43 @@ def _create_list(
         default_order=default_sorting_order,
     )
 
-    flights = flights.order_by(Flight.index_score.desc())
+    # the flight id makes the order unique, which is needed for the cursor
+    flights = flights.order_by(Flight.index_score.desc(), Flight.id.desc())
+
+    keys = g.sorters["flights"].keys() + [
+        (Flight.index_score, "desc"),
+        (Flight.id, "desc"),
+    ]
+
+    items_per_page = int(current_app.config.get("SKYLINES_LISTS_DISPLAY_LENGTH", 50))
 
     flights = Pager.paginate(
         flights,
         "flights",
-        items_per_page=int(current_app.config.get("SKYLINES_LISTS_DISPLAY_LENGTH", 50)),
+        items_per_page=items_per_page,
+        count=flights_count,
+        keys=keys,
     )
 
+    # fetch one more row to find out if there is a next page
+    flights = flights.limit(items_per_page + 1).all()
+    has_next = len(flights) > items_per_page
+    flights = flights[:items_per_page]
+
     flight_schema = FlightSchema()
     flights_json = []
-    for f, num_comments in flights:
+    for f in flights:
         flight = flight_schema.dump(f).data
         flight["private"] = not f.is_rankable()
-        flight["numComments"] = num_comments
+        flight["numComments"] = f.comment_count
         flights_json.append(flight)
 
     json = dict(flights=flights_json, count=flights_count)
 
+    # the cursor of the next page, if there is one
+    if has_next:
+        json["nextCursor"] = flights[-1].id
+
     if date:
         json["date"] = date.isoformat()
 
@@ -307,116 +321,6 @@ def _patch_query(q):
     )
 
 
-def _get_flight_path(flight, threshold=0.001, max_points=3000):
-    num_levels = 4
-    zoom_factor = 4
-    zoom_levels = [0]
-    zoom_levels.extend(
-        [
-            round(
-                -math.log(
-                    32.0 / 45.0 * (threshold * pow(zoom_factor, num_levels - i - 1)), 2
-                )
-            )
-            for i in range(1, num_levels)
-        ]
-    )
-
-    xcsoar_flight = xcsoar.Flight(files.filename_to_path(flight.igc_file.filename))
-
-    if flight.qnh:
-        xcsoar_flight.setQNH(flight.qnh)
-
-    begin = flight.takeoff_time - timedelta(seconds=2 * 60)
-    end = flight.landing_time + timedelta(seconds=2 * 60)
-
-    if begin > end:
-        begin = datetime.min
-        end = datetime.max
-
-    xcsoar_flight.reduce(
-        begin=begin,
-        end=end,
-        num_levels=num_levels,
-        zoom_factor=zoom_factor,
-        threshold=threshold,
-        max_points=max_points,
-    )
-
-    encoded_flight = xcsoar_flight.encode()
-
-    points = encoded_flight["locations"]
-    barogram_t = encoded_flight["times"]
-    barogram_h = encoded_flight["altitude"]
-    enl = encoded_flight["enl"]
-
-    elevations_t, elevations_h = _get_elevations(flight)
-    contest_traces = _get_contest_traces(flight)
-
-    geoid_height = (
-        egm96_height(flight.takeoff_location) if flight.takeoff_location else 0
-    )
-
-    return dict(
-        points=points,
-        barogram_t=barogram_t,
-        barogram_h=barogram_h,
-        enl=enl,
-        contests=contest_traces,
-        elevations_t=elevations_t,
-        elevations_h=elevations_h,
-        sfid=flight.id,
-        geoid=geoid_height,
-    )
-
-
-def _get_elevations(flight):
-    elevations = get_elevations_for_flight(flight)
-
-    # Encode lists
-    elevations_t = xcsoar.encode([t for t, h in elevations], method="signed")
-    elevations_h = xcsoar.encode([h for t, h in elevations], method="signed")
-
-    return elevations_t, elevations_h
-
-
-def _get_contest_traces(flight):
-    contests = [
-        dict(contest_type="olc_plus", trace_type="triangle"),
-        dict(contest_type="olc_plus", trace_type="classic"),
-    ]
-
-    contest_traces = []
-
-    for contest in contests:
-        contest_trace = flight.get_optimised_contest_trace(
-            contest["contest_type"], contest["trace_type"]
-        )
-        if not contest_trace:
-            continue
-
-        fixes = [(x.latitude, x.longitude) for x in contest_trace.locations]
-        times = []
-        for time in contest_trace.times:
-            times.append(
-                flight.takeoff_time.hour * 3600
-                + flight.takeoff_time.minute * 60
-                + flight.takeoff_time.second
-                + (time - flight.takeoff_time).days * 86400
-                + (time - flight.takeoff_time).seconds
-            )
-
-        contest_traces.append(
-            dict(
-                name=contest["contest_type"] + " " + contest["trace_type"],
-                turnpoints=xcsoar.encode(fixes, floor=1e5, method="double"),
-                times=xcsoar.encode(times, method="signed"),
-            )
-        )
-
-    return contest_traces
-
-
 def mark_flight_notifications_read(flight):
     if not request.user_id:
         return
@@ -555,7 +459,7 @@ def json(flight_id):
     ):
         return ("", 304)
 
-    trace = _get_flight_path(flight, threshold=0.0001, max_points=10000)
+    trace = encoded_path.get_flight_path(flight)
     if not trace:
         abort(404)
 
@@ -679,7 +583,7 @@ def near(flight_id):
     flights = _get_near_flights(flight, location, time, 1000)
 
     def add_flight_path(flight):
-        trace = _get_flight_path(flight, threshold=0.0001, max_points=10000)
+        trace = encoded_path.get_flight_path(flight)
         trace["additional"] = dict(
             registration=flight.registration, competition_id=flight.competition_id
         )
@@ -707,6 +611,11 @@ def update(flight_id):
     except ValidationError as e:
         return jsonify(error="validation-failed", fields=e.messages), 422
 
+    # the ranking and statistics rows of the flight before and after the
+    # changes
+    ranking_keys = RankingAggregate.keys(flight)
+    statistics_keys = StatisticsRollup.keys(flight)
+
     if "pilot_id" in data:
         pilot_id = data["pilot_id"]
 
@@ -787,6 +696,10 @@ def update(flight_id):
             current_app.logger.info("Cannot connect to Redis server")
 
     flight.time_modified = datetime.utcnow()
+    db.session.flush()
+
+    RankingAggregate.update(ranking_keys + RankingAggregate.keys(flight))
+    StatisticsRollup.update(statistics_keys + StatisticsRollup.keys(flight))
     db.session.commit()
 
     return jsonify()
@@ -803,9 +716,17 @@ def delete(flight_id):
     if not flight.is_writable(current_user):
         abort(403)
 
+    ranking_keys = RankingAggregate.keys(flight)
+    statistics_keys = StatisticsRollup.keys(flight)
+
+    encoded_path.invalidate(flight)
     files.delete_file(flight.igc_file.filename)
     db.session.delete(flight)
     db.session.delete(flight.igc_file)
+    db.session.flush()
+
+    RankingAggregate.update(ranking_keys)
+    StatisticsRollup.update(statistics_keys)
     db.session.commit()
 
     return jsonify()
@@ -839,72 +760,3 @@ def add_comment(flight_id):
     db.session.commit()
 
     return jsonify()
-
-
-def get_elevations_for_flight(flight):
-    cached_elevations = cache.get("elevations_" + flight.__repr__())
-    if cached_elevations:
-        return cached_elevations
-
-    """
-    WITH src AS
-        (SELECT ST_DumpPoints(flights.locations) AS location,
-                flights.timestamps AS timestamps,
-                flights.locations AS locations
-        FROM flights
-        WHERE flights.id = 30000)
-    SELECT timestamps[(src.location).path[1]] AS timestamp,
-           ST_Value(elevations.rast, (src.location).geom) AS elevation
-    FROM elevations, src
-    WHERE src.locations && elevations.rast AND (src.location).geom && elevations.rast;
-    """
-
-    # Prepare column expressions
-    location = Flight.locations.ST_DumpPoints()
-
-    # Prepare cte
-    cte = (
-        db.session.query(
-            location.label("location"),
-            Flight.locations.label("locations"),
-            Flight.timestamps.label("timestamps"),
-        )
-        .filter(Flight.id == flight.id)
-        .cte()
-    )
-
-    # Prepare column expressions
-    timestamp = literal_column("timestamps[(location).path[1]]")
-    elevation = Elevation.rast.ST_Value(cte.c.location.geom)
-
-    # Prepare main query
-    q = (
-        db.session.query(timestamp.label("timestamp"), elevation.label("elevation"))
-        .filter(
-            and_(
-                cte.c.locations.intersects(Elevation.rast),
-                cte.c.location.geom.intersects(Elevation.rast),
-            )
-        )
-        .all()
-    )
-
-    if len(q) == 0:
-        return []
-
-    start_time = q[0][0]
-    start_midnight = start_time.replace(hour=0, minute=0, second=0, microsecond=0)
-
-    elevations = []
-    for time, elevation in q:
-        if elevation is None:
-            continue
-
-        time_delta = time - start_midnight
-        time = time_delta.days * 86400 + time_delta.seconds
-
-        elevations.append((time, elevation))
-
-    cache.set("elevations_" + flight.__repr__(), elevations, timeout=3600 * 24)
-
-    return elevations
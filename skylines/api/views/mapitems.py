@@ -2,8 +2,8 @@ from flask import Blueprint, request
 
 from skylines.api.json import jsonify
 from skylines.api.args import parse_location
+from skylines.lib import mapitems
 from skylines.schemas import AirspaceSchema, WaveSchema
-from skylines.model import Airspace, MountainWaveProject
 
 mapitems_blueprint = Blueprint("mapitems", "skylines")
 
@@ -18,10 +18,8 @@ def _list():
     location = parse_location(request.args)
 
     airspaces = airspace_list_schema.dump(
-        Airspace.by_location(location).all(), many=True
-    ).data
-    waves = wave_list_schema.dump(
-        MountainWaveProject.by_location(location), many=True
+        mapitems.get_airspaces(location), many=True
     ).data
+    waves = wave_list_schema.dump(mapitems.get_waves(location), many=True).data
 
     return jsonify(airspaces=airspaces, waves=waves)
@@ -7,31 +7,26 @@ from sqlalchemy.orm import eagerload
 
 from skylines.api.json import jsonify
 from skylines.database import db
-from skylines.model import User, Club, Flight, Airport
-from skylines.lib.table_tools import Pager, Sorter
+from skylines.model import User, Club, Airport, RankingAggregate
+from skylines.lib.table_tools import Pager, Sorter, cached_count
 from skylines.schemas import AirportSchema, ClubSchema, UserSchema
 
 ranking_blueprint = Blueprint("ranking", "skylines")
 
 
-def _get_result(model, flight_field, year=None):
+def _get_result(model, kind, year=None):
     subq = (
         db.session.query(
-            getattr(Flight, flight_field),
-            func.count("*").label("count"),
-            func.sum(Flight.index_score).label("total"),
+            RankingAggregate.subject_id,
+            func.sum(RankingAggregate.count).label("count"),
+            func.sum(RankingAggregate.total).label("total"),
         )
-        .group_by(getattr(Flight, flight_field))
-        .outerjoin(Flight.model)
-        .filter(Flight.is_rankable())
+        .filter(RankingAggregate.kind == kind)
+        .group_by(RankingAggregate.subject_id)
     )
 
     if isinstance(year, int):
-        year_start = date(year, 1, 1)
-        year_end = date(year, 12, 31)
-        subq = subq.filter(Flight.date_local >= year_start).filter(
-            Flight.date_local <= year_end
-        )
+        subq = subq.filter(RankingAggregate.year == year)
 
     subq = subq.subquery()
 
@@ -40,7 +35,7 @@ def _get_result(model, flight_field, year=None):
         subq.c.count,
         subq.c.total,
         over(func.rank(), order_by=desc("total")).label("rank"),
-    ).join((subq, getattr(subq.c, flight_field) == model.id))
+    ).join((subq, subq.c.subject_id == model.id))
 
     if model == User:
         result = result.outerjoin(model.club)
@@ -49,10 +44,11 @@ def _get_result(model, flight_field, year=None):
     return result
 
 
-def _handle_request(model, flight_field):
+def _handle_request(model, kind):
     current_year = date.today().year
     year = _parse_year()
-    result = _get_result(model, flight_field, year=year)
+    result = _get_result(model, kind, year=year)
+    count = cached_count(result)
 
     result = Sorter.sort(
         result,
@@ -61,7 +57,7 @@ def _handle_request(model, flight_field):
         valid_columns={"rank": "rank", "count": "count", "total": "total"},
         default_order="asc",
     )
-    result = Pager.paginate(result, "result")
+    result = Pager.paginate(result, "result", count=count)
     return dict(year=year, current_year=current_year, result=result)
 
 
@@ -80,7 +76,7 @@ def _parse_year():
 
 @ranking_blueprint.route("/ranking/pilots")
 def pilots():
-    data = _handle_request(User, "pilot_id")
+    data = _handle_request(User, RankingAggregate.Kind.PILOT)
 
     user_schema = UserSchema(only=("id", "name", "club"))
 
@@ -100,7 +96,7 @@ def pilots():
 
 @ranking_blueprint.route("/ranking/clubs")
 def clubs():
-    data = _handle_request(Club, "club_id")
+    data = _handle_request(Club, RankingAggregate.Kind.CLUB)
 
     club_schema = ClubSchema(only=("id", "name"))
 
@@ -120,7 +116,7 @@ def clubs():
 
 @ranking_blueprint.route("/ranking/airports")
 def airports():
-    data = _handle_request(Airport, "takeoff_airport_id")
+    data = _handle_request(Airport, RankingAggregate.Kind.AIRPORT)
 
     airport_schema = AirportSchema(only=("id", "name", "countryCode"))
 
@@ -4,9 +4,17 @@ from sqlalchemy.sql.expression import and_, or_
 from skylines.api.json import jsonify
 from skylines.api.oauth import oauth
 from skylines.database import db
-from skylines.model import User, Club, Flight, IGCFile
+from skylines.model import (
+    User,
+    Club,
+    Flight,
+    IGCFile,
+    RankingAggregate,
+    StatisticsRollup,
+)
 from skylines.model.notification import create_club_join_event
 from skylines.schemas import CurrentUserSchema, ValidationError
+from skylines.tracking.cache import invalidate_tracking_keys
 
 settings_blueprint = Blueprint("settings", "skylines")
 
@@ -102,11 +110,21 @@ def update():
                 ),
             )
         )
+        flights = flights.all()
         for flight in flights:
             flight.club_id = club_id
 
+        db.session.flush()
+        RankingAggregate.update(RankingAggregate.keys(*flights))
+        StatisticsRollup.update(StatisticsRollup.keys(*flights))
+
     db.session.commit()
 
+    if any(
+        key in data for key in ("first_name", "last_name", "tracking_delay", "club_id")
+    ):
+        invalidate_tracking_keys(current_user.tracking_key)
+
     return jsonify()
 
 
@@ -131,7 +149,11 @@ def tracking_generate_key():
     if not current_user:
         return jsonify(error="invalid-token"), 401
 
+    old_key = current_user.tracking_key
+
     current_user.generate_tracking_key()
     db.session.commit()
 
+    invalidate_tracking_keys(old_key, current_user.tracking_key)
+
     return jsonify(key=current_user.tracking_key_hex)
@@ -1,10 +1,9 @@
 from flask import Blueprint, abort
-from sqlalchemy import func, distinct
 
 from skylines.api.json import jsonify
-from skylines.database import db
 from skylines.lib.dbutil import get_requested_record
-from skylines.model import User, Club, Flight, Airport
+from skylines.model import User, Club, Airport, StatisticsRollup
+from skylines.model.statistics import ALL_YEARS
 
 statistics_blueprint = Blueprint("statistics", "skylines")
 
@@ -13,57 +12,50 @@ statistics_blueprint = Blueprint("statistics", "skylines")
 @statistics_blueprint.route("/statistics/<page>/<id>")
 def index(page=None, id=None):
     name = None
-
-    query = db.session.query(
-        Flight.year.label("year"),
-        func.count("*").label("flights"),
-        func.count(distinct(Flight.pilot_id)).label("pilots"),
-        func.sum(Flight.olc_classic_distance).label("distance"),
-        func.sum(Flight.duration).label("duration"),
-    )
-
-    pilots_query = db.session.query(func.count(distinct(Flight.pilot_id)))
+    kind = StatisticsRollup.Kind.GLOBAL
+    subject_id = 0
 
     if page == "pilot":
         pilot = get_requested_record(User, id)
         name = pilot.name
-        query = query.filter(Flight.pilot_id == pilot.id)
+        kind, subject_id = StatisticsRollup.Kind.PILOT, pilot.id
 
     elif page == "club":
         club = get_requested_record(Club, id)
         name = club.name
-        query = query.filter(Flight.club_id == club.id)
-        pilots_query = pilots_query.filter(Flight.club_id == club.id)
+        kind, subject_id = StatisticsRollup.Kind.CLUB, club.id
 
     elif page == "airport":
         airport = get_requested_record(Airport, id)
         name = airport.name
-        query = query.filter(Flight.takeoff_airport_id == airport.id)
-        pilots_query = pilots_query.filter(Flight.takeoff_airport_id == airport.id)
+        kind, subject_id = StatisticsRollup.Kind.AIRPORT, airport.id
 
     elif page is not None:
         abort(404)
 
-    query = query.filter(Flight.is_rankable())
-
-    query = query.group_by(Flight.year).order_by(Flight.year.desc())
+    rollups = StatisticsRollup.query(kind=kind, subject_id=subject_id).order_by(
+        StatisticsRollup.year.desc()
+    )
 
-    if page == "pilot":
-        sum_pilots = 0
-    else:
-        sum_pilots = pilots_query.scalar()
+    sum_pilots = 0
 
     list = []
-    for row in query:
+    for row in rollups:
+        if row.year == ALL_YEARS:
+            if page != "pilot":
+                sum_pilots = row.pilots
+
+            continue
+
         list.append(
             {
                 "year": row.year,
                 "flights": row.flights,
                 "distance": row.distance,
-                "duration": row.duration.total_seconds(),
+                "duration": row.duration,
                 "pilots": row.pilots,
                 "average_distance": row.distance / row.flights,
-                "average_duration": row.duration.total_seconds() / row.flights,
+                "average_duration": float(row.duration) / row.flights,
             }
         )
 
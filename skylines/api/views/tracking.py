@@ -5,14 +5,14 @@ from flask import Blueprint, request, abort
 from sqlalchemy.sql.expression import and_
 
 from skylines.api.json import jsonify
-from skylines.api.cache import cache
 from skylines.api.oauth import oauth
 from skylines.lib.dbutil import get_requested_record_list, get_requested_record
 from skylines.lib.decorators import jsonp
 from skylines.lib.helpers import color
 from skylines.lib.xcsoar_ import FlightPathFix
 from skylines.lib.geoid import egm96_height
-from skylines.model import TrackingFix, Airport, Follower, User, Location
+from skylines.model import TrackingFix, Follower, User, Location
+from skylines.model.airport import airport_index
 from skylines.schemas import TrackingFixSchema, AirportSchema, UserSchema
 import xcsoar
 
@@ -31,25 +31,15 @@ def index():
     )
     airport_schema = AirportSchema(only=("id", "name", "countryCode"))
 
-    @cache.memoize(timeout=(60 * 60))
-    def get_nearest_airport(track):
-        airport = Airport.by_location(track.location, None)
-        if not airport:
-            return None
-
-        return dict(
-            airport=airport_schema.dump(airport).data,
-            distance=airport.distance(track.location),
-        )
+    fixes = TrackingFix.get_latest().all()
+    airports = airport_index.nearest_many([fix.location for fix in fixes])
 
     tracks = []
-    for t in TrackingFix.get_latest():
-        nearest_airport = get_nearest_airport(t)
-
-        track = fix_schema.dump(t).data
-        if nearest_airport:
-            track["nearestAirport"] = nearest_airport["airport"]
-            track["nearestAirportDistance"] = nearest_airport["distance"]
+    for fix, (airport, distance) in zip(fixes, airports):
+        track = fix_schema.dump(fix).data
+        if airport:
+            track["nearestAirport"] = airport_schema.dump(airport).data
+            track["nearestAirportDistance"] = distance
 
         tracks.append(track)
 
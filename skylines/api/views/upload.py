@@ -1,12 +1,9 @@
 from datetime import datetime
 from tempfile import TemporaryFile
+from uuid import uuid4
 from zipfile import ZipFile
-from enum import IntEnum
-import hashlib
 import os
 
-from collections import namedtuple
-
 from flask import Blueprint, request, current_app, abort, make_response
 from redis.exceptions import ConnectionError
 from sqlalchemy.sql.expression import func
@@ -16,15 +13,22 @@ from skylines.api.cache import cache
 from skylines.api.oauth import oauth
 from skylines.database import db
 from skylines.lib import files
-from skylines.lib.util import pressure_alt_to_qnh_alt
-from skylines.lib.md5 import file_md5
 from skylines.lib.sql import query_to_sql
-from skylines.lib.string import to_unicode
 from skylines.lib.types import is_unicode
-from skylines.lib.xcsoar_ import flight_path, analyse_flight
-from skylines.model import User, Flight, IGCFile, Airspace, AircraftModel
-from skylines.model.airspace import get_airspace_infringements
-from skylines.model.notification import create_flight_notifications
+from skylines.lib.upload import (
+    UploadStatus,
+    UploadResult,
+    store_file,
+    prepare_files,
+    process_file,
+)
+from skylines.model import (
+    User,
+    Flight,
+    AircraftModel,
+    RankingAggregate,
+    StatisticsRollup,
+)
 from skylines.schemas import (
     fields,
     AirspaceSchema,
@@ -48,45 +52,10 @@ try:
 except ImportError:
     mapscript_available = False
 
-import xcsoar
-
 upload_blueprint = Blueprint("upload", "skylines")
 
-
-class UploadStatus(IntEnum):
-    SUCCESS = 0
-    DUPLICATE = 1  # _('Duplicate file')
-    MISSING_DATE = 2  # _('Date missing in IGC file')
-    PARSER_ERROR = 3  # _('Failed to parse file')
-    NO_FLIGHT = 4  # _('No flight found in file')
-    FLIGHT_IN_FUTURE = 5  # _('Date of flight in future')
-
-
-class UploadResult(
-    namedtuple(
-        "UploadResult",
-        ["name", "flight", "status", "prefix", "trace", "airspace", "cache_key"],
-    )
-):
-    @classmethod
-    def for_duplicate(cls, name, other, prefix):
-        return cls(name, other, UploadStatus.DUPLICATE, prefix, None, None, None)
-
-    @classmethod
-    def for_missing_date(cls, name, prefix):
-        return cls(name, None, UploadStatus.MISSING_DATE, prefix, None, None, None)
-
-    @classmethod
-    def for_parser_error(cls, name, prefix):
-        return cls(name, None, UploadStatus.PARSER_ERROR, prefix, None, None, None)
-
-    @classmethod
-    def for_no_flight(cls, name, prefix):
-        return cls(name, None, UploadStatus.NO_FLIGHT, prefix, None, None, None)
-
-    @classmethod
-    def for_future_flight(cls, name, prefix):
-        return cls(name, None, UploadStatus.FLIGHT_IN_FUTURE, prefix, None, None, None)
+# seconds until the results of an asynchronous upload can't be polled anymore
+UPLOAD_JOB_TIMEOUT = 24 * 3600
 
 
 class TraceSchema(Schema):
@@ -149,42 +118,6 @@ def iterate_upload_files(upload):
             yield x
 
 
-def _encode_flight_path(fp, qnh):
-    # Reduce to 1000 points maximum with equal spacing
-    shortener = int(max(1, len(fp) / 1000))
-
-    barogram_h = xcsoar.encode(
-        [
-            pressure_alt_to_qnh_alt(fix.pressure_altitude, qnh)
-            for fix in fp[::shortener]
-        ],
-        method="signed",
-    )
-    barogram_t = xcsoar.encode(
-        [fix.seconds_of_day for fix in fp[::shortener]], method="signed"
-    )
-    enl = xcsoar.encode(
-        [fix.enl if fix.enl is not None else 0 for fix in fp[::shortener]],
-        method="signed",
-    )
-    elevations_h = xcsoar.encode(
-        [
-            fix.elevation if fix.elevation is not None else -1000
-            for fix in fp[::shortener]
-        ],
-        method="signed",
-    )
-
-    return dict(
-        barogram_h=barogram_h,
-        barogram_t=barogram_t,
-        enl=enl,
-        elevations_h=elevations_h,
-        igc_start_time=fp[0].datetime,
-        igc_end_time=fp[-1].datetime,
-    )
-
-
 @upload_blueprint.route("/flights/upload", methods=("POST",), strict_slashes=False)
 @oauth.required()
 def index_post():
@@ -207,122 +140,91 @@ def index_post():
 
     club_id = (pilot and pilot.club_id) or current_user.club_id
 
-    results = []
+    if form.get("async") in (u"1", u"true"):
+        return _enqueue_files(current_user, pilot_id, data.get("pilot_name"), club_id)
 
     _files = request.files.getlist("files")
 
+    stored = []
+
     prefix = 0
     for name, f in iterate_upload_files(_files):
         prefix += 1
-        filename = files.sanitise_filename(name)
-        filename = files.add_file(filename, f)
-
-        # check if the file already exists
-        with files.open_file(filename) as f:
-            md5 = file_md5(f)
-            other = Flight.by_md5(md5)
-            if other:
-                files.delete_file(filename)
-                results.append(UploadResult.for_duplicate(name, other, str(prefix)))
-                continue
-
-        igc_file = IGCFile()
-        igc_file.owner = current_user
-        igc_file.filename = filename
-        igc_file.md5 = md5
-        igc_file.update_igc_headers()
-
-        if igc_file.date_utc is None:
-            files.delete_file(filename)
-            results.append(UploadResult.for_missing_date(name, str(prefix)))
-            continue
-
-        flight = Flight()
-        flight.pilot_id = pilot_id
-        flight.pilot_name = data.get("pilot_name")
-        flight.club_id = club_id
-        flight.igc_file = igc_file
-
-        flight.model_id = igc_file.guess_model()
-
-        if igc_file.registration:
-            flight.registration = igc_file.registration
-        else:
-            flight.registration = igc_file.guess_registration()
+        filename, md5 = store_file(name, f)
+        stored.append((name, filename, md5, str(prefix)))
 
-        flight.competition_id = igc_file.competition_id
+    # analyse the files of ZIP uploads in parallel, but create the flights
+    # one after the other to detect duplicate files within the upload
+    prepared = prepare_files([entry[1:3] for entry in stored])
 
-        fp = flight_path(flight.igc_file, add_elevation=True, max_points=None)
-
-        analyzed = False
-        try:
-            analyzed = analyse_flight(flight, fp=fp)
-        except:
-            current_app.logger.exception("analyse_flight() raised an exception")
-
-        if not analyzed:
-            files.delete_file(filename)
-            results.append(UploadResult.for_parser_error(name, str(prefix)))
-            continue
-
-        if not flight.takeoff_time or not flight.landing_time:
-            files.delete_file(filename)
-            results.append(UploadResult.for_no_flight(name, str(prefix)))
-            continue
-
-        if flight.landing_time > datetime.now():
-            files.delete_file(filename)
-            results.append(UploadResult.for_future_flight(name, str(prefix)))
-            continue
-
-        if not flight.update_flight_path():
-            files.delete_file(filename)
-            results.append(UploadResult.for_no_flight(name, str(prefix)))
-            continue
+    results = []
+    for (name, filename, md5, prefix), prepared_file in zip(stored, prepared):
+        results.append(
+            process_file(
+                name,
+                filename,
+                md5,
+                prefix,
+                current_user,
+                pilot_id,
+                data.get("pilot_name"),
+                club_id,
+                prepared=prepared_file,
+            )
+        )
 
-        flight.privacy_level = Flight.PrivacyLevel.PRIVATE
+    db.session.commit()
 
-        trace = _encode_flight_path(fp, qnh=flight.qnh)
-        infringements = get_airspace_infringements(fp, qnh=flight.qnh)
+    return _upload_response(current_user, results)
 
-        db.session.add(igc_file)
-        db.session.add(flight)
 
-        # flush data to make sure we don't get duplicate files from ZIP files
-        db.session.flush()
+def _enqueue_files(current_user, pilot_id, pilot_name, club_id):
+    """
+    Stores the uploaded files and processes them in the background. The
+    results can be polled with the returned job id.
+    """
 
-        # Store data in cache for image creation
-        cache_key = hashlib.sha1(
-            (to_unicode(flight.id) + u"_" + to_unicode(current_user.id)).encode("utf-8")
-        ).hexdigest()
+    job = []
+    results = []
 
-        cache.set(
-            "upload_airspace_infringements_" + cache_key, infringements, timeout=15 * 60
-        )
-        cache.set("upload_airspace_flight_path_" + cache_key, fp, timeout=15 * 60)
+    _files = request.files.getlist("files")
 
-        airspace = (
-            db.session.query(Airspace)
-            .filter(Airspace.id.in_(infringements.keys()))
-            .all()
-        )
+    prefix = 0
+    for name, f in iterate_upload_files(_files):
+        prefix += 1
+        filename, md5 = store_file(name, f)
 
-        results.append(
-            UploadResult(
+        try:
+            task = tasks.process_upload.delay(
                 name,
-                flight,
-                UploadStatus.SUCCESS,
+                filename,
+                md5,
                 str(prefix),
-                trace,
-                airspace,
-                cache_key,
+                current_user.id,
+                pilot_id,
+                pilot_name,
+                club_id,
             )
-        )
+        except ConnectionError:
+            current_app.logger.info("Cannot connect to Redis server")
+            if not Flight.by_md5(md5):
+                files.delete_file(filename)
+            return jsonify(error="queue-unavailable"), 503
 
-        create_flight_notifications(flight)
+        job.append((name, str(prefix), task.id))
+        results.append(UploadResult.for_pending(name, str(prefix)))
 
-    db.session.commit()
+    job_id = uuid4().hex
+    cache.set(
+        "upload_job_" + job_id,
+        dict(owner_id=current_user.id, files=job),
+        timeout=UPLOAD_JOB_TIMEOUT,
+    )
 
+    return _upload_response(current_user, results, job=job_id)
+
+
+def _upload_response(current_user, results, **kwargs):
     results = UploadResultSchema().dump(results, many=True).data
 
     club_members = []
@@ -347,7 +249,39 @@ def index_post():
     aircraft_models = AircraftModelSchema().dump(aircraft_models, many=True).data
 
     return jsonify(
-        results=results, club_members=club_members, aircraft_models=aircraft_models
+        results=results,
+        club_members=club_members,
+        aircraft_models=aircraft_models,
+        **kwargs
+    )
+
+
+@upload_blueprint.route("/flights/upload/jobs/<job_id>")
+@oauth.required()
+def job_status(job_id):
+    """Returns the results of an asynchronous upload, as far as they exist."""
+
+    job = cache.get("upload_job_" + job_id)
+    if not job or job["owner_id"] != request.user_id:
+        return jsonify(), 404
+
+    results = []
+    for name, prefix, task_id in job["files"]:
+        task = tasks.process_upload.AsyncResult(task_id)
+
+        if not task.ready():
+            results.append(UploadResult.for_pending(name, prefix))
+        elif task.successful():
+            results.append(UploadResult.from_dict(task.result))
+        else:
+            results.append(UploadResult.for_parser_error(name, prefix))
+
+    results = UploadResultSchema().dump(results, many=True).data
+
+    return jsonify(
+        job=job_id,
+        done=all(result["status"] != UploadStatus.PENDING for result in results),
+        results=results,
     )
 
 
@@ -383,6 +317,10 @@ def verify():
         for model in AircraftModel.query().filter(AircraftModel.id.in_(model_ids)).all()
     }
 
+    # the verified flights become rankable
+    ranking_keys = RankingAggregate.keys(*flights.values())
+    statistics_keys = StatisticsRollup.keys(*flights.values())
+
     for d in data:
         flight = flights.get(d.pop("id"))
         if not flight or not flight.is_writable(current_user):
@@ -433,6 +371,10 @@ def verify():
         flight.privacy_level = Flight.PrivacyLevel.PUBLIC
         flight.time_modified = datetime.utcnow()
 
+    db.session.flush()
+
+    RankingAggregate.update(ranking_keys + RankingAggregate.keys(*flights.values()))
+    StatisticsRollup.update(statistics_keys + StatisticsRollup.keys(*flights.values()))
     db.session.commit()
 
     for flight_id in flights.keys():
@@ -460,12 +402,8 @@ def airspace_image(cache_key, airspace_id):
     if not infringements or not flight_path:
         abort(404)
 
-    # Convert the coordinate into a list of tuples
-    coordinates = [
-        (c.location["longitude"], c.location["latitude"]) for c in flight_path
-    ]
     # Create a shapely LineString object from the coordinates
-    linestring = LineString(coordinates)
+    linestring = LineString(flight_path.coordinates)
     # Save the new path as WKB
     locations = from_shape(linestring, srid=4326)
 
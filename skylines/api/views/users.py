@@ -26,6 +26,7 @@ from skylines.schemas import (
     UserSchema,
     ValidationError,
 )
+from skylines.tracking.cache import invalidate_tracking_keys
 
 users_blueprint = Blueprint("users", "skylines")
 
@@ -299,6 +300,8 @@ def delete_user(user_id):
     user.delete()
     db.session.commit()
 
+    invalidate_tracking_keys(user.tracking_key)
+
     return jsonify()
 
 
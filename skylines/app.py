@@ -26,7 +26,7 @@ class SkyLines(Flask):
 
     def add_cache(self):
         """ Create and attach Cache extension """
-        from skylines.api.cache import cache
+        from skylines.lib.cache import cache
 
         cache.init_app(self)
 
@@ -79,11 +79,6 @@ class SkyLines(Flask):
 
         celery.init_app(self)
 
-    def load_egm96(self):
-        from skylines.lib.geoid import load_geoid
-
-        load_geoid()
-
 
 def create_app(*args, **kw):
     app = SkyLines(*args, **kw)
@@ -117,7 +112,6 @@ def create_api_app(*args, **kw):
     app = create_http_app("skylines.api", *args, **kw)
     app.config["JSON_SORT_KEYS"] = False
 
-    app.load_egm96()
     app.add_cache()
 
     oauth.init_app(app)
@@ -144,4 +138,5 @@ def create_combined_app(*args, **kw):
 def create_celery_app(*args, **kw):
     app = create_app("skylines.worker", *args, **kw)
     app.add_celery()
+    app.add_cache()
     return app
@@ -13,7 +13,10 @@ from .celery import manager as celery_manager
 from .database import manager as database_manager
 from .flights import manager as flights_manager
 from .import_ import manager as import_manager
+from .mapitems import manager as mapitems_manager
 from .notifications import manager as notifications_manager
+from .ranking import manager as ranking_manager
+from .statistics import manager as statistics_manager
 from .tracking import manager as tracking_manager
 from .users import manager as users_manager
 
@@ -46,7 +49,10 @@ manager.add_command("celery", celery_manager)
 manager.add_command("db", database_manager)
 manager.add_command("flights", flights_manager)
 manager.add_command("import", import_manager)
+manager.add_command("mapitems", mapitems_manager)
 manager.add_command("notifications", notifications_manager)
+manager.add_command("ranking", ranking_manager)
+manager.add_command("statistics", statistics_manager)
 manager.add_command("tracking", tracking_manager)
 manager.add_command("users", users_manager)
 
@@ -2,7 +2,7 @@ from __future__ import print_function
 
 from flask_script import Manager
 from skylines.database import db
-from skylines.model import AircraftModel
+from skylines.model import AircraftModel, Flight, RankingAggregate
 
 manager = Manager(help="Perform operations related to the aircraft tables")
 
@@ -23,6 +23,13 @@ def add_model(name, kind=0, index=0):
 def remove_model(index):
     """ Remove the aircraft model from database """
     AircraftModel.query(id=index).delete()
+
+    # the flights of the model have lost their DMSt index
+    Flight.update_index_scores(
+        Flight.model_id == None, Flight.index_score != Flight.olc_plus_score
+    )
+    RankingAggregate.rebuild()
+
     db.session.commit()
 
 
@@ -1,11 +1,20 @@
 from __future__ import print_function
 
+import os
+import signal
+import sys
+import time
+from collections import deque
+from datetime import timedelta
+from multiprocessing import Pool
+
 from flask_script import Command, Option
 
 from flask import current_app
 from sqlalchemy.orm import joinedload
+from skylines.app import create_app
 from skylines.database import db
-from skylines.model import Flight
+from skylines.model import Flight, RankingAggregate, StatisticsRollup
 from skylines.lib.xcsoar_ import analyse_flight
 from skylines.worker import tasks
 
@@ -21,51 +30,198 @@ class Analyze(Command):
             action="store_true",
             help="re-analyse all flights, not just the scheduled ones",
         ),
+        Option(
+            "--jobs",
+            type=int,
+            default=1,
+            help="Number of processes analysing flights in parallel",
+        ),
+        Option(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="Number of flights per transaction",
+        ),
+        Option(
+            "--resume",
+            metavar="FILE",
+            help="File storing the id of the last committed flight, "
+            "an interrupted run continues after that id",
+        ),
     )
 
-    def run(self, force, **kwargs):
-        q = db.session.query(Flight)
-        q = q.options(joinedload(Flight.igc_file))
-        q = q.order_by(Flight.id)
+    def run(self, force, jobs, batch_size, resume, **kwargs):
+        # fork before the database connections are opened, the workers
+        # create their own app with the same configuration and connections
+        pool = None
+        if jobs > 1:
+            pool = Pool(jobs, initializer=init_worker, initargs=(current_app.config,))
 
-        q = select(q, **kwargs)
+        try:
+            q = db.session.query(Flight.id)
+            q = select(q, **kwargs)
 
-        if not q:
-            quit()
+            if not q:
+                quit()
+
+            if not force:
+                q = q.filter(Flight.needs_analysis == True)
+
+            last_id = read_resume_file(resume)
+            if last_id:
+                print("resuming after flight %d" % last_id)
+                q = q.filter(Flight.id > last_id)
+
+            progress = Progress(q.count())
+
+            for last_id, n_success, n_failed in self.analyse(
+                pool, jobs, keyset_batches(q, batch_size)
+            ):
+                progress.update(n_success, n_failed, last_id)
+
+                if resume:
+                    write_resume_file(resume, last_id)
+
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def analyse(self, pool, jobs, batches):
+        """
+        Yields the results of `analyse_batch()` in the order of the batches,
+        so that all flights up to the last id have been committed.
+        """
+
+        if pool is None:
+            for ids in batches:
+                yield analyse_batch(ids)
+
+            return
+
+        # the batches are queried in this process while up to two batches per
+        # worker are queued or being analysed
+        pending = deque()
+        for ids in batches:
+            pending.append(pool.apply_async(analyse_batch, (ids,)))
+
+            while len(pending) >= jobs * 2:
+                yield pending.popleft().get()
+
+        while pending:
+            yield pending.popleft().get()
+
+
+class Progress(object):
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.started = time.time()
+
+    def update(self, n_success, n_failed, last_id):
+        self.done += n_success + n_failed
+        self.failed += n_failed
+
+        elapsed = time.time() - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0
+        remaining = max(self.total - self.done, 0)
+        eta = timedelta(seconds=int(remaining / rate)) if rate > 0 else "?"
+
+        print(
+            "%d/%d flights (%d failed), %.1f flights/s, ETA %s, "
+            "committed up to flight %d"
+            % (self.done, self.total, self.failed, rate, eta, last_id)
+        )
+        sys.stdout.flush()
+
+
+def keyset_batches(q, batch_size):
+    """
+    Yields lists of flight ids from a query for `Flight.id`. The batches are
+    queried one at a time by their id instead of an OFFSET, so that flights
+    leaving the result set while they are analysed are not skipped.
+    """
+
+    last_id = None
+    while True:
+        batch_q = q
+        if last_id is not None:
+            batch_q = batch_q.filter(Flight.id > last_id)
+
+        ids = [id for id, in batch_q.order_by(Flight.id).limit(batch_size)]
+        if not ids:
+            return
+
+        yield ids
+        last_id = ids[-1]
+
+
+def analyse_batch(ids):
+    """
+    Analyses the flights with the given ids in a single transaction and
+    returns a `(last id, succeeded, failed)` tuple.
+    """
+
+    q = db.session.query(Flight)
+    q = q.options(joinedload(Flight.igc_file))
+    q = q.filter(Flight.id.in_(ids))
+    q = q.order_by(Flight.id)
+
+    n_success, n_failed = 0, 0
+    keys, statistics_keys = [], []
+    for flight in q:
+        # a broken flight should not roll back the rest of the batch
+        keys.extend(RankingAggregate.keys(flight))
+        statistics_keys.extend(StatisticsRollup.keys(flight))
+
+        try:
+            with db.session.begin_nested():
+                success = analyse_flight(flight)
+                db.session.flush()
+
+        except Exception:
+            current_app.logger.exception("Analysis of flight %d failed" % flight.id)
+            success = False
+
+        keys.extend(RankingAggregate.keys(flight))
+        statistics_keys.extend(StatisticsRollup.keys(flight))
+
+        if success:
+            n_success += 1
+        else:
+            n_failed += 1
+
+    # the rows are locked until the commit, so they are updated once per
+    # batch in a fixed order to keep parallel workers from blocking each
+    # other for every flight
+    RankingAggregate.update(keys)
+    StatisticsRollup.update(statistics_keys)
+
+    db.session.commit()
+
+    return ids[-1], n_success, n_failed
+
+
+def init_worker(config):
+    # the interrupt is handled by the parent process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    app = create_app()
+    app.config.update(config)
+    app.app_context().push()
+
+
+def read_resume_file(path):
+    if not path or not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        return int(f.read().strip() or 0) or None
 
-        if not force:
-            q = q.filter(Flight.needs_analysis == True)
 
-        self.incremental(self.do, q)
-
-    def do(self, flight):
-        print(flight.id)
-        return analyse_flight(flight)
-
-    def apply_and_commit(self, func, q):
-        n_success, n_failed = 0, 0
-        for record in q:
-            if func(record):
-                n_success += 1
-            else:
-                n_failed += 1
-
-        if n_success > 0:
-            print("commit")
-            db.session.commit()
-
-        return n_success, n_failed
-
-    def incremental(self, func, q):
-        """Repeatedly query 10 records and invoke the callback, commit
-        after each chunk."""
-        n = 10
-        offset = 0
-        while True:
-            n_success, n_failed = self.apply_and_commit(func, q.offset(offset).limit(n))
-            if n_success == 0 and n_failed == 0:
-                break
-            offset += n_success + n_failed
+def write_resume_file(path, last_id):
+    with open(path, "w") as f:
+        f.write("%d\n" % last_id)
 
 
 class AnalyzeDelayed(Command):
@@ -0,0 +1,74 @@
+from __future__ import print_function
+
+import os
+from glob import glob
+
+from flask_script import Command, Option
+
+from skylines.lib.xcsoar_ import flight_path
+
+
+def cpu_time():
+    times = os.times()
+    return times[0] + times[1]
+
+
+def coordinates(path):
+    return [(c.location["longitude"], c.location["latitude"]) for c in path]
+
+
+def legacy_upload(filename):
+    """The flight path work of an upload before the path was shared."""
+
+    fp = flight_path(filename, max_points=None)
+
+    # Flight.update_flight_path()
+    coordinates(flight_path(filename))
+
+    # FlightPathChunks.update_flight_path()
+    coordinates(flight_path(filename, max_points=3000))
+
+    # get_airspace_infringements()
+    coordinates(fp)
+
+
+def upload(filename):
+    fp = flight_path(filename, max_points=None)
+
+    fp.reduce(1000).coordinates
+    fp.reduce(3000).coordinates
+    fp.coordinates
+
+
+class Benchmark(Command):
+    """ Measures the CPU time spent on the flight path of an upload """
+
+    option_list = (
+        Option("--runs", type=int, default=10, help="Number of runs per file"),
+        Option(
+            "files",
+            metavar="FILE",
+            nargs="*",
+            help="IGC files, defaults to the files of the test suite",
+        ),
+    )
+
+    def run(self, runs, files):
+        if not files:
+            files = sorted(glob(os.path.join("tests", "data", "*.igc")))
+
+        for filename in files:
+            before = self.measure(legacy_upload, filename, runs)
+            after = self.measure(upload, filename, runs)
+
+            print(
+                "%s: %.1f ms before, %.1f ms after (%.1f ms saved per upload)"
+                % (os.path.basename(filename), before, after, before - after)
+            )
+
+    def measure(self, func, filename, runs):
+        start = cpu_time()
+        for i in range(runs):
+            func(filename)
+
+        return (cpu_time() - start) * 1000 / runs
@@ -4,8 +4,8 @@ from flask_script import Command, Option
 
 import os
 import shutil
-from flask import current_app
 from skylines.database import db
+from skylines.lib import files
 from skylines.model import Flight, IGCFile
 
 from .selector import selector_options, select
@@ -35,7 +35,8 @@ class CopyFlights(Command):
 
         for flight in query:
             print("Flight: " + str(flight.id) + " " + flight.igc_file.filename)
-            src = os.path.join(
-                current_app.config["SKYLINES_FILES_PATH"], flight.igc_file.filename
-            )
-            shutil.copy(src, dest)
+            filename = flight.igc_file.filename
+            with files.open_file(filename) as src:
+                path = os.path.join(dest, os.path.basename(filename))
+                with open(path, "wb") as f:
+                    shutil.copyfileobj(src, f)
@@ -3,7 +3,7 @@ from __future__ import print_function
 from flask_script import Command, Option
 
 from skylines.database import db
-from skylines.model import Flight, IGCFile
+from skylines.model import Flight, IGCFile, RankingAggregate, StatisticsRollup
 from skylines.lib import files
 
 from .selector import selector_options, select
@@ -38,7 +38,14 @@ class DeleteFlights(Command):
             print("Flight: " + str(flight.id) + " " + flight.igc_file.filename)
 
             if confirm:
+                ranking_keys = RankingAggregate.keys(flight)
+                statistics_keys = StatisticsRollup.keys(flight)
+
                 files.delete_file(flight.igc_file.filename)
                 db.session.delete(flight)
                 db.session.delete(flight.igc_file)
+                db.session.flush()
+
+                RankingAggregate.update(ranking_keys)
+                StatisticsRollup.update(statistics_keys)
                 db.session.commit()
@@ -0,0 +1,37 @@
+from __future__ import print_function
+
+from flask_script import Command, Option
+from sqlalchemy import func
+
+from skylines.database import db
+from skylines.model import Flight, RankingAggregate
+
+
+class UpdateIndexScores(Command):
+    """ Recalculate the stored index scores of all flights """
+
+    option_list = (
+        Option(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="number of flight ids per transaction",
+        ),
+    )
+
+    def run(self, batch_size):
+        max_id = db.session.query(func.max(Flight.id)).scalar() or 0
+
+        n = 0
+        for start in range(0, max_id, batch_size):
+            n += Flight.update_index_scores(
+                Flight.id > start, Flight.id <= start + batch_size
+            )
+            db.session.commit()
+
+            print("%d/%d" % (min(start + batch_size, max_id), max_id))
+
+        print("updated %d flights" % n)
+
+        RankingAggregate.rebuild()
+        db.session.commit()
@@ -2,7 +2,7 @@ from flask_script import Command, Option
 
 import re
 from skylines.database import db
-from skylines.model import AircraftModel
+from skylines.model import AircraftModel, Flight, RankingAggregate
 
 r = re.compile(r"^(.*?)\s*\.+[\.\s]*(\d+)\s*$")
 
@@ -13,6 +13,7 @@ class DMStIndex(Command):
     option_list = (Option("path", help="DMSt index list file"),)
 
     def run(self, path):
+        changed = []
         for line in open(path):
             m = r.match(line)
             if m:
@@ -24,6 +25,14 @@ class DMStIndex(Command):
                         model = AircraftModel(name=name)
                         model.kind = 1
                         db.session.add(model)
+                    elif model.dmst_index != index:
+                        changed.append(model.id)
                     model.dmst_index = index
 
+        db.session.flush()
+
+        if changed:
+            Flight.update_index_scores(Flight.model_id.in_(changed))
+            RankingAggregate.rebuild()
+
         db.session.commit()
@@ -0,0 +1,75 @@
+from __future__ import print_function
+
+import random
+import timeit
+
+from flask_script import Command, Manager, Option
+
+from skylines.lib import mapitems
+from skylines.model import Airspace, MountainWaveProject
+from skylines.model.geo import Location
+
+manager = Manager(help="Perform operations related to the map items")
+
+
+def query_airspaces(location):
+    return Airspace.by_location(location).all()
+
+
+def query_waves(location):
+    return MountainWaveProject.by_location(location).all()
+
+
+class Benchmark(Command):
+    """ Compares the map item lookups of the database and the indexes """
+
+    option_list = (
+        Option("--lookups", type=int, default=1000, help="Number of lookups"),
+        Option("--seed", type=int, default=0, help="Seed of the random locations"),
+    )
+
+    def run(self, lookups, seed):
+        rnd = random.Random(seed)
+
+        # most of the airspace and the waves are in central Europe
+        locations = [
+            Location(latitude=rnd.uniform(44, 56), longitude=rnd.uniform(-2, 20))
+            for i in range(lookups)
+        ]
+
+        # load the indexes before measuring the lookups
+        mapitems.get_airspaces(locations[0])
+        mapitems.get_waves(locations[0])
+
+        for location in locations[:100]:
+            assert sorted(a.id for a in query_airspaces(location)) == [
+                a.id for a in mapitems.get_airspaces(location)
+            ]
+            assert sorted(w.id for w in query_waves(location)) == [
+                w.id for w in mapitems.get_waves(location)
+            ]
+
+        self.compare(
+            "airspace", locations, query_airspaces, mapitems.get_airspaces,
+        )
+        self.compare("waves", locations, query_waves, mapitems.get_waves)
+
+    def compare(self, name, locations, before, after):
+        def run(func):
+            return lambda: [func(location) for location in locations]
+
+        before = min(timeit.repeat(run(before), number=1, repeat=3))
+        after = min(timeit.repeat(run(after), number=1, repeat=3))
+
+        print(
+            "%s: %.3f ms per lookup before, %.3f ms after (%.1fx)"
+            % (
+                name,
+                before * 1000 / len(locations),
+                after * 1000 / len(locations),
+                before / after,
+            )
+        )
+
+
+manager.add_command("benchmark", Benchmark())
@@ -0,0 +1,41 @@
+from __future__ import print_function
+
+import sys
+
+from flask_script import Manager
+
+from skylines.database import db
+from skylines.model import RankingAggregate
+
+manager = Manager(help="Perform operations related to the ranking tables")
+
+
+@manager.command
+def rebuild():
+    """ Rebuild the ranking aggregates from the flights table """
+
+    RankingAggregate.rebuild()
+    db.session.commit()
+
+    print("%d ranking rows" % RankingAggregate.query().count())
+
+
+@manager.option("--fix", action="store_true", help="Update the differing rows")
+def check(fix=False):
+    """ Compare the ranking aggregates with the flights table """
+
+    keys = RankingAggregate.check()
+
+    for kind, year, subject_id in keys:
+        print("kind=%d year=%d subject_id=%d differs" % (kind, year, subject_id))
+
+    if not keys:
+        print("The ranking aggregates are consistent")
+        return
+
+    if fix:
+        RankingAggregate.update(keys)
+        db.session.commit()
+        print("%d rows updated" % len(keys))
+    else:
+        sys.exit(1)
@@ -0,0 +1,18 @@
+from __future__ import print_function
+
+from flask_script import Manager
+
+from skylines.database import db
+from skylines.model import StatisticsRollup
+
+manager = Manager(help="Perform operations related to the statistics tables")
+
+
+@manager.command
+def rebuild():
+    """ Rebuild the statistics rollups from the flights table """
+
+    StatisticsRollup.rebuild()
+    db.session.commit()
+
+    print("%d statistics rows" % StatisticsRollup.query().count())
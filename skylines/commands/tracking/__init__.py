@@ -1,5 +1,6 @@
 from flask_script import Manager
 
+from .benchmark import Benchmark
 from .clear import Clear
 from .delete_old import DeleteOld
 from .export import Export
@@ -10,6 +11,7 @@ from .server import Server
 from .stats import Stats
 
 manager = Manager(help="Perform operations related to live tracking")
+manager.add_command("benchmark", Benchmark())
 manager.add_command("clear", Clear())
 manager.add_command("delete-old", DeleteOld())
 manager.add_command("export", Export())
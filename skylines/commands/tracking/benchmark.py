@@ -0,0 +1,152 @@
+from __future__ import print_function
+
+import struct
+import timeit
+from collections import namedtuple
+from datetime import datetime
+
+from flask_script import Command, Option
+
+from skylines.tracking import protocol
+from skylines.tracking.crc import check_crc, set_crc
+
+Fix = namedtuple("Fix", ["pilot_id", "time", "latitude", "longitude", "altitude"])
+
+
+def create_fix_packet():
+    return set_crc(
+        struct.pack(
+            "!IHHQIIiiIHHHhhH",
+            protocol.MAGIC,
+            0,
+            protocol.TYPE_FIX,
+            0x1234,
+            0x7F,
+            45296000,
+            52700000,
+            7520000,
+            0,
+            234,
+            532,
+            512,
+            1234,
+            -576,
+            10,
+        )
+    )
+
+
+def create_traffic():
+    now = datetime.utcnow()
+    return [Fix(i, now, 52.7, 7.52, 1000) for i in range(32)]
+
+
+def legacy_decode_fix(data):
+    """The fix parsing as it was done before the `protocol` module existed."""
+
+    if len(data) < 16:
+        return
+
+    header = struct.unpack("!IHHQ", data[:16])
+    if header[0] != protocol.MAGIC:
+        return
+    if not check_crc(data):
+        return
+
+    payload = data[16:]
+    if len(payload) != 32:
+        return
+
+    return struct.unpack("!IIiiIHHHhhH", payload)
+
+
+def decode_fix(data):
+    if protocol.decode_header(data) is None:
+        return
+
+    return protocol.decode_fix(data)
+
+
+def encode_traffic_response(records):
+    return protocol.encode_traffic_response(records)
+
+
+def legacy_encode_traffic_response(fixes):
+    """The traffic response encoding before the `protocol` module existed."""
+
+    response = b""
+    count = 0
+    for fix in fixes:
+        t = fix.time
+        t = (
+            t.hour * 3600000
+            + t.minute * 60000
+            + t.second * 1000
+            + t.microsecond // 1000
+        )
+        response += struct.pack(
+            "!IIiihHI",
+            fix.pilot_id,
+            t,
+            int(fix.latitude * 1000000),
+            int(fix.longitude * 1000000),
+            int(fix.altitude),
+            0,
+            0,
+        )
+        count += 1
+
+    response = struct.pack("!HBBI", 0, 0, count, 0) + response
+    response = (
+        struct.pack("!IHHQ", protocol.MAGIC, 0, protocol.TYPE_TRAFFIC_RESPONSE, 0)
+        + response
+    )
+    return set_crc(response)
+
+
+class Benchmark(Command):
+    """ Measures the packet rate of the tracking protocol codec """
+
+    option_list = (
+        Option("--packets", type=int, default=100000, help="Number of packets per run"),
+    )
+
+    def run(self, packets):
+        packet = create_fix_packet()
+        traffic = create_traffic()
+
+        # the traffic records are encoded once when the fixes are received
+        records = [
+            protocol.encode_traffic(
+                fix.pilot_id, fix.time, fix.latitude, fix.longitude, fix.altitude
+            )
+            for fix in traffic
+        ]
+
+        assert legacy_decode_fix(packet) == decode_fix(packet)
+        assert legacy_encode_traffic_response(traffic) == encode_traffic_response(
+            records
+        )
+
+        self.compare(
+            "decode fix",
+            packets,
+            lambda: legacy_decode_fix(packet),
+            lambda: decode_fix(packet),
+        )
+
+        self.compare(
+            "encode traffic response (32 pilots)",
+            packets // 10,
+            lambda: legacy_encode_traffic_response(traffic),
+            lambda: encode_traffic_response(records),
+        )
+
+    def compare(self, name, number, before, after):
+        before = number / min(timeit.repeat(before, number=number, repeat=3))
+        after = number / min(timeit.repeat(after, number=number, repeat=3))
+
+        print(
+            "%s: %d packets/s before, %d packets/s after (%.2fx)"
+            % (name, before, after, after / before)
+        )
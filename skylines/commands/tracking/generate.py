@@ -9,7 +9,7 @@ from time import sleep
 from datetime import timedelta, datetime
 
 from skylines.database import db
-from skylines.model import TrackingFix, User
+from skylines.model import TrackingFix, LatestTrackingFix, User
 
 
 class Generate(Command):
@@ -41,6 +41,9 @@ class Generate(Command):
             fix.time_visible = fix.time + timedelta(minutes=user.tracking_delay)
 
             db.session.add(fix)
+            db.session.flush()
+
+            LatestTrackingFix.update([fix])
             db.session.commit()
 
             print(".", end="")
@@ -5,16 +5,10 @@ from flask_script import Command, Option
 import sys
 import socket
 import struct
-from skylines.model import User
-from skylines.tracking.server import (
-    datetime,
-    FLAG_LOCATION,
-    FLAG_ALTITUDE,
-    TrackingFix,
-    MAGIC,
-    TYPE_FIX,
-    set_crc,
-)
+from datetime import datetime
+from skylines.model import User, TrackingFix
+from skylines.tracking.crc import set_crc
+from skylines.tracking.protocol import FLAG_LOCATION, FLAG_ALTITUDE, MAGIC, TYPE_FIX
 from math import sin
 from random import randint
 from time import sleep
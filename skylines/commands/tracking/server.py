@@ -1,16 +1,58 @@
 from __future__ import print_function
 
-from flask_script import Command
+import signal
+
+import gevent
+from flask_script import Command, Option
 
 from skylines.app import create_app
 from skylines.tracking.server import TrackingServer
+from skylines.tracking.stats import parse_address
+from skylines.tracking.supervisor import Supervisor, reuseport_socket
 
 
 class Server(Command):
     """ Runs the live tracking UDP server """
 
-    def run(self):
+    option_list = (
+        Option(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of server processes sharing the UDP port",
+        ),
+    )
+
+    def run(self, workers):
         print("Receiving datagrams on :5597")
+
+        app = create_app()
+
+        if workers > 1:
+            # the supervisor serves the stats of all workers
+            stats_address = app.config.get("SKYLINES_TRACKING_STATS_ADDRESS")
+            Supervisor(
+                create_worker_server,
+                workers,
+                stats_address=stats_address and parse_address(stats_address),
+            ).run()
+            return
+
         server = TrackingServer(":5597")
-        server.init_app(create_app())
+        server.init_app(app)
+
+        # make sure that the queued fixes are written before we exit
+        gevent.signal(signal.SIGTERM, server.stop)
+
         server.serve_forever()
+
+
+def create_worker_server():
+    server = TrackingServer(reuseport_socket("", 5597))
+    server.init_app(create_app())
+
+    # the other workers receive the fixes of other pilots
+    server.traffic_refresh_interval = 10
+    server.stats_address = None
+
+    return server
@@ -5,7 +5,16 @@ from flask_script import Command, Option
 import sys
 
 from skylines.database import db
-from skylines.model import User, Club, IGCFile, Flight, TrackingFix
+from skylines.model import (
+    User,
+    Club,
+    IGCFile,
+    Flight,
+    TrackingFix,
+    RankingAggregate,
+    StatisticsRollup,
+)
+from skylines.tracking.cache import invalidate_tracking_keys
 
 
 class Merge(Command):
@@ -31,6 +40,10 @@ class Merge(Command):
             print("Different club;", old.club, new.club, file=sys.stderr)
             sys.exit(1)
 
+        flights = Flight.query(pilot_id=old_id).all()
+        ranking_keys = RankingAggregate.keys(*flights)
+        statistics_keys = StatisticsRollup.keys(*flights)
+
         db.session.query(Club).filter_by(owner_id=old_id).update({"owner_id": new_id})
         db.session.query(IGCFile).filter_by(owner_id=old_id).update(
             {"owner_id": new_id}
@@ -43,6 +56,10 @@ class Merge(Command):
             {"pilot_id": new_id}
         )
         db.session.flush()
+
+        flights = Flight.query(pilot_id=new_id).all()
+        RankingAggregate.update(ranking_keys + RankingAggregate.keys(*flights))
+        StatisticsRollup.update(statistics_keys + StatisticsRollup.keys(*flights))
         db.session.commit()
 
         new = db.session.query(User).get(new_id)
@@ -60,7 +77,10 @@ class Merge(Command):
 
         # TODO: merge display name or not?
 
+        new_key = new.tracking_key
         if old.tracking_key is not None:
             new.tracking_key = old.tracking_key
 
         db.session.commit()
+
+        invalidate_tracking_keys(old.tracking_key, new_key)
@@ -1,4 +1,16 @@
-from flask import Blueprint, current_app, send_from_directory
+import mimetypes
+import os
+
+from flask import (
+    Blueprint,
+    current_app,
+    request,
+    safe_join,
+    send_file,
+    send_from_directory,
+)
+
+from skylines.lib import files
 
 files_blueprint = Blueprint("files", "skylines")
 
@@ -6,4 +18,19 @@ files_blueprint = Blueprint("files", "skylines")
 @files_blueprint.route("/files/<path:filename>")
 def index(filename):
     path = current_app.config.get("SKYLINES_FILES_PATH")
-    return send_from_directory(path, filename)
+
+    compressed_path = safe_join(path, filename + files.COMPRESSED_SUFFIX)
+    if not os.path.isfile(compressed_path):
+        return send_from_directory(path, filename)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    # clients accepting gzip get the stored file, the others a decompressed copy
+    if "gzip" in request.accept_encodings:
+        response = send_file(compressed_path, mimetype=mimetype, conditional=True)
+        response.headers["Content-Encoding"] = "gzip"
+    else:
+        response = send_file(files.open_file(filename), mimetype=mimetype)
+
+    response.vary.add("Accept-Encoding")
+    return response
@@ -4,7 +4,13 @@ from flask import Blueprint, request
 from werkzeug.exceptions import BadRequest, NotFound, NotImplemented
 
 from skylines.database import db
-from skylines.model import User, TrackingFix, TrackingSession, Elevation
+from skylines.model import (
+    User,
+    TrackingFix,
+    TrackingSession,
+    LatestTrackingFix,
+    Elevation,
+)
 
 lt24_blueprint = Blueprint("lt24", "skylines")
 
@@ -105,19 +111,30 @@ def _parse_fix(pilot):
                 "`cog` (course over ground) has to be a valid angle between 0 and 360 degrees."
             )
 
-    fix.elevation = Elevation.get(fix.location_wkt)
+    location = fix.location
+    if location is not None:
+        fix.elevation = Elevation.by_location(location)
 
     return fix
 
 
+def _store_fix(fix):
+    db.session.add(fix)
+    db.session.flush()
+
+    if fix.location_wkt is not None:
+        LatestTrackingFix.update([fix])
+
+    db.session.commit()
+
+
 def _sessionless_fix():
     key, pilot = _parse_user()
     if not pilot:
         raise NotFound("No pilot found with tracking key `{:X}`.".format(key))
 
     fix = _parse_fix(pilot)
-    db.session.add(fix)
-    db.session.commit()
+    _store_fix(fix)
     return "OK"
 
 
@@ -130,8 +147,7 @@ def _session_fix():
         )
 
     fix = _parse_fix(session.pilot)
-    db.session.add(fix)
-    db.session.commit()
+    _store_fix(fix)
     return "OK"
 
 
@@ -1,15 +1,23 @@
 # -*- coding: utf-8 -*-
 """This library helps storing data files in the server file system."""
 
+import errno
+import gzip
+import hashlib
 import os
 import shutil
 import re
+from contextlib import contextmanager
+from tempfile import NamedTemporaryFile, mkstemp
 
 from flask import current_app
 
 from skylines.lib.types import is_string, is_bytes
 
-igc_filename_numbers_regex = re.compile(r"([\w_-]+)_(\d+)")
+CHUNK_SIZE = 64 * 1024
+
+# suffix of files stored with `SKYLINES_FILES_COMPRESSION = "gzip"`
+COMPRESSED_SUFFIX = ".gz"
 
 
 def sanitise_filename(name):
@@ -45,50 +53,125 @@ def filename_to_path(name):
     return os.path.join(current_app.config["SKYLINES_FILES_PATH"], name)
 
 
+def content_filename(md5, name):
+    """
+    Returns the file name of a file with the MD5 hash `md5` and the original
+    file name `name`. The files are sharded into directories by the first
+    two bytes of the hash.
+    """
+
+    extension = os.path.splitext(name)[1].lower()
+    return "/".join([md5[:2], md5[2:4], md5 + extension])
+
+
 def open_file(name):
+    """Opens a stored file for reading and decompresses it if needed."""
+
     assert is_string(name)
 
-    return open(filename_to_path(name), "rb")
+    path = filename_to_path(name)
+    try:
+        return open(path, "rb")
+    except IOError as e:
+        if e.errno != errno.ENOENT:
+            raise
 
+    return gzip.open(path + COMPRESSED_SUFFIX, "rb")
 
-def next_filename(name):
-    assert is_string(name)
 
-    i = name.rfind(".")
+@contextmanager
+def local_path(name):
+    """
+    Yields the path of an uncompressed copy of a stored file, for libraries
+    which can only read files by their path.
+    """
 
-    match = igc_filename_numbers_regex.match(name[:i])
+    assert is_string(name)
 
-    try:
-        number = int(match.group(2))
-        return "%s_%i%s" % (match.group(1), number + 1, name[i:])
+    path = filename_to_path(name)
+    if os.path.exists(path) or not os.path.exists(path + COMPRESSED_SUFFIX):
+        yield path
+        return
 
-    except AttributeError:
-        pass
+    with NamedTemporaryFile(
+        suffix=os.path.splitext(name)[1],
+        dir=current_app.config.get("SKYLINES_TEMPORARY_DIR"),
+    ) as tmp:
+        with gzip.open(path + COMPRESSED_SUFFIX, "rb") as f:
+            shutil.copyfileobj(f, tmp)
 
-    return "%s_1%s" % (name[:i], name[i:])
+        tmp.flush()
+        yield tmp.name
 
 
 def add_file(name, f):
+    """
+    Stores the content of the file-like object `f` and returns its file name
+    and MD5 hash.
+
+    The hash is calculated while the file is written to a temporary file,
+    which is then moved to the name returned by `content_filename()`. If a
+    file with the same content is stored already, the copy is discarded and
+    the name of the existing file is returned.
+    """
+
     assert is_string(name)
 
-    while True:
+    compression = current_app.config.get("SKYLINES_FILES_COMPRESSION")
+    if compression not in (None, "gzip"):
+        raise ValueError("Unknown compression: %s" % compression)
+
+    md5 = hashlib.md5()
+
+    fd, tmp_path = mkstemp(
+        prefix=".upload-", dir=current_app.config["SKYLINES_FILES_PATH"]
+    )
+
+    try:
+        with os.fdopen(fd, "wb") as dest:
+            if compression:
+                out = gzip.GzipFile(filename="", mode="wb", fileobj=dest)
+            else:
+                out = dest
+
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                md5.update(chunk)
+                out.write(chunk)
+
+            if compression:
+                out.close()
+
+        md5 = md5.hexdigest()
+        name = content_filename(md5, name)
+
         path = filename_to_path(name)
-        if not os.access(path, os.F_OK):
-            break
-        name = next_filename(name)
+        if os.path.exists(path) or os.path.exists(path + COMPRESSED_SUFFIX):
+            return name, md5
 
-    dest = open(path, "wb")
-    shutil.copyfileobj(f, dest)
-    dest.close()
+        if compression:
+            path += COMPRESSED_SUFFIX
 
-    return name
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+        os.rename(tmp_path, path)
+
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+    return name, md5
 
 
 def delete_file(name):
     assert is_string(name)
 
     path = filename_to_path(name)
-    try:
-        os.unlink(path)
-    except OSError:
-        pass
+    for suffix in ("", COMPRESSED_SUFFIX):
+        try:
+            os.unlink(path + suffix)
+        except OSError:
+            pass
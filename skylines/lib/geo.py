@@ -6,17 +6,27 @@ EARTH_RADIUS = 6367009
 METERS_PER_DEGREE = 111319.0
 FEET_PER_METER = 3.2808399
 
+# semi-major axis and flattening of the WGS84 spheroid
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+
 
 def geographic_distance(loc1, loc2):
     """
     Calculate the great circle distance between two points
     on the earth (specified in decimal degrees)
     """
-    # convert decimal degrees to radians
-    lat1, lon1, lat2, lon2 = map(
-        math.radians, [loc1.latitude, loc1.longitude, loc2.latitude, loc2.longitude]
+    return haversine_distance(
+        loc1.latitude, loc1.longitude, loc2.latitude, loc2.longitude
     )
 
+
+def haversine_distance(lat1, lon1, lat2, lon2):
+    """`geographic_distance()` of two points given as decimal degrees"""
+
+    # convert decimal degrees to radians
+    lat1, lon1, lat2, lon2 = map(math.radians, [lat1, lon1, lat2, lon2])
+
     # haversine formula
     dlon = lon2 - lon1
     dlat = lat2 - lat1
@@ -28,3 +38,84 @@ def geographic_distance(loc1, loc2):
     c = 2 * math.asin(math.sqrt(a))
 
     return EARTH_RADIUS * c
+
+
+def spheroid_distance(lat1, lon1, lat2, lon2):
+    """
+    Distance in meters between two points given as decimal degrees on the
+    WGS84 spheroid, like `ST_Distance()` of PostGIS geographies. Uses
+    Vincenty's inverse formula, which may not converge for nearly antipodal
+    points; `haversine_distance()` is returned in that case.
+    """
+
+    a = WGS84_A
+    f = WGS84_F
+    b = a * (1 - f)
+
+    L = math.radians(lon2 - lon1)
+    U1 = math.atan((1 - f) * math.tan(math.radians(lat1)))
+    U2 = math.atan((1 - f) * math.tan(math.radians(lat2)))
+
+    sin_u1, cos_u1 = math.sin(U1), math.cos(U1)
+    sin_u2, cos_u2 = math.sin(U2), math.cos(U2)
+
+    lam = L
+    for i in range(100):
+        sin_lam, cos_lam = math.sin(lam), math.cos(lam)
+
+        sin_sigma = math.sqrt(
+            (cos_u2 * sin_lam) ** 2 + (cos_u1 * sin_u2 - sin_u1 * cos_u2 * cos_lam) ** 2
+        )
+        if sin_sigma == 0:
+            return 0.0
+
+        cos_sigma = sin_u1 * sin_u2 + cos_u1 * cos_u2 * cos_lam
+        sigma = math.atan2(sin_sigma, cos_sigma)
+
+        sin_alpha = cos_u1 * cos_u2 * sin_lam / sin_sigma
+        cos2_alpha = 1 - sin_alpha ** 2
+
+        # points on the equator
+        cos_2sigma_m = 0.0
+        if cos2_alpha != 0:
+            cos_2sigma_m = cos_sigma - 2 * sin_u1 * sin_u2 / cos2_alpha
+
+        C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+
+        last_lam = lam
+        lam = L + (1 - C) * f * sin_alpha * (
+            sigma
+            + C
+            * sin_sigma
+            * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2))
+        )
+
+        if abs(lam - last_lam) < 1e-12:
+            break
+
+    else:
+        return haversine_distance(lat1, lon1, lat2, lon2)
+
+    u2 = cos2_alpha * (a * a - b * b) / (b * b)
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+
+    delta_sigma = (
+        B
+        * sin_sigma
+        * (
+            cos_2sigma_m
+            + B
+            / 4
+            * (
+                cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+                - B
+                / 6
+                * cos_2sigma_m
+                * (-3 + 4 * sin_sigma ** 2)
+                * (-3 + 4 * cos_2sigma_m ** 2)
+            )
+        )
+    )
+
+    return b * A * (sigma - delta_sigma)
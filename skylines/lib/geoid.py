@@ -37,13 +37,29 @@ LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF
 THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 import csv
+import mmap
 import os
-
+import struct
 
 """
 geoid model
 notes  : geoid heights are derived from EGM96 (1 x 1 deg grid)
+
+The grid is stored in `backend/geoid_egm96.bin` as little-endian 32-bit floats
+for the longitudes 0 to 360 and within them the latitudes -90 to 90, which is
+generated from `backend/geoid_egm96.csv` by `compile_geoid()`. The file is
+memory-mapped on first use, so all processes on the machine share its pages.
 """
+
+BACKEND_PATH = os.path.realpath(os.path.join(__file__, "..", "..", "..", "backend"))
+CSV_PATH = os.path.join(BACKEND_PATH, "geoid_egm96.csv")
+GRID_PATH = os.path.join(BACKEND_PATH, "geoid_egm96.bin")
+
+# number of latitudes per longitude
+ROWS = 181
+
+_value = struct.Struct("<f")
+
 geoid_egm96 = None
 
 
@@ -52,11 +68,23 @@ def egm96_height(location):
     Calculate the geoid height from the egm96 1" x 1" grid geoid
     """
 
-    if geoid_egm96 is None:
-        return 0
+    return _interpolate(load_geoid(), location.latitude, location.longitude)
+
+
+def egm96_heights(latitudes, longitudes):
+    """Returns the geoid heights for lists of latitudes and longitudes."""
+
+    grid = load_geoid()
+
+    return [
+        _interpolate(grid, latitude, longitude)
+        for latitude, longitude in zip(latitudes, longitudes)
+    ]
+
 
-    a = location.longitude
-    b = location.latitude + 90.0
+def _interpolate(grid, latitude, longitude):
+    a = longitude % 360.0
+    b = latitude + 90.0
 
     i1 = int(a)
     a -= i1
@@ -66,12 +94,10 @@ def egm96_height(location):
     b -= j1
     j2 = j1 + 1 if j1 < 180 else j1
 
-    y = [
-        geoid_egm96[i1][j1],
-        geoid_egm96[i2][j1],
-        geoid_egm96[i1][j2],
-        geoid_egm96[i2][j2],
-    ]
+    def value(i, j):
+        return _value.unpack_from(grid, (i * ROWS + j) * _value.size)[0]
+
+    y = [value(i1, j1), value(i2, j1), value(i1, j2), value(i2, j2)]
 
     # bilinear interpolation
     return (
@@ -83,12 +109,23 @@ def egm96_height(location):
 
 
 def load_geoid():
+    """Memory-maps the grid, if that hasn't happened yet, and returns it."""
+
     global geoid_egm96
 
-    path = os.path.realpath(
-        os.path.join(__file__, "..", "..", "..", "backend", "geoid_egm96.csv")
-    )
+    if geoid_egm96 is None:
+        with open(GRID_PATH, "rb") as f:
+            geoid_egm96 = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    return geoid_egm96
+
 
-    with open(path, "r") as f:
+def compile_geoid(csv_path=CSV_PATH, path=GRID_PATH):
+    """Converts the CSV file of the grid to the file read by `load_geoid()`."""
+
+    with open(csv_path, "r") as f:
         reader = csv.reader(f, quoting=csv.QUOTE_NONNUMERIC)
-        geoid_egm96 = list(reader)
+        values = [value for row in reader for value in row]
+
+    with open(path, "wb") as f:
+        f.write(struct.pack("<%df" % len(values), *values))
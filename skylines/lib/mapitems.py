@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""
+Point lookups of the airspace and the mountain waves for `/mapitems`, which
+are answered from in-memory indexes instead of the database.
+"""
+
+import math
+from collections import namedtuple
+
+from shapely.geometry import Point, box
+
+from skylines.lib.geo import METERS_PER_DEGREE, WGS84_F, spheroid_distance
+from skylines.lib.spatial_index import STRtreeIndex
+from skylines.model import Airspace, MountainWaveProject
+
+# mountain waves within this distance of the location are returned (in meters)
+WAVE_RADIUS = 5000
+
+AirspaceItem = namedtuple(
+    "AirspaceItem", ["id", "name", "airspace_class", "base", "top", "country_code"]
+)
+
+WaveItem = namedtuple("WaveItem", ["id", "name", "main_wind_direction"])
+
+
+class AirspaceIndex(STRtreeIndex):
+    model = Airspace
+    geometry = "the_geom"
+    item = AirspaceItem
+
+    def get(self, location):
+        """Returns the airspaces containing the location, like `by_location()`."""
+
+        point = Point(location.longitude, location.latitude)
+
+        return sorted(item for geom, item in self.query(point) if geom.contains(point))
+
+
+class WaveIndex(STRtreeIndex):
+    model = MountainWaveProject
+    geometry = "location"
+    item = WaveItem
+
+    def get(self, location, radius=WAVE_RADIUS):
+        """
+        Returns the mountain waves within `radius` meters of the location on
+        the spheroid, like `by_location()`.
+        """
+
+        # the degrees of latitude on the spheroid are shortest at the equator
+        dlat = radius / (METERS_PER_DEGREE * (1 - WGS84_F) ** 2)
+        dlon = dlat / max(math.cos(math.radians(location.latitude)), 0.01)
+
+        bbox = box(
+            location.longitude - dlon,
+            location.latitude - dlat,
+            location.longitude + dlon,
+            location.latitude + dlat,
+        )
+
+        waves = []
+        for geom, item in self.query(bbox):
+            distance = spheroid_distance(
+                location.latitude, location.longitude, geom.y, geom.x
+            )
+            if distance <= radius:
+                waves.append(item)
+
+        return sorted(waves)
+
+
+airspace_index = AirspaceIndex()
+wave_index = WaveIndex()
+
+
+def get_airspaces(location):
+    return airspace_index.get(location)
+
+
+def get_waves(location):
+    return wave_index.get(location)
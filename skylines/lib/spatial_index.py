@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+"""
+In-memory indexes of database tables, which are built on first use in every
+process and rebuilt when the table changes, e.g. because the import commands
+have run.
+"""
+
+import os
+import pickle
+import time
+from glob import glob
+
+from flask import current_app
+from geoalchemy2.shape import to_shape
+from shapely.strtree import STRtree
+from sqlalchemy.sql.expression import func
+
+from skylines.database import db
+
+
+def table_version(model):
+    """
+    Returns a string that changes whenever rows are added to or removed from
+    the table of the model, or `time_modified` of a row is updated. Tables
+    without `time_modified` are only expected to be replaced as a whole.
+    """
+
+    if not hasattr(model, "time_modified"):
+        count, max_id = db.session.query(func.count(model.id), func.max(model.id)).one()
+        return "%d-%s" % (count, max_id)
+
+    count, modified = db.session.query(
+        func.count(model.id), func.max(model.time_modified)
+    ).one()
+
+    return "%d-%s" % (count, modified and modified.strftime("%Y%m%d%H%M%S%f"))
+
+
+class TableIndex(object):
+    """
+    Base class of the indexes of the `model` table. The subclasses drop
+    their data in `clear()`, which is called when the table has changed.
+    This is checked at most every `SKYLINES_INDEX_CHECK_INTERVAL` seconds.
+    """
+
+    model = None
+
+    def __init__(self):
+        self.version = None
+        self.checked = 0
+
+    def check_version(self):
+        interval = current_app.config.get("SKYLINES_INDEX_CHECK_INTERVAL", 60)
+
+        now = time.time()
+        if self.version is not None and now - self.checked < interval:
+            return
+
+        version = table_version(self.model)
+        if version != self.version:
+            self.clear()
+            self.version = version
+
+        self.checked = now
+
+    def cache_path(self, name, version=None):
+        directory = current_app.config.get("SKYLINES_INDEX_PATH")
+        if not directory:
+            return None
+
+        return os.path.join(directory, "%s-%s.pickle" % (name, version or self.version))
+
+    def read_cache(self, name):
+        """
+        Returns the data stored by `write_cache()` for the current version of
+        the table, or None.
+        """
+
+        path = self.cache_path(name)
+        if path is None:
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                return pickle.load(f)
+
+        except (IOError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def write_cache(self, name, data):
+        """
+        Pickles the data to `SKYLINES_INDEX_PATH`, if it is configured, so
+        that other processes don't need to load it from the database.
+        """
+
+        path = self.cache_path(name)
+        if path is None:
+            return
+
+        # remove the files of the previous versions first
+        for old_path in glob(self.cache_path(name, version="*")):
+            try:
+                os.unlink(old_path)
+            except OSError:
+                pass
+
+        # write to a temporary file first, so that other processes never see
+        # a partially written file
+        tmp_path = "%s.%d.tmp" % (path, os.getpid())
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+
+            os.rename(tmp_path, path)
+
+        except (IOError, OSError):
+            pass
+
+
+class STRtreeIndex(TableIndex):
+    """
+    A `TableIndex` of the geometries returned by `load()`, which are kept in
+    an STRtree.
+
+    By default the `geometry` column of the rows is loaded together with an
+    `item` namedtuple of the model columns with the same names.
+    """
+
+    # name of the geometry column of the `model`
+    geometry = None
+
+    # namedtuple of the columns that are returned for every geometry
+    item = None
+
+    def __init__(self):
+        super(STRtreeIndex, self).__init__()
+        self.clear()
+
+    def clear(self):
+        self.tree = None
+        self.items = {}
+
+    def load(self):
+        """Returns a list of `(geometry, item)` tuples."""
+
+        geometry = getattr(self.model, self.geometry)
+        columns = [getattr(self.model, name) for name in self.item._fields]
+
+        query = db.session.query(geometry, *columns).filter(geometry != None)
+
+        return [(to_shape(row[0]), self.item(*row[1:])) for row in query]
+
+    def query(self, geometry):
+        """
+        Returns the `(geometry, item)` tuples whose geometries have an
+        envelope intersecting the envelope of `geometry`.
+        """
+
+        self.check_version()
+
+        if self.tree is None:
+            rows = self.load()
+
+            # the tree returns the geometry objects that were inserted
+            self.items = dict((id(geom), (geom, item)) for geom, item in rows)
+            self.tree = STRtree([geom for geom, item in rows])
+
+        return [self.items[id(geom)] for geom in self.tree.query(geometry)]
@@ -1,4 +1,4 @@
-from sqlalchemy.sql import func, ColumnElement, literal_column, cast, and_
+from sqlalchemy.sql import func, select, ColumnElement, literal_column, cast, and_
 from sqlalchemy.types import String, Integer
 from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm.properties import ColumnProperty
@@ -61,6 +61,17 @@ class _ST_Contains(GenericFunction):
     type = None
 
 
+def advisory_xact_lock(session, *key):
+    """
+    Takes a PostgreSQL advisory lock on the key that is held until the end
+    of the current transaction. The key is hashed, so that unrelated keys
+    may block each other on collisions, but never run concurrently.
+    """
+
+    key = ":".join(str(part) for part in key)
+    session.execute(select([func.pg_advisory_xact_lock(func.hashtext(key))]))
+
+
 def query_to_sql(query):
     """
     Convert a sqlalchemy query to raw SQL.
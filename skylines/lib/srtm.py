@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+Elevation lookups in the SRTM tiles that are prepared by `srtm/extract.sh`.
+
+The tiles are `.hgt` files (e.g. `N47E011.hgt`) containing a square grid of
+big-endian 16-bit integers, starting at the north-west corner of the tile.
+The files are memory-mapped, so all processes on the machine share the same
+pages of the tiles.
+"""
+
+import math
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+
+VOID = -32768
+
+_sample = struct.Struct(">h")
+
+_samplers = {}
+
+
+def tile_name(latitude, longitude):
+    """Returns the name of the tile that contains the given coordinates."""
+
+    lat = int(math.floor(latitude))
+    lon = int(math.floor(longitude))
+
+    return "%s%02d%s%03d.hgt" % (
+        "N" if lat >= 0 else "S",
+        abs(lat),
+        "E" if lon >= 0 else "W",
+        abs(lon),
+    )
+
+
+class Tile(object):
+    def __init__(self, path, latitude, longitude):
+        # coordinates of the south-west corner
+        self.latitude = latitude
+        self.longitude = longitude
+
+        with open(path, "rb") as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.size = int(round(math.sqrt(len(self.data) // 2)))
+        if self.size * self.size * 2 != len(self.data):
+            raise ValueError("%s is not a valid SRTM tile" % path)
+
+    def value(self, row, column):
+        value = _sample.unpack_from(self.data, (row * self.size + column) * 2)[0]
+        return None if value == VOID else value
+
+    def get(self, latitude, longitude):
+        """Returns the bilinear interpolated elevation at the given point."""
+
+        n = self.size - 1
+
+        y = (self.latitude + 1 - latitude) * n
+        x = (longitude - self.longitude) * n
+
+        row = min(max(int(y), 0), n - 1)
+        column = min(max(int(x), 0), n - 1)
+
+        dy = y - row
+        dx = x - column
+
+        elevation = 0
+        for r, c, weight in (
+            (row, column, (1 - dy) * (1 - dx)),
+            (row, column + 1, (1 - dy) * dx),
+            (row + 1, column, dy * (1 - dx)),
+            (row + 1, column + 1, dy * dx),
+        ):
+            # voids only matter if they contribute to the result
+            if weight == 0:
+                continue
+
+            value = self.value(r, c)
+            if value is None:
+                return None
+
+            elevation += value * weight
+
+        return elevation
+
+
+class ElevationSampler(object):
+    """
+    Answers elevation lookups from a directory of SRTM tiles.
+
+    At most `max_tiles` tiles are kept in the cache. The sampler is shared
+    by all threads of the process; evicted tiles are not closed explicitly,
+    but unmapped once no other thread is reading them anymore.
+    """
+
+    def __init__(self, path, max_tiles=64):
+        self.path = path
+        self.max_tiles = max_tiles
+
+        self._tiles = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_tile(self, latitude, longitude):
+        lat = int(math.floor(latitude))
+        lon = int(math.floor(longitude))
+
+        key = (lat, lon)
+
+        with self._lock:
+            tile = self._tiles.pop(key, False)
+
+            if tile is False:
+                path = os.path.join(self.path, tile_name(lat, lon))
+                tile = Tile(path, lat, lon) if os.path.exists(path) else None
+
+            # (re)insert at the end to keep the dict in least-recently-used
+            # order
+            self._tiles[key] = tile
+
+            while len(self._tiles) > self.max_tiles:
+                self._tiles.popitem(last=False)
+
+        return tile
+
+    def has_tiles(self, coordinates):
+        """
+        Returns True if the tiles of all `(latitude, longitude)` tuples
+        are available.
+        """
+
+        keys = set()
+        for latitude, longitude in coordinates:
+            keys.add((int(math.floor(latitude)), int(math.floor(longitude))))
+
+        return all(self.get_tile(lat, lon) is not None for lat, lon in keys)
+
+    def get(self, latitude, longitude):
+        """
+        Returns the elevation at the given coordinates or None if it is
+        unknown.
+        """
+
+        tile = self.get_tile(latitude, longitude)
+        if tile is None:
+            return None
+
+        return tile.get(latitude, longitude)
+
+    def get_many(self, coordinates):
+        """
+        Returns a list of elevations for a sequence of
+        `(latitude, longitude)` tuples.
+        """
+
+        elevations = []
+
+        tile = None
+        for latitude, longitude in coordinates:
+            # consecutive points are usually located in the same tile
+            if tile is None or not (
+                tile.latitude <= latitude < tile.latitude + 1
+                and tile.longitude <= longitude < tile.longitude + 1
+            ):
+                tile = self.get_tile(latitude, longitude)
+
+            if tile is None:
+                elevations.append(None)
+            else:
+                elevations.append(tile.get(latitude, longitude))
+
+        return elevations
+
+
+def get_sampler(coordinates=()):
+    """
+    Returns the `ElevationSampler` for the tiles in `SKYLINES_ELEVATION_PATH`
+    or None if that directory does not exist or if a tile of the
+    `(latitude, longitude)` tuples in `coordinates` is missing. The
+    elevations are looked up in the `elevations` table in that case.
+    """
+
+    path = current_app.config.get("SKYLINES_ELEVATION_PATH")
+    if not path or not os.path.isdir(path):
+        return None
+
+    sampler = _samplers.get(path)
+    if sampler is None:
+        sampler = _samplers.setdefault(path, ElevationSampler(path))
+
+    if not sampler.has_tiles(coordinates):
+        return None
+
+    return sampler
@@ -1,42 +1,139 @@
+import hashlib
 from math import ceil
 
-from flask import request, abort, g
-from sqlalchemy.sql.expression import asc, desc
+from flask import request, abort, current_app, g
+from sqlalchemy.sql.expression import and_, asc, desc, false, or_
+
+from skylines.lib.cache import cache
+
+
+def cached_count(query):
+    """
+    Returns `query.count()`, which is cached for
+    `SKYLINES_LISTS_COUNT_CACHE_TIMEOUT` seconds per SQL statement and
+    parameters, i.e. per filter combination.
+    """
+
+    timeout = current_app.config.get("SKYLINES_LISTS_COUNT_CACHE_TIMEOUT")
+    if not timeout:
+        return query.count()
+
+    statement = query.statement.compile()
+    key = u"%s %r" % (statement, sorted(statement.params.items()))
+    key = "count_" + hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+    count = cache.get(key)
+    if count is None:
+        count = query.count()
+        cache.set(key, count, timeout=timeout)
+
+    return count
+
+
+def keyset_filter(keys, values):
+    """
+    Returns the filter for the rows after the row with the `values` of the
+    `keys`, a list of `(column, order)` tuples the query is ordered by. The
+    last key must be unique. NULL sorts after all values like in PostgreSQL.
+    """
+
+    clauses = []
+    for i, (column, order) in enumerate(keys):
+        value = values[i]
+
+        if order == "asc":
+            after = false() if value is None else or_(column > value, column == None)
+        else:
+            after = column != None if value is None else column < value
+
+        equal = [
+            column_ == None if value_ is None else column_ == value_
+            for (column_, order_), value_ in zip(keys[:i], values[:i])
+        ]
+
+        clauses.append(and_(*(equal + [after])))
+
+    return or_(*clauses)
 
 
 class Pager:
-    def __init__(self, page, count, items_per_page=20):
+    def __init__(self, page, count, items_per_page=20, cursor=None):
         self.count = count
         self.items_per_page = items_per_page
+        self.cursor = cursor
 
         self.page_count = int(ceil(count / float(items_per_page)))
         self.first_page = 1
         self.last_page = self.page_count
 
+        # with a cursor the position of the page is not known
+        if cursor is not None:
+            self.page = None
+            self.offset = None
+            self.back_offset = None
+            return
+
         self.page = max(min(page, self.last_page), self.first_page)
 
         self.offset = (self.page - 1) * items_per_page
         self.back_offset = min(self.offset + self.items_per_page, self.count)
 
     @classmethod
-    def paginate(cls, query, name, items_per_page=20):
-        count = query.count()
+    def paginate(cls, query, name, items_per_page=20, count=None, keys=None):
+        """
+        Returns the requested page of the query. The page is selected by the
+        `page` argument, or by the `cursor` argument if the `keys` that the
+        query is ordered by are passed (see `keyset_filter()`). The cursor is
+        the last key of the last row of the previous page, so that the
+        database doesn't need to skip the rows of all previous pages.
+
+        `count` may be passed if it is already known, e.g. from
+        `cached_count()`.
+        """
+
+        if count is None:
+            count = query.count()
 
         try:
-            page = int(request.args.get("page", 1))
+            cursor = request.args.get("cursor")
+            if cursor is not None:
+                cursor = int(cursor)
+                page = None
+            else:
+                page = int(request.args.get("page", 1))
         except:
             abort(400)
 
-        pager = cls(page, count, items_per_page)
+        if cursor is not None and not keys:
+            abort(400)
+
+        pager = cls(page, count, items_per_page, cursor=cursor)
 
         if not hasattr(g, "paginators"):
             g.paginators = {}
 
         g.paginators[name] = pager
 
-        return query.limit(items_per_page).offset(pager.offset)
+        if cursor is None:
+            return query.limit(items_per_page).offset(pager.offset)
+
+        columns = [column for column, order in keys]
+
+        values = (
+            query.with_entities(*columns)
+            .filter(columns[-1] == cursor)
+            .order_by(None)
+            .first()
+        )
+        if values is None:
+            abort(400)
+
+        return query.filter(keyset_filter(keys, values)).limit(items_per_page)
 
     def args(self):
+        if self.cursor is not None:
+            return dict(cursor=self.cursor)
+
         return dict(page=self.page)
 
 
@@ -69,5 +166,10 @@ class Sorter:
         else:
             abort(400)
 
+    def keys(self):
+        """Returns the `(column, order)` keys for `Pager.paginate()`."""
+
+        return [(self.valid_columns[self.column], self.order)]
+
     def args(self):
         return dict(column=self.column, order=self.order)
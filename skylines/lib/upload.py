@@ -0,0 +1,353 @@
+"""
+Processing of uploaded IGC files, shared by the upload API and the
+background worker.
+"""
+
+import hashlib
+import os
+import signal
+from collections import namedtuple
+from datetime import datetime
+from enum import IntEnum
+from multiprocessing import Pool
+
+import xcsoar
+from flask import current_app
+
+from skylines.database import db
+from skylines.lib import files
+from skylines.lib.cache import cache
+from skylines.lib.string import to_unicode
+from skylines.lib.util import pressure_alt_to_qnh_alt
+from skylines.lib.xcsoar_ import flight_path, analyse_flight, FlightPath
+from skylines.lib.xcsoar_.analysis import run_analyse_flight
+from skylines.model import Flight, IGCFile, Airspace
+from skylines.model.airspace import get_airspace_infringements
+from skylines.model.notification import create_flight_notifications
+
+
+class UploadStatus(IntEnum):
+    SUCCESS = 0
+    DUPLICATE = 1  # _('Duplicate file')
+    MISSING_DATE = 2  # _('Date missing in IGC file')
+    PARSER_ERROR = 3  # _('Failed to parse file')
+    NO_FLIGHT = 4  # _('No flight found in file')
+    FLIGHT_IN_FUTURE = 5  # _('Date of flight in future')
+    PENDING = 6  # _('Processing file')
+
+
+class UploadResult(
+    namedtuple(
+        "UploadResult",
+        ["name", "flight", "status", "prefix", "trace", "airspace", "cache_key"],
+    )
+):
+    @classmethod
+    def for_duplicate(cls, name, other, prefix):
+        return cls(name, other, UploadStatus.DUPLICATE, prefix, None, None, None)
+
+    @classmethod
+    def for_missing_date(cls, name, prefix):
+        return cls(name, None, UploadStatus.MISSING_DATE, prefix, None, None, None)
+
+    @classmethod
+    def for_parser_error(cls, name, prefix):
+        return cls(name, None, UploadStatus.PARSER_ERROR, prefix, None, None, None)
+
+    @classmethod
+    def for_no_flight(cls, name, prefix):
+        return cls(name, None, UploadStatus.NO_FLIGHT, prefix, None, None, None)
+
+    @classmethod
+    def for_future_flight(cls, name, prefix):
+        return cls(name, None, UploadStatus.FLIGHT_IN_FUTURE, prefix, None, None, None)
+
+    @classmethod
+    def for_pending(cls, name, prefix):
+        return cls(name, None, UploadStatus.PENDING, prefix, None, None, None)
+
+    def to_dict(self):
+        """
+        Converts the result to a dict without database objects, which is
+        returned by the upload task.
+        """
+
+        return dict(
+            name=self.name,
+            flight_id=self.flight and self.flight.id,
+            status=int(self.status),
+            prefix=self.prefix,
+            trace=self.trace,
+            airspace_ids=[airspace.id for airspace in self.airspace or []],
+            cache_key=self.cache_key,
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """Loads the flight and airspaces of a `to_dict()` result."""
+
+        flight = data["flight_id"] and Flight.get(data["flight_id"])
+
+        airspace = None
+        if data["airspace_ids"]:
+            airspace = Airspace.query().filter(Airspace.id.in_(data["airspace_ids"]))
+            airspace = airspace.all()
+
+        return cls(
+            data["name"],
+            flight,
+            UploadStatus(data["status"]),
+            data["prefix"],
+            data["trace"],
+            airspace,
+            data["cache_key"],
+        )
+
+
+def store_file(name, f):
+    """Stores an uploaded file and returns its file name and MD5 hash."""
+
+    return files.add_file(files.sanitise_filename(name), f)
+
+
+PreparedFile = namedtuple("PreparedFile", ["fp", "analysis", "trace", "infringements"])
+
+
+def prepare_file(filename):
+    """
+    Decodes and analyses a stored IGC file and checks it for airspace
+    infringements. This is the expensive part of `process_file()`, which
+    only reads from the database and may therefore run in another process.
+    """
+
+    try:
+        with files.local_path(filename) as path:
+            fp = flight_path(path, add_elevation=True, max_points=None)
+
+        analysis, fp = run_analyse_flight(
+            Flight(), full=512, triangle=1024, sprint=64, fp=fp
+        )
+    except:
+        current_app.logger.exception("analyse_flight() raised an exception")
+        return PreparedFile(None, None, None, None)
+
+    if analysis is None:
+        return PreparedFile(fp, None, None, None)
+
+    # used by Flight.update_flight_path(), the reduced path is pickled with
+    # the flight path if this runs in a worker process
+    fp.reduce(1000)
+
+    qnh = analysis.get("qnh")
+
+    return PreparedFile(
+        fp,
+        analysis,
+        encode_flight_path(fp, qnh=qnh),
+        get_airspace_infringements(fp, qnh=qnh),
+    )
+
+
+def prepare_files(stored):
+    """
+    Runs `prepare_file()` for multiple stored files in parallel, if
+    `SKYLINES_UPLOAD_PROCESSES` is configured. `stored` is a list of
+    `store_file()` results. Returns a list with a `PreparedFile` or None for
+    every file, which `process_file()` prepares itself if needed.
+    """
+
+    pool = get_pool()
+    if pool is None or len(stored) < 2:
+        return [None] * len(stored)
+
+    # duplicates are rejected by process_file() without analysing them, the
+    # flights of the files in this upload are not flushed yet
+    md5s = set()
+    jobs = []
+    for filename, md5 in stored:
+        if md5 in md5s or Flight.by_md5(md5):
+            jobs.append(None)
+            continue
+
+        md5s.add(md5)
+        jobs.append(pool.apply_async(prepare_file, (filename,)))
+
+    return [job and job.get() for job in jobs]
+
+
+_pool = None
+_pool_pid = None
+
+
+def get_pool():
+    """
+    Returns the process pool for `prepare_files()` of this process, or None
+    if `SKYLINES_UPLOAD_PROCESSES` is not configured.
+    """
+
+    global _pool, _pool_pid
+
+    processes = current_app.config.get("SKYLINES_UPLOAD_PROCESSES")
+    if not processes:
+        return None
+
+    # a pool inherited from a parent process can't be used
+    if _pool is None or _pool_pid != os.getpid():
+        _pool = Pool(
+            processes, initializer=_init_worker, initargs=(dict(current_app.config),)
+        )
+        _pool_pid = os.getpid()
+
+    return _pool
+
+
+def _init_worker(config):
+    from skylines.app import create_app
+
+    # the interrupt is handled by the parent process
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # the workers need their own database connections
+    app = create_app()
+    app.config.update(config)
+    app.app_context().push()
+
+
+def process_file(
+    name, filename, md5, prefix, owner, pilot_id, pilot_name, club_id, prepared=None
+):
+    """
+    Analyses a stored IGC file and creates a private flight for it, or
+    deletes the file if no flight can be created from it. The flight is
+    flushed, but not committed.
+
+    `prepared` may be the `prepare_file()` result for the file.
+    """
+
+    # check if the file already exists. The file is shared with the other
+    # flight, so it must not be deleted.
+    other = Flight.by_md5(md5)
+    if other:
+        return UploadResult.for_duplicate(name, other, prefix)
+
+    igc_file = IGCFile()
+    igc_file.owner = owner
+    igc_file.filename = filename
+    igc_file.md5 = md5
+    igc_file.update_igc_headers()
+
+    if igc_file.date_utc is None:
+        files.delete_file(filename)
+        return UploadResult.for_missing_date(name, prefix)
+
+    flight = Flight()
+    flight.pilot_id = pilot_id
+    flight.pilot_name = pilot_name
+    flight.club_id = club_id
+    flight.igc_file = igc_file
+
+    flight.model_id = igc_file.guess_model()
+
+    if igc_file.registration:
+        flight.registration = igc_file.registration
+    else:
+        flight.registration = igc_file.guess_registration()
+
+    flight.competition_id = igc_file.competition_id
+
+    if prepared is None:
+        prepared = prepare_file(filename)
+
+    fp = prepared.fp
+
+    analyzed = False
+    if prepared.analysis is not None:
+        try:
+            analyzed = analyse_flight(flight, fp=fp, analysis=prepared.analysis)
+        except:
+            current_app.logger.exception("analyse_flight() raised an exception")
+
+    if not analyzed:
+        files.delete_file(filename)
+        return UploadResult.for_parser_error(name, prefix)
+
+    if not flight.takeoff_time or not flight.landing_time:
+        files.delete_file(filename)
+        return UploadResult.for_no_flight(name, prefix)
+
+    if flight.landing_time > datetime.now():
+        files.delete_file(filename)
+        return UploadResult.for_future_flight(name, prefix)
+
+    if not flight.update_flight_path(fp):
+        files.delete_file(filename)
+        return UploadResult.for_no_flight(name, prefix)
+
+    flight.privacy_level = Flight.PrivacyLevel.PRIVATE
+
+    trace = prepared.trace
+    infringements = prepared.infringements
+
+    db.session.add(igc_file)
+    db.session.add(flight)
+
+    # flush data to make sure we don't get duplicate files from ZIP files
+    db.session.flush()
+
+    # Store data in cache for image creation
+    cache_key = hashlib.sha1(
+        (to_unicode(flight.id) + u"_" + to_unicode(owner.id)).encode("utf-8")
+    ).hexdigest()
+
+    cache.set(
+        "upload_airspace_infringements_" + cache_key, infringements, timeout=15 * 60
+    )
+    cache.set(
+        "upload_airspace_flight_path_" + cache_key, FlightPath(fp), timeout=15 * 60,
+    )
+
+    airspace = (
+        db.session.query(Airspace).filter(Airspace.id.in_(infringements.keys())).all()
+    )
+
+    create_flight_notifications(flight)
+
+    return UploadResult(
+        name, flight, UploadStatus.SUCCESS, prefix, trace, airspace, cache_key
+    )
+
+
+def encode_flight_path(fp, qnh):
+    # Reduce to 1000 points maximum with equal spacing
+    shortener = int(max(1, len(fp) / 1000))
+
+    barogram_h = xcsoar.encode(
+        [
+            pressure_alt_to_qnh_alt(fix.pressure_altitude, qnh)
+            for fix in fp[::shortener]
+        ],
+        method="signed",
+    )
+    barogram_t = xcsoar.encode(
+        [fix.seconds_of_day for fix in fp[::shortener]], method="signed"
+    )
+    enl = xcsoar.encode(
+        [fix.enl if fix.enl is not None else 0 for fix in fp[::shortener]],
+        method="signed",
+    )
+    elevations_h = xcsoar.encode(
+        [
+            fix.elevation if fix.elevation is not None else -1000
+            for fix in fp[::shortener]
+        ],
+        method="signed",
+    )
+
+    return dict(
+        barogram_h=barogram_h,
+        barogram_t=barogram_t,
+        enl=enl,
+        elevations_h=elevations_h,
+        igc_start_time=fp[0].datetime,
+        igc_end_time=fp[-1].datetime,
+    )
@@ -6,8 +6,18 @@ from flask import current_app
 from skylines.lib import files
 from skylines.lib.util import pressure_alt_to_qnh_alt
 from skylines.lib.datetime import from_seconds_of_day
-from skylines.lib.xcsoar_.flightpath import flight_path, cumulative_distance
-from skylines.model import Airport, Trace, ContestLeg, FlightPhase, TimeZone, Location
+from skylines.lib.xcsoar_.flightpath import (
+    FlightPath,
+    flight_path,
+    cumulative_distance,
+)
+from skylines.model import Airport, Trace, ContestLeg, FlightPhase, Location
+from skylines.model.airport import airport_index
+from skylines.model.timezone import get_timezone
+
+# takeoffs and landings are assigned to airports within this distance (in
+# degrees, like the default of `Airport.by_location()`)
+AIRPORT_DISTANCE_THRESHOLD = 0.025
 
 
 def read_location(node):
@@ -171,19 +181,26 @@ def get_takeoff_date(flight):
     if flight.takeoff_location is None:
         return flight.takeoff_time
 
-    timezone = TimeZone.by_location(flight.takeoff_location)
+    timezone = get_timezone(flight.takeoff_location)
     if timezone is None:
         return flight.takeoff_time
 
     return timezone.fromutc(flight.takeoff_time).date()
 
 
+def get_airport(location, date):
+    airport, distance = airport_index.nearest(
+        location, AIRPORT_DISTANCE_THRESHOLD, date
+    )
+    return airport and Airport.get(airport.id)
+
+
 def save_takeoff(event, flight):
     flight.takeoff_time = import_datetime_attribute(event, "time")
     flight.takeoff_location = read_location(event["location"])
     if flight.takeoff_location is not None:
-        flight.takeoff_airport = Airport.by_location(
-            flight.takeoff_location, date=flight.takeoff_time
+        flight.takeoff_airport = get_airport(
+            flight.takeoff_location, flight.takeoff_time
         )
 
     flight.date_local = get_takeoff_date(flight)
@@ -193,8 +210,8 @@ def save_landing(event, flight):
     flight.landing_time = import_datetime_attribute(event, "time")
     flight.landing_location = read_location(event["location"])
     if flight.landing_location is not None:
-        flight.landing_airport = Airport.by_location(
-            flight.landing_location, date=flight.landing_time
+        flight.landing_airport = get_airport(
+            flight.landing_location, flight.landing_time
         )
 
 
@@ -283,13 +300,14 @@ def save_phases(root, flight):
 
 
 def calculate_leg_statistics(flight, fp):
+    if not isinstance(fp, FlightPath):
+        fp = FlightPath(fp)
+
+    times = fp.datetimes
+
     for leg in flight._legs:
-        start_fix_id = bisect_left(
-            [fix.datetime for fix in fp], leg.start_time, hi=len(fp) - 1
-        )
-        end_fix_id = bisect_left(
-            [fix.datetime for fix in fp], leg.end_time, hi=len(fp) - 1
-        )
+        start_fix_id = bisect_left(times, leg.start_time, hi=len(fp) - 1)
+        end_fix_id = bisect_left(times, leg.end_time, hi=len(fp) - 1)
 
         leg.start_height = int(
             pressure_alt_to_qnh_alt(fp[start_fix_id].pressure_altitude, flight.qnh)
@@ -320,9 +338,7 @@ def calculate_leg_statistics(flight, fp):
                 phase.start_time < leg.start_time
                 and leg.start_time < phase.end_time <= leg.end_time
             ):
-                end_fix = bisect_left(
-                    [fix.datetime for fix in fp], phase.end_time, hi=len(fp) - 1
-                )
+                end_fix = bisect_left(times, phase.end_time, hi=len(fp) - 1)
 
                 end_height = int(
                     pressure_alt_to_qnh_alt(fp[end_fix].pressure_altitude, flight.qnh)
@@ -337,9 +353,7 @@ def calculate_leg_statistics(flight, fp):
                 leg.start_time <= phase.start_time < leg.end_time
                 and phase.end_time > leg.end_time
             ):
-                start_fix = bisect_left(
-                    [fix.datetime for fix in fp], phase.start_time, hi=len(fp) - 1
-                )
+                start_fix = bisect_left(times, phase.start_time, hi=len(fp) - 1)
 
                 start_height = int(
                     pressure_alt_to_qnh_alt(fp[start_fix].pressure_altitude, flight.qnh)
@@ -470,8 +484,7 @@ def run_analyse_flight(flight, full=None, triangle=None, sprint=None, fp=None):
     limits = get_limits()
 
     if not fp:
-        filename = files.filename_to_path(flight.igc_file.filename)
-        fp = flight_path(filename, add_elevation=True, max_points=None)
+        fp = flight_path(flight.igc_file, add_elevation=True, max_points=None)
 
     if len(fp) < 2:
         return None, None
@@ -539,13 +552,22 @@ def run_analyse_flight(flight, full=None, triangle=None, sprint=None, fp=None):
         return None, None
 
 
-def analyse_flight(flight, full=512, triangle=1024, sprint=64, fp=None):
+def analyse_flight(flight, full=512, triangle=1024, sprint=64, fp=None, analysis=None):
+    """
+    Analyses the flight and stores the results. `analysis` may be the
+    result of a `run_analyse_flight()` call for the flight path `fp`, which
+    happened elsewhere.
+    """
+
     path = files.filename_to_path(flight.igc_file.filename)
     current_app.logger.info("Analyzing " + path)
 
-    root, fp = run_analyse_flight(
-        flight, full=full, triangle=triangle, sprint=sprint, fp=fp
-    )
+    if analysis is not None:
+        root = analysis
+    else:
+        root, fp = run_analyse_flight(
+            flight, full=full, triangle=triangle, sprint=sprint, fp=fp
+        )
 
     if root is None:
         current_app.logger.warning("Analyze flight failed.")
@@ -585,5 +607,9 @@ def analyse_flight(flight, full=512, triangle=1024, sprint=64, fp=None):
 
     calculate_leg_statistics(flight, fp)
 
+    # the stored flight paths contain the old contest traces and are keyed
+    # by the modification time (see `encoded_path`)
+    flight.time_modified = datetime.datetime.utcnow()
+
     flight.needs_analysis = False
     return True
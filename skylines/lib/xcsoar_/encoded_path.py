@@ -0,0 +1,292 @@
+"""
+Encoded flight paths, as sent to the flight map by `/flights/<id>/json`.
+
+Encoding a flight path means reading and reducing the IGC file, sampling the
+elevations below the flight and encoding the optimised contest traces, which
+is too expensive to repeat for every request. The encoded path is therefore
+stored in a JSON file next to the IGC file, keyed by the flight id, the MD5
+hash of the IGC file, the modification time of the flight and `VERSION`.
+
+The analysis updates the modification time in the same transaction as the
+results, so that requests that still see the old analysis can only store
+their paths under the old key. The outdated files are removed when the path
+is encoded again.
+"""
+
+import json
+import math
+import os
+from datetime import datetime, timedelta
+from glob import glob
+
+from geoalchemy2.shape import to_shape
+from sqlalchemy.sql.expression import and_, literal_column
+
+import xcsoar
+from skylines.database import db
+from skylines.lib import files, srtm
+from skylines.lib.geoid import egm96_height
+from skylines.model import Elevation, Flight
+
+# increase this number if the encoding or the analysis changes, so that the
+# stored flight paths are encoded again
+VERSION = 1
+
+
+def get_flight_path(flight, threshold=0.0001, max_points=10000):
+    """
+    Returns the encoded flight path from the cache, or encodes and stores it
+    if it's missing.
+    """
+
+    path = cache_path(flight, threshold, max_points)
+
+    try:
+        with open(path) as f:
+            return json.load(f)
+
+    except (IOError, ValueError):
+        pass
+
+    trace = encode_flight_path(flight, threshold=threshold, max_points=max_points)
+
+    # write to a temporary file first, so that concurrent requests never see
+    # a partially written file
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    try:
+        with open(tmp_path, "w") as f:
+            json.dump(trace, f)
+
+        os.rename(tmp_path, path)
+
+    except (IOError, OSError):
+        pass
+
+    else:
+        invalidate(flight, keep=_prefix(flight) + "-%s-" % _stamp(flight))
+
+    return trace
+
+
+def cache_path(flight, threshold=0.0001, max_points=10000):
+    return "%s-%s-%g-%d-v%d.json" % (
+        _prefix(flight),
+        _stamp(flight),
+        threshold,
+        max_points,
+        VERSION,
+    )
+
+
+def invalidate(flight, keep=None):
+    """
+    Removes all stored encoded paths of the flight, except for the paths
+    starting with `keep`.
+    """
+
+    pattern = "%s.%d-*.json" % (
+        files.filename_to_path(flight.igc_file.filename),
+        flight.id,
+    )
+
+    for path in glob(pattern):
+        if keep and path.startswith(keep):
+            continue
+
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+
+def _prefix(flight):
+    return "%s.%d-%s" % (
+        files.filename_to_path(flight.igc_file.filename),
+        flight.id,
+        flight.igc_file.md5,
+    )
+
+
+def _stamp(flight):
+    return flight.time_modified.strftime("%Y%m%d%H%M%S%f")
+
+
+def encode_flight_path(flight, threshold=0.001, max_points=3000):
+    num_levels = 4
+    zoom_factor = 4
+    zoom_levels = [0]
+    zoom_levels.extend(
+        [
+            round(
+                -math.log(
+                    32.0 / 45.0 * (threshold * pow(zoom_factor, num_levels - i - 1)), 2
+                )
+            )
+            for i in range(1, num_levels)
+        ]
+    )
+
+    with files.local_path(flight.igc_file.filename) as path:
+        xcsoar_flight = xcsoar.Flight(path)
+
+    if flight.qnh:
+        xcsoar_flight.setQNH(flight.qnh)
+
+    begin = flight.takeoff_time - timedelta(seconds=2 * 60)
+    end = flight.landing_time + timedelta(seconds=2 * 60)
+
+    if begin > end:
+        begin = datetime.min
+        end = datetime.max
+
+    xcsoar_flight.reduce(
+        begin=begin,
+        end=end,
+        num_levels=num_levels,
+        zoom_factor=zoom_factor,
+        threshold=threshold,
+        max_points=max_points,
+    )
+
+    encoded_flight = xcsoar_flight.encode()
+
+    points = encoded_flight["locations"]
+    barogram_t = encoded_flight["times"]
+    barogram_h = encoded_flight["altitude"]
+    enl = encoded_flight["enl"]
+
+    elevations_t, elevations_h = get_elevations(flight)
+    contest_traces = get_contest_traces(flight)
+
+    geoid_height = (
+        egm96_height(flight.takeoff_location) if flight.takeoff_location else 0
+    )
+
+    return dict(
+        points=points,
+        barogram_t=barogram_t,
+        barogram_h=barogram_h,
+        enl=enl,
+        contests=contest_traces,
+        elevations_t=elevations_t,
+        elevations_h=elevations_h,
+        sfid=flight.id,
+        geoid=geoid_height,
+    )
+
+
+def get_elevations(flight):
+    elevations = get_elevations_for_flight(flight)
+
+    # Encode lists
+    elevations_t = xcsoar.encode([t for t, h in elevations], method="signed")
+    elevations_h = xcsoar.encode([h for t, h in elevations], method="signed")
+
+    return elevations_t, elevations_h
+
+
+def get_contest_traces(flight):
+    contests = [
+        dict(contest_type="olc_plus", trace_type="triangle"),
+        dict(contest_type="olc_plus", trace_type="classic"),
+    ]
+
+    contest_traces = []
+
+    for contest in contests:
+        contest_trace = flight.get_optimised_contest_trace(
+            contest["contest_type"], contest["trace_type"]
+        )
+        if not contest_trace:
+            continue
+
+        fixes = [(x.latitude, x.longitude) for x in contest_trace.locations]
+        times = []
+        for time in contest_trace.times:
+            times.append(
+                flight.takeoff_time.hour * 3600
+                + flight.takeoff_time.minute * 60
+                + flight.takeoff_time.second
+                + (time - flight.takeoff_time).days * 86400
+                + (time - flight.takeoff_time).seconds
+            )
+
+        contest_traces.append(
+            dict(
+                name=contest["contest_type"] + " " + contest["trace_type"],
+                turnpoints=xcsoar.encode(fixes, floor=1e5, method="double"),
+                times=xcsoar.encode(times, method="signed"),
+            )
+        )
+
+    return contest_traces
+
+
+def get_elevations_for_flight(flight):
+    coordinates = [(lat, lon) for lon, lat in to_shape(flight.locations).coords]
+
+    sampler = srtm.get_sampler(coordinates)
+    if sampler is not None:
+        q = list(zip(flight.timestamps, sampler.get_many(coordinates)))
+
+    else:
+        """
+        WITH src AS
+            (SELECT ST_DumpPoints(flights.locations) AS location,
+                    flights.timestamps AS timestamps,
+                    flights.locations AS locations
+            FROM flights
+            WHERE flights.id = 30000)
+        SELECT timestamps[(src.location).path[1]] AS timestamp,
+               ST_Value(elevations.rast, (src.location).geom) AS elevation
+        FROM elevations, src
+        WHERE src.locations && elevations.rast AND (src.location).geom && elevations.rast;
+        """
+
+        # Prepare column expressions
+        location = Flight.locations.ST_DumpPoints()
+
+        # Prepare cte
+        cte = (
+            db.session.query(
+                location.label("location"),
+                Flight.locations.label("locations"),
+                Flight.timestamps.label("timestamps"),
+            )
+            .filter(Flight.id == flight.id)
+            .cte()
+        )
+
+        # Prepare column expressions
+        timestamp = literal_column("timestamps[(location).path[1]]")
+        elevation = Elevation.rast.ST_Value(cte.c.location.geom)
+
+        # Prepare main query
+        q = (
+            db.session.query(timestamp.label("timestamp"), elevation.label("elevation"))
+            .filter(
+                and_(
+                    cte.c.locations.intersects(Elevation.rast),
+                    cte.c.location.geom.intersects(Elevation.rast),
+                )
+            )
+            .all()
+        )
+
+    if len(q) == 0:
+        return []
+
+    start_time = q[0][0]
+    start_midnight = start_time.replace(hour=0, minute=0, second=0, microsecond=0)
+
+    elevations = []
+    for time, elevation in q:
+        if elevation is None:
+            continue
+
+        time_delta = time - start_midnight
+        time = time_delta.days * 86400 + time_delta.seconds
+
+        elevations.append((time, elevation))
+
+    return elevations
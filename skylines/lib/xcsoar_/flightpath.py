@@ -4,10 +4,11 @@ from shapely.geometry import MultiPoint
 from geoalchemy2.shape import from_shape
 
 from skylines.database import db
-from skylines.lib import files
+from skylines.lib import files, srtm
 from skylines.lib.types import is_string
 from skylines.lib.compat import _xrange
-from skylines.model import Elevation, IGCFile, Location
+from skylines.lib.geo import haversine_distance
+from skylines.model import Elevation, IGCFile
 from xcsoar import Flight
 
 _FlightPathFix = namedtuple(
@@ -48,6 +49,79 @@ class FlightPathFix(_FlightPathFix):
         return super(FlightPathFix, cls).__new__(cls, *values)
 
 
+class FlightPath(list):
+    """
+    The decoded fixes of an IGC file.
+
+    An upload decodes the IGC file once and passes this object to all
+    steps that need the flight path, which take the reduced paths and the
+    coordinates from here instead of running XCSoar on the file again.
+    """
+
+    def __init__(self, fixes=()):
+        super(FlightPath, self).__init__(fixes)
+        self._reduced = {}
+        self._coordinates = None
+        self._datetimes = None
+        self._distances = None
+
+    @property
+    def coordinates(self):
+        """The `(longitude, latitude)` tuples of all fixes."""
+
+        if self._coordinates is None:
+            self._coordinates = [
+                (fix.location["longitude"], fix.location["latitude"]) for fix in self
+            ]
+
+        return self._coordinates
+
+    @property
+    def datetimes(self):
+        """The times of all fixes, e.g. for bisecting the path."""
+
+        if self._datetimes is None:
+            self._datetimes = [fix.datetime for fix in self]
+
+        return self._datetimes
+
+    @property
+    def distances(self):
+        """
+        The distances between the fixes in meters. `distances[i]` is the
+        distance from fix `i` to fix `i + 1`.
+        """
+
+        if self._distances is None:
+            coordinates = self.coordinates
+
+            self._distances = [
+                haversine_distance(lat, lon, last_lat, last_lon)
+                for (last_lon, last_lat), (lon, lat) in zip(
+                    coordinates, coordinates[1:]
+                )
+            ]
+
+        return self._distances
+
+    def reduce(self, max_points):
+        """
+        Returns a `FlightPath` with at most `max_points` fixes, like
+        `flight_path()` with the same `max_points`. The chosen fixes may
+        differ slightly, because the coordinates are passed to XCSoar again.
+        """
+
+        reduced = self._reduced.get(max_points)
+        if reduced is None:
+            flight = Flight(self)
+            flight.reduce(threshold=0, max_points=max_points)
+
+            reduced = FlightPath(FlightPathFix(*line) for line in flight.path())
+            self._reduced[max_points] = reduced
+
+        return reduced
+
+
 def run_flight_path(path, max_points=None, qnh=None):
     flight = Flight(path)
 
@@ -62,41 +136,38 @@ def run_flight_path(path, max_points=None, qnh=None):
 
 def flight_path(igc_file, max_points=1000, add_elevation=False, qnh=None):
     if isinstance(igc_file, IGCFile):
-        path = files.filename_to_path(igc_file.filename)
+        with files.local_path(igc_file.filename) as path:
+            output = run_flight_path(path, max_points=max_points, qnh=qnh)
     elif is_string(igc_file):
-        path = igc_file
+        output = run_flight_path(igc_file, max_points=max_points, qnh=qnh)
     else:
         return None
 
-    output = run_flight_path(path, max_points=max_points, qnh=qnh)
-
     if add_elevation and len(output):
         output = get_elevation(output)
 
-    return list(FlightPathFix(*line) for line in output)
+    return FlightPath(FlightPathFix(*line) for line in output)
 
 
 def cumulative_distance(fixes, start_fix, end_fix):
     if start_fix >= end_fix:
         return 0
 
-    distance = 0
-    last_location = None
+    if not isinstance(fixes, FlightPath):
+        fixes = FlightPath(fixes)
 
-    for fix in fixes[start_fix : end_fix + 1]:
-        location = Location(
-            longitude=fix.location["longitude"], latitude=fix.location["latitude"]
-        )
-
-        if last_location:
-            distance += location.geographic_distance(last_location)
-
-        last_location = location
-
-    return distance
+    # summing up the distances one after the other like this gives the same
+    # result as walking the fixes
+    return sum(fixes.distances[start_fix:end_fix])
 
 
 def get_elevation(fixes):
+    sampler = srtm.get_sampler(
+        (fix[2]["latitude"], fix[2]["longitude"]) for fix in fixes
+    )
+    if sampler is not None:
+        return get_local_elevation(sampler, fixes)
+
     shortener = int(max(1, len(fixes) / 1000))
 
     coordinates = [(fix[2]["longitude"], fix[2]["latitude"]) for fix in fixes]
@@ -156,3 +227,17 @@ def get_elevation(fixes):
         fixes_copy[-1][11] = q[-1].elevation
 
     return fixes_copy
+
+
+def get_local_elevation(sampler, fixes):
+    elevations = sampler.get_many(
+        (fix[2]["latitude"], fix[2]["longitude"]) for fix in fixes
+    )
+
+    fixes_copy = [list(fix) for fix in fixes]
+
+    for fix, elevation in zip(fixes_copy, elevations):
+        if elevation is not None:
+            fix[11] = elevation
+
+    return fixes_copy
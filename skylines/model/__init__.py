@@ -18,8 +18,10 @@ from .geo import Location, Bounds
 from .igcfile import IGCFile
 from .mountain_wave_project import MountainWaveProject
 from .notification import Notification
+from .ranking import RankingAggregate
+from .statistics import StatisticsPilot, StatisticsRollup
 from .timezone import TimeZone
 from .trace import Trace
-from .tracking import TrackingFix, TrackingSession
+from .tracking import TrackingFix, TrackingSession, LatestTrackingFix
 from .oauth import AccessToken, RefreshToken, Client
 from .user import User
@@ -1,5 +1,7 @@
 # -*- coding: utf-8 -*-
 
+import math
+from collections import namedtuple
 from datetime import datetime
 
 from sqlalchemy import Column, func
@@ -10,6 +12,8 @@ from geoalchemy2.shape import to_shape
 
 from .geo import Location
 from skylines.database import db
+from skylines.lib.geo import EARTH_RADIUS, spheroid_distance
+from skylines.lib.spatial_index import TableIndex
 from skylines.lib.string import unicode_to_str
 
 
@@ -90,3 +94,242 @@ class Airport(db.Model):
         loc1 = cast(self.location_wkt, Geography)
         loc2 = func.ST_GeographyFromText(location.to_wkt())
         return db.session.scalar(func.ST_Distance(loc1, loc2))
+
+
+AirportItem = namedtuple(
+    "AirportItem",
+    ["id", "name", "country_code", "valid_until", "latitude", "longitude"],
+)
+
+
+def to_vector(latitude, longitude):
+    """Converts the coordinates to a point on the unit sphere."""
+
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def distance_to_chord(distance):
+    return 2 * math.sin(min(distance / (2 * EARTH_RADIUS), math.pi / 2))
+
+
+class KDTree(object):
+    """
+    A k-d tree of `(vector, item)` tuples, where the vectors are points on
+    the unit sphere as returned by `to_vector()`. The nearest neighbour by
+    straight line distance is also the nearest by great circle distance.
+    """
+
+    def __init__(self, points):
+        self.root = self.build(list(points), 0)
+
+    @classmethod
+    def build(cls, points, depth):
+        if not points:
+            return None
+
+        axis = depth % 3
+        points.sort(key=lambda point: point[0][axis])
+        median = len(points) // 2
+
+        return (
+            points[median],
+            axis,
+            cls.build(points[:median], depth + 1),
+            cls.build(points[median + 1 :], depth + 1),
+        )
+
+    def nearest(self, vector, max_chord=None, accept=None):
+        """
+        Returns the nearest `(vector, item)` tuple within `max_chord` whose
+        item is accepted by `accept()`, and the chord length to it.
+        """
+
+        best = None
+        best_d2 = float("inf") if max_chord is None else max_chord * max_chord
+
+        # nodes and the squared distance to their splitting plane
+        stack = [(self.root, 0)]
+        while stack:
+            node, plane_d2 = stack.pop()
+            if node is None or plane_d2 >= best_d2:
+                continue
+
+            point, axis, left, right = node
+
+            d2 = (
+                (point[0][0] - vector[0]) ** 2
+                + (point[0][1] - vector[1]) ** 2
+                + (point[0][2] - vector[2]) ** 2
+            )
+
+            if d2 < best_d2 and (accept is None or accept(point[1])):
+                best = point
+                best_d2 = d2
+
+            diff = vector[axis] - point[0][axis]
+            if diff < 0:
+                stack.append((right, diff * diff))
+                stack.append((left, 0))
+            else:
+                stack.append((left, diff * diff))
+                stack.append((right, 0))
+
+        if best is None:
+            return None, None
+
+        return best, math.sqrt(best_d2)
+
+    def within(self, vector, max_chord, accept=None):
+        """
+        Returns all `(vector, item)` tuples within `max_chord` whose items
+        are accepted by `accept()`.
+        """
+
+        max_d2 = max_chord * max_chord
+
+        points = []
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+
+            point, axis, left, right = node
+
+            d2 = (
+                (point[0][0] - vector[0]) ** 2
+                + (point[0][1] - vector[1]) ** 2
+                + (point[0][2] - vector[2]) ** 2
+            )
+
+            if d2 <= max_d2 and (accept is None or accept(point[1])):
+                points.append(point)
+
+            diff = vector[axis] - point[0][axis]
+            if diff < 0 or diff * diff <= max_d2:
+                stack.append(left)
+            if diff >= 0 or diff * diff <= max_d2:
+                stack.append(right)
+
+        return points
+
+
+class AirportIndex(TableIndex):
+    """
+    All airports in a `KDTree`, including those which are not valid anymore,
+    since flights are analysed with the airports of their date.
+
+    The lookups return the same airports as `Airport.by_location()`, which
+    compares the distances in degrees, and the distances of
+    `Airport.distance()` on the WGS84 spheroid.
+    """
+
+    model = Airport
+
+    def __init__(self):
+        super(AirportIndex, self).__init__()
+        self.tree = None
+
+    def clear(self):
+        self.tree = None
+
+    def load(self):
+        query = db.session.query(
+            Airport.id,
+            Airport.name,
+            Airport.country_code,
+            Airport.valid_until,
+            Airport.location_wkt,
+        ).filter(Airport.location_wkt != None)
+
+        points = []
+        for row in query:
+            location = to_shape(row.location_wkt)
+            item = AirportItem(*(tuple(row[:-1]) + (location.y, location.x)))
+            points.append((to_vector(location.y, location.x), item))
+
+        return KDTree(points)
+
+    def nearest(self, location, distance_threshold=None, date=None):
+        """
+        Returns the nearest airport that is valid at `date` (default: now)
+        as `AirportItem` and its distance in meters, or `(None, None)` if
+        there is no airport within `distance_threshold` degrees.
+        """
+
+        return self.nearest_many([location], distance_threshold, date)[0]
+
+    def nearest_many(self, locations, distance_threshold=None, date=None):
+        """Returns the `nearest()` results for a list of locations."""
+
+        self.check_version()
+
+        if self.tree is None:
+            self.tree = self.load()
+
+        if date is None:
+            date = datetime.utcnow()
+
+        def is_valid(airport):
+            return airport.valid_until is None or airport.valid_until > date
+
+        results = []
+        for location in locations:
+            airport = None
+            if location is not None:
+                airport = self._nearest(location, distance_threshold, is_valid)
+
+            if airport is None:
+                results.append((None, None))
+            else:
+                distance = spheroid_distance(
+                    location.latitude,
+                    location.longitude,
+                    airport.latitude,
+                    airport.longitude,
+                )
+                results.append((airport, distance))
+
+        return results
+
+    def _nearest(self, location, distance_threshold, accept):
+        def degrees(airport):
+            return math.hypot(
+                airport.latitude - location.latitude,
+                airport.longitude - location.longitude,
+            )
+
+        vector = to_vector(location.latitude, location.longitude)
+
+        # the airport with the smallest distance in degrees is at most as far
+        # away as the nearest airport on the sphere
+        point, chord = self.tree.nearest(vector, accept=accept)
+        if point is None:
+            return None
+
+        bound = degrees(point[1])
+        if distance_threshold is not None:
+            bound = min(bound, distance_threshold)
+
+        # the great circle distance of points within `bound` degrees is at
+        # most the distance along the meridian plus the distance along the
+        # parallel, i.e. `sqrt(2) * bound` degrees on the equator
+        max_distance = EARTH_RADIUS * math.radians(math.sqrt(2) * bound) + 1
+        candidates = self.tree.within(vector, distance_to_chord(max_distance), accept)
+
+        candidates.append(point)
+        airport = min(
+            (candidate[1] for candidate in candidates),
+            key=lambda airport: (degrees(airport), airport.id),
+        )
+
+        if distance_threshold is not None and degrees(airport) >= distance_threshold:
+            return None
+
+        return airport
+
+
+airport_index = AirportIndex()
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 
+import math
 from datetime import datetime
 
 from sqlalchemy.types import Integer, String, DateTime
@@ -12,9 +13,13 @@ from flask import current_app
 
 from skylines.database import db
 from skylines.lib.geo import FEET_PER_METER
+from skylines.lib.spatial_index import TableIndex
 from skylines.lib.string import unicode_to_str
 from skylines.model.geo import Location
 
+# size of the tiles of the `AirspaceTileIndex` in degrees
+INDEX_TILE_SIZE = 5
+
 
 class Airspace(db.Model):
     __tablename__ = "airspace"
@@ -70,30 +75,75 @@ class Airspace(db.Model):
         return self.extract_height(self.top)
 
 
-def get_airspace_infringements(flight_path, qnh=None):
-    # Convert the coordinate into a list of tuples
-    coordinates = [
-        (c.location["longitude"], c.location["latitude"]) for c in flight_path
-    ]
+class AirspaceTileIndex(TableIndex):
+    """
+    Prebuilt `xcsoar.Airspaces` objects of the airspace in tiles of
+    `INDEX_TILE_SIZE` degrees, which are built on first use and kept until
+    the airspace is imported again.
 
-    # Create a shapely LineString object from the coordinates
-    linestring = LineString(coordinates)
+    The converted polygons of the tiles are also stored in
+    `SKYLINES_INDEX_PATH` if it is configured, so that other processes don't
+    need to query and convert them again.
+    """
+
+    model = Airspace
+
+    def __init__(self):
+        super(AirspaceTileIndex, self).__init__()
+        self.tiles = {}
+
+    def clear(self):
+        self.tiles = {}
+
+    def get(self, tile):
+        """Returns the `xcsoar.Airspaces` of the tile or None if it's empty."""
+
+        if tile not in self.tiles:
+            self.tiles[tile] = self.build(tile)
+
+        return self.tiles[tile]
+
+    def build(self, tile):
+        classes = current_app.config["SKYLINES_AIRSPACE_CHECK"]
+        polygons = [p for p in self.load_polygons(tile) if p[2] in classes]
+        if not polygons:
+            return None
+
+        xcs_airspace = xcsoar.Airspaces()
+        for polygon in polygons:
+            xcs_airspace.addPolygon(*polygon)
+
+        xcs_airspace.optimise()
+        return xcs_airspace
+
+    def load_polygons(self, tile):
+        name = "airspace_%d_%d" % tile
+
+        polygons = self.read_cache(name)
+        if polygons is None:
+            polygons = get_airspace_polygons(tile_bounds(tile))
+            self.write_cache(name, polygons)
+
+        return polygons
+
+
+_index = AirspaceTileIndex()
+
+
+def get_airspace_polygons(bounds):
+    """
+    Returns the `xcsoar.Airspaces.addPolygon()` arguments of all airspaces
+    within the bounds.
+    """
 
-    bbox = from_shape(box(*linestring.bounds), srid=4326)
+    bbox = from_shape(box(*bounds), srid=4326)
 
     airspaces = (
         db.session.query(Airspace).filter(Airspace.the_geom.intersects(bbox)).all()
     )
 
-    if not airspaces:
-        return dict()
-
-    xcs_airspace = xcsoar.Airspaces()
-
+    polygons = []
     for airspace in airspaces:
-        if airspace.airspace_class not in current_app.config["SKYLINES_AIRSPACE_CHECK"]:
-            continue
-
         poly = list(to_shape(airspace.the_geom).exterior.coords)
         coords = [dict(latitude=c[1], longitude=c[0]) for c in poly]
 
@@ -106,23 +156,61 @@ def get_airspace_infringements(flight_path, qnh=None):
         if base_ref == "NOTAM" or base_ref == "UNKNOWN":
             base_ref = "MSL"
 
-        xcs_airspace.addPolygon(
-            coords,
-            str(airspace.id),
-            airspace.airspace_class,
-            base,
-            base_ref.upper(),
-            top,
-            top_ref.upper(),
+        polygons.append(
+            (
+                coords,
+                str(airspace.id),
+                airspace.airspace_class,
+                base,
+                base_ref.upper(),
+                top,
+                top_ref.upper(),
+            )
         )
 
-    xcs_airspace.optimise()
-    xcs_flight = xcsoar.Flight(flight_path)
+    return polygons
+
+
+def tile_bounds(tile):
+    x, y = tile
+    return (
+        x * INDEX_TILE_SIZE,
+        y * INDEX_TILE_SIZE,
+        (x + 1) * INDEX_TILE_SIZE,
+        (y + 1) * INDEX_TILE_SIZE,
+    )
+
+
+def tiles_in_bounds(bounds):
+    min_x, min_y, max_x, max_y = [
+        int(math.floor(value / INDEX_TILE_SIZE)) for value in bounds
+    ]
+
+    return [(x, y) for x in range(min_x, max_x + 1) for y in range(min_y, max_y + 1)]
+
+
+def get_airspace_infringements(flight_path, qnh=None):
+    # Create a shapely LineString object from the coordinates
+    linestring = LineString(flight_path.coordinates)
+
+    _index.check_version()
+
+    xcs_flight = None
+    infringements = dict()
+
+    for tile in tiles_in_bounds(linestring.bounds):
+        xcs_airspace = _index.get(tile)
+        if xcs_airspace is None:
+            continue
+
+        if xcs_flight is None:
+            xcs_flight = xcsoar.Flight(flight_path)
 
-    if qnh:
-        xcs_flight.setQNH(qnh)
+            if qnh:
+                xcs_flight.setQNH(qnh)
 
-    infringements = xcs_airspace.findIntrusions(xcs_flight)
+        # Replace airspace id string with ints in returned infringements
+        for k, v in xcs_airspace.findIntrusions(xcs_flight).items():
+            infringements[int(k)] = v
 
-    # Replace airspace id string with ints in returned infringements
-    return dict((int(k), v) for k, v in infringements.items())
+    return infringements
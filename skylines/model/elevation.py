@@ -2,6 +2,7 @@ from sqlalchemy.types import Integer
 from geoalchemy2.types import Raster
 
 from skylines.database import db
+from skylines.lib import srtm
 
 
 class Elevation(db.Model):
@@ -31,3 +32,18 @@ class Elevation(db.Model):
             return None
 
         return result[0]
+
+    @classmethod
+    def by_location(cls, location):
+        """
+        Returns the elevation at the given `Location` or None.
+
+        The SRTM tile in `SKYLINES_ELEVATION_PATH` is used if it is
+        available, otherwise the elevation is looked up in the database.
+        """
+
+        sampler = srtm.get_sampler([(location.latitude, location.longitude)])
+        if sampler is not None:
+            return sampler.get(location.latitude, location.longitude)
+
+        return cls.get(location.to_wkt_element())
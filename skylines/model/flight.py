@@ -14,9 +14,9 @@ from sqlalchemy.types import (
     Boolean,
     SmallInteger,
 )
-from sqlalchemy import func
+from sqlalchemy import event, func, inspect
 from sqlalchemy.ext.hybrid import hybrid_method, hybrid_property
-from sqlalchemy.sql.expression import case, and_, or_, literal_column
+from sqlalchemy.sql.expression import case, and_, or_, literal_column, select
 from geoalchemy2.types import Geometry
 from geoalchemy2.shape import to_shape, from_shape
 from shapely.geometry import LineString
@@ -76,7 +76,7 @@ class Flight(db.Model):
     landing_location_wkt = db.Column("landing_location", Geometry("POINT", srid=4326))
 
     takeoff_airport_id = db.Column(
-        Integer, db.ForeignKey("airports.id", ondelete="SET NULL")
+        Integer, db.ForeignKey("airports.id", ondelete="SET NULL"), index=True
     )
     takeoff_airport = db.relationship("Airport", foreign_keys=[takeoff_airport_id])
 
@@ -97,6 +97,10 @@ class Flight(db.Model):
     olc_triangle_distance = db.Column(Integer)
     olc_plus_score = db.Column(Float)
 
+    # olc_plus_score adjusted by the DMSt index of the aircraft model, which
+    # is updated whenever one of them changes (see `calculate_index_score()`)
+    index_score = db.Column(Float)
+
     igc_file_id = db.Column(
         Integer, db.ForeignKey("igc_files.id", ondelete="CASCADE"), nullable=False
     )
@@ -114,6 +118,10 @@ class Flight(db.Model):
 
     privacy_level = db.Column(SmallInteger, nullable=False, default=PrivacyLevel.PUBLIC)
 
+    # number of `FlightComment` rows of the flight, which is updated when
+    # comments are added or deleted
+    comment_count = db.Column(Integer, nullable=False, default=0)
+
     ##############################
 
     def __repr__(self):
@@ -131,25 +139,6 @@ class Flight(db.Model):
     def year(self):
         return self.date_local.year
 
-    @hybrid_property
-    def index_score(self):
-        if self.model and self.model.dmst_index > 0:
-            return self.olc_plus_score * 100.0 / self.model.dmst_index
-        else:
-            return self.olc_plus_score
-
-    @index_score.expression
-    def index_score(cls):
-        return case(
-            [
-                (
-                    AircraftModel.dmst_index > 0,
-                    cls.olc_plus_score * 100.0 / AircraftModel.dmst_index,
-                )
-            ],
-            else_=cls.olc_plus_score,
-        )
-
     @year.expression
     def year(cls):
         return db.func.date_part("year", cls.date_local)
@@ -222,6 +211,31 @@ class Flight(db.Model):
             cls.privacy_level == Flight.PrivacyLevel.PUBLIC, cls.is_writable(user)
         )
 
+    @classmethod
+    def update_index_scores(cls, *criteria):
+        """
+        Recalculates the stored `index_score` of the flights matching the
+        criteria, e.g. after the DMSt index of an aircraft model has changed.
+        Returns the number of updated flights.
+        """
+
+        dmst_index = (
+            db.session.query(AircraftModel.dmst_index)
+            .filter(AircraftModel.id == cls.model_id)
+            .as_scalar()
+        )
+
+        index_score = case(
+            [(dmst_index > 0, cls.olc_plus_score * 100.0 / dmst_index)],
+            else_=cls.olc_plus_score,
+        )
+
+        return (
+            cls.query()
+            .filter(*criteria)
+            .update({cls.index_score: index_score}, synchronize_session=False)
+        )
+
     @hybrid_method
     def is_rankable(self):
         return self.privacy_level == Flight.PrivacyLevel.PUBLIC
@@ -309,12 +323,21 @@ class Flight(db.Model):
             if p.aggregate and p.phase_type == FlightPhase.PT_CRUISE:
                 return p
 
-    def update_flight_path(self):
+    def update_flight_path(self, fp=None):
+        """
+        Stores a reduced flight path of the IGC file. `fp` may be the
+        decoded `FlightPath` of the IGC file, if the caller has it already.
+        """
+
         from skylines.lib.xcsoar_ import flight_path
         from skylines.lib.datetime import from_seconds_of_day
 
-        # Run the IGC file through the FlightPath utility
-        path = flight_path(self.igc_file, qnh=self.qnh)
+        if fp is not None:
+            path = fp.reduce(1000)
+        else:
+            # Run the IGC file through the FlightPath utility
+            path = flight_path(self.igc_file, qnh=self.qnh)
+
         if len(path) < 2:
             return False
 
@@ -324,11 +347,8 @@ class Flight(db.Model):
             from_seconds_of_day(date_utc, c.seconds_of_day) for c in path
         ]
 
-        # Convert the coordinate into a list of tuples
-        coordinates = [(c.location["longitude"], c.location["latitude"]) for c in path]
-
         # Create a shapely LineString object from the coordinates
-        linestring = LineString(coordinates)
+        linestring = LineString(path.coordinates)
 
         # Save the new path as WKB
         self.locations = from_shape(linestring, srid=4326)
@@ -336,6 +356,41 @@ class Flight(db.Model):
         return True
 
 
+db.Index("flights_date_local_index_score", Flight.date_local, Flight.index_score)
+
+
+def calculate_index_score(olc_plus_score, dmst_index):
+    if olc_plus_score is None:
+        return None
+
+    if dmst_index and dmst_index > 0:
+        return olc_plus_score * 100.0 / dmst_index
+
+    return olc_plus_score
+
+
+@event.listens_for(Flight, "before_insert")
+@event.listens_for(Flight, "before_update")
+def _update_index_score(mapper, connection, flight):
+    state = inspect(flight)
+    if state.persistent and not (
+        state.attrs.olc_plus_score.history.has_changes()
+        or state.attrs.model_id.history.has_changes()
+        or state.attrs.model.history.has_changes()
+    ):
+        return
+
+    dmst_index = None
+    if flight.model_id is not None:
+        dmst_index = connection.scalar(
+            select([AircraftModel.dmst_index]).where(
+                AircraftModel.id == flight.model_id
+            )
+        )
+
+    flight.index_score = calculate_index_score(flight.olc_plus_score, dmst_index)
+
+
 class FlightPathChunks(db.Model):
     """
     This table stores flight path chunks of about 100 fixes per column which
@@ -512,12 +567,17 @@ class FlightPathChunks(db.Model):
         return other_flights
 
     @staticmethod
-    def update_flight_path(flight):
+    def update_flight_path(flight, fp=None):
         from skylines.lib.xcsoar_ import flight_path
         from skylines.lib.datetime import from_seconds_of_day
 
         # Now populate the FlightPathChunks table with the (full) flight path
-        path_detailed = flight_path(flight.igc_file, max_points=3000, qnh=flight.qnh)
+        if fp is not None:
+            path_detailed = fp.reduce(3000)
+        else:
+            path_detailed = flight_path(
+                flight.igc_file, max_points=3000, qnh=flight.qnh
+            )
         if len(path_detailed) < 2:
             return False
 
@@ -547,14 +607,8 @@ class FlightPathChunks(db.Model):
             flight_path.start_time = path_detailed[i].datetime
             flight_path.end_time = path_detailed[j].datetime
 
-            # Convert the coordinate into a list of tuples
-            coordinates = [
-                (c.location["longitude"], c.location["latitude"])
-                for c in path_detailed[i : j + 1]
-            ]
-
             # Create a shapely LineString object from the coordinates
-            linestring = LineString(coordinates)
+            linestring = LineString(path_detailed.coordinates[i : j + 1])
 
             # Save the new path as WKB
             flight_path.locations = from_shape(linestring, srid=4326)
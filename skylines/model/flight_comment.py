@@ -1,10 +1,13 @@
 from datetime import datetime
 
+from sqlalchemy import event
 from sqlalchemy.types import Unicode, Integer, DateTime
 
 from skylines.database import db
 from skylines.lib.string import unicode_to_str
 
+from .flight import Flight
+
 
 class FlightComment(db.Model):
     __tablename__ = "flight_comments"
@@ -35,3 +38,22 @@ class FlightComment(db.Model):
             "<FlightComment: id=%d user_id=%d flight_id=%d>"
             % (self.id, self.user_id, self.flight_id)
         )
+
+
+def _update_comment_count(connection, flight_id, change):
+    # the row is updated directly because this runs during the flush
+    connection.execute(
+        Flight.__table__.update()
+        .where(Flight.__table__.c.id == flight_id)
+        .values(comment_count=Flight.__table__.c.comment_count + change)
+    )
+
+
+@event.listens_for(FlightComment, "after_insert")
+def _after_insert(mapper, connection, comment):
+    _update_comment_count(connection, comment.flight_id, 1)
+
+
+@event.listens_for(FlightComment, "after_delete")
+def _after_delete(mapper, connection, comment):
+    _update_comment_count(connection, comment.flight_id, -1)
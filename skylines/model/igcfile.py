@@ -51,9 +51,10 @@ class IGCFile(db.Model):
         return user and user.is_manager()
 
     def update_igc_headers(self):
-        path = files.filename_to_path(self.filename)
-        igc_headers = read_igc_headers(path)
-        if igc_headers is None:
+        try:
+            with files.open_file(self.filename) as f:
+                igc_headers = read_igc_headers(f)
+        except IOError:
             return
 
         if "manufacturer_id" in igc_headers:
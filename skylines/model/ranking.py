@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql.expression import literal
+from sqlalchemy.types import Integer, Float, SmallInteger
+
+from skylines.database import db
+from skylines.lib.sql import advisory_xact_lock
+from skylines.lib.string import unicode_to_str
+
+from .flight import Flight
+
+
+class RankingAggregate(db.Model):
+    """
+    The number of rankable flights and the sum of their index scores per
+    year and pilot, club or takeoff airport.
+
+    The rows of a flight are updated by `update()` whenever the flight is
+    analysed, changed or deleted, so that the ranking views don't have to
+    aggregate the whole `flights` table.
+    """
+
+    __tablename__ = "ranking_aggregates"
+
+    class Kind:
+        PILOT = 0
+        CLUB = 1
+        AIRPORT = 2
+
+    # the `Flight` column of the subjects of every kind
+    COLUMNS = {
+        Kind.PILOT: "pilot_id",
+        Kind.CLUB: "club_id",
+        Kind.AIRPORT: "takeoff_airport_id",
+    }
+
+    kind = db.Column(SmallInteger, primary_key=True)
+    year = db.Column(Integer, primary_key=True)
+    subject_id = db.Column(Integer, primary_key=True)
+
+    count = db.Column(Integer, nullable=False)
+    total = db.Column(Float)
+
+    def __repr__(self):
+        return unicode_to_str(
+            "<RankingAggregate: kind=%d year=%d subject_id=%d count=%d>"
+            % (self.kind, self.year, self.subject_id, self.count)
+        )
+
+    @classmethod
+    def keys(cls, *flights):
+        """
+        Returns the `(kind, year, subject id)` keys of the rows that the
+        rankable flights are counted in.
+        """
+
+        keys = []
+        for flight in flights:
+            if not flight.is_rankable() or flight.date_local is None:
+                continue
+
+            for kind, column in cls.COLUMNS.items():
+                subject_id = getattr(flight, column)
+                if subject_id is not None:
+                    keys.append((kind, flight.date_local.year, subject_id))
+
+        return keys
+
+    @classmethod
+    def update(cls, keys):
+        """
+        Recalculates the rows of the `(kind, year, subject id)` keys from
+        the `flights` table.
+
+        Every key is locked until the end of the transaction before its
+        flights are counted, so that concurrent updates of the same row
+        don't overwrite each other with outdated values. Changes of flights
+        that bypass this method (e.g. plain SQL) have to be fixed by the
+        `ranking check --fix` command.
+        """
+
+        table = cls.__table__
+
+        for kind, year, subject_id in sorted(set(tuple(key) for key in keys)):
+            advisory_xact_lock(db.session, table.name, kind, year, subject_id)
+
+            column = getattr(Flight, cls.COLUMNS[kind])
+
+            count, total = (
+                db.session.query(func.count(Flight.id), func.sum(Flight.index_score))
+                .filter(Flight.is_rankable())
+                .filter(column == subject_id)
+                .filter(Flight.date_local >= date(year, 1, 1))
+                .filter(Flight.date_local <= date(year, 12, 31))
+                .one()
+            )
+
+            if not count:
+                cls.query(kind=kind, year=year, subject_id=subject_id).delete()
+                continue
+
+            stmt = insert(table).values(
+                kind=kind, year=year, subject_id=subject_id, count=count, total=total
+            )
+
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[table.c.kind, table.c.year, table.c.subject_id],
+                set_=dict(count=stmt.excluded.count, total=stmt.excluded.total),
+            )
+
+            db.session.execute(stmt)
+
+    @classmethod
+    def aggregate(cls, kind):
+        """
+        Returns a query of the `(kind, year, subject id, count, total)` rows
+        of the kind, aggregated from the `flights` table.
+        """
+
+        column = getattr(Flight, cls.COLUMNS[kind])
+        year = func.date_part("year", Flight.date_local).cast(Integer)
+
+        return (
+            db.session.query(
+                literal(kind, SmallInteger),
+                year,
+                column,
+                func.count(Flight.id),
+                func.sum(Flight.index_score),
+            )
+            .filter(Flight.is_rankable())
+            .filter(column != None)
+            .group_by(year, column)
+        )
+
+    @classmethod
+    def rebuild(cls):
+        """Replaces all rows by the aggregates of the `flights` table."""
+
+        table = cls.__table__
+        columns = [
+            table.c.kind,
+            table.c.year,
+            table.c.subject_id,
+            table.c.count,
+            table.c.total,
+        ]
+
+        cls.query().delete()
+
+        for kind in cls.COLUMNS:
+            db.session.execute(
+                table.insert().from_select(columns, cls.aggregate(kind).statement)
+            )
+
+    @classmethod
+    def check(cls):
+        """
+        Compares the rows with the aggregates of the `flights` table and
+        returns the keys of the differing rows.
+        """
+
+        stored = dict(
+            ((row.kind, row.year, row.subject_id), (row.count, row.total))
+            for row in cls.query()
+        )
+
+        live = {}
+        for kind in cls.COLUMNS:
+            for kind_, year, subject_id, count, total in cls.aggregate(kind):
+                live[(kind, year, subject_id)] = (count, total)
+
+        keys = []
+        for key in set(stored) | set(live):
+            count, total = stored.get(key, (0, None))
+            live_count, live_total = live.get(key, (0, None))
+
+            # the sums may differ in the last digits because of the order
+            if count != live_count or not _equal_totals(total, live_total):
+                keys.append(key)
+
+        return sorted(keys)
+
+
+def _equal_totals(a, b):
+    if a is None or b is None:
+        return a is b
+
+    return abs(a - b) <= 1e-6 * max(1.0, abs(a), abs(b))
+
+
+db.Index(
+    "ranking_aggregates_kind_year_total",
+    RankingAggregate.kind,
+    RankingAggregate.year,
+    RankingAggregate.total,
+)
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.sql.expression import case, literal
+from sqlalchemy.types import BigInteger, Integer, SmallInteger
+
+from skylines.database import db
+from skylines.lib.sql import advisory_xact_lock
+from skylines.lib.string import unicode_to_str
+
+from .flight import Flight
+
+
+# the year of the rows that cover all years
+ALL_YEARS = 0
+
+# the pilot id of the flights without a registered pilot
+NO_PILOT = 0
+
+
+class StatisticsPilot(db.Model):
+    """
+    The rankable flights of a pilot per year and pilot, club, takeoff
+    airport or globally. These rows are needed to count the distinct pilots
+    of a `StatisticsRollup` row when flights change.
+    """
+
+    __tablename__ = "statistics_pilots"
+
+    kind = db.Column(SmallInteger, primary_key=True)
+    subject_id = db.Column(Integer, primary_key=True)
+    year = db.Column(Integer, primary_key=True)
+    pilot_id = db.Column(Integer, primary_key=True)
+
+    flights = db.Column(Integer, nullable=False)
+    distance = db.Column(BigInteger, nullable=False)
+    duration = db.Column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return unicode_to_str(
+            "<StatisticsPilot: kind=%d subject_id=%d year=%d pilot_id=%d>"
+            % (self.kind, self.subject_id, self.year, self.pilot_id)
+        )
+
+
+class StatisticsRollup(db.Model):
+    """
+    The number of rankable flights and pilots and their total distance and
+    duration per year and pilot, club, takeoff airport or globally, which
+    are shown by the statistics views.
+
+    The rows are updated by `update()` whenever a flight is analysed,
+    changed or deleted.
+    """
+
+    __tablename__ = "statistics_rollups"
+
+    class Kind:
+        PILOT = 0
+        CLUB = 1
+        AIRPORT = 2
+        GLOBAL = 3
+
+    # the `Flight` column of the subjects of every kind, the global
+    # statistics have subject id 0
+    COLUMNS = {
+        Kind.PILOT: "pilot_id",
+        Kind.CLUB: "club_id",
+        Kind.AIRPORT: "takeoff_airport_id",
+    }
+
+    kind = db.Column(SmallInteger, primary_key=True)
+    subject_id = db.Column(Integer, primary_key=True)
+    year = db.Column(Integer, primary_key=True)
+
+    flights = db.Column(Integer, nullable=False)
+    pilots = db.Column(Integer, nullable=False)
+    distance = db.Column(BigInteger, nullable=False)
+    duration = db.Column(BigInteger, nullable=False)
+
+    def __repr__(self):
+        return unicode_to_str(
+            "<StatisticsRollup: kind=%d subject_id=%d year=%d flights=%d>"
+            % (self.kind, self.subject_id, self.year, self.flights)
+        )
+
+    @classmethod
+    def keys(cls, *flights):
+        """
+        Returns the `(kind, subject id, year, pilot id)` keys of the
+        `StatisticsPilot` rows that the rankable flights are counted in.
+        """
+
+        keys = []
+        for flight in flights:
+            if not flight.is_rankable() or flight.date_local is None:
+                continue
+
+            subjects = [(cls.Kind.GLOBAL, 0)]
+            for kind, column in cls.COLUMNS.items():
+                if getattr(flight, column) is not None:
+                    subjects.append((kind, getattr(flight, column)))
+
+            pilot_id = flight.pilot_id or NO_PILOT
+
+            for kind, subject_id in subjects:
+                for year in (flight.date_local.year, ALL_YEARS):
+                    keys.append((kind, subject_id, year, pilot_id))
+
+        return keys
+
+    @classmethod
+    def update(cls, keys):
+        """
+        Recalculates the `StatisticsPilot` rows of the keys from the
+        `flights` table and applies the changes to the rollups.
+
+        Every key is locked until the end of the transaction before its
+        flights are aggregated, so that concurrent updates compare the
+        flights with the row that the previous update has stored. Changes
+        of flights that bypass this method have to be fixed by the
+        `statistics rebuild` command.
+        """
+
+        for key in sorted(set(tuple(key) for key in keys)):
+            cls._update_pilot(*key)
+
+    @classmethod
+    def _update_pilot(cls, kind, subject_id, year, pilot_id):
+        advisory_xact_lock(
+            db.session, StatisticsPilot.__tablename__, kind, subject_id, year, pilot_id
+        )
+
+        query = (
+            db.session.query(*_aggregate_columns())
+            .filter(Flight.is_rankable())
+            .filter(*cls._filters(kind, subject_id, year))
+        )
+
+        if pilot_id == NO_PILOT:
+            query = query.filter(Flight.pilot_id == None)
+        else:
+            query = query.filter(Flight.pilot_id == pilot_id)
+
+        flights, distance, duration = query.one()
+
+        # the columns are selected, because the session may hold an
+        # outdated row
+        old = (
+            db.session.query(
+                StatisticsPilot.flights,
+                StatisticsPilot.distance,
+                StatisticsPilot.duration,
+            )
+            .filter_by(kind=kind, subject_id=subject_id, year=year, pilot_id=pilot_id)
+            .first()
+        ) or (0, 0, 0)
+
+        if tuple(old) == (flights, distance, duration):
+            return
+
+        old_flights, old_distance, old_duration = old
+
+        pilots = 0
+        if pilot_id != NO_PILOT:
+            pilots = int(flights > 0) - int(old_flights > 0)
+
+        pilot_table = StatisticsPilot.__table__
+
+        if flights:
+            stmt = insert(pilot_table).values(
+                kind=kind,
+                subject_id=subject_id,
+                year=year,
+                pilot_id=pilot_id,
+                flights=flights,
+                distance=distance,
+                duration=duration,
+            )
+
+            db.session.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[
+                        pilot_table.c.kind,
+                        pilot_table.c.subject_id,
+                        pilot_table.c.year,
+                        pilot_table.c.pilot_id,
+                    ],
+                    set_=dict(
+                        flights=stmt.excluded.flights,
+                        distance=stmt.excluded.distance,
+                        duration=stmt.excluded.duration,
+                    ),
+                )
+            )
+
+        else:
+            StatisticsPilot.query(
+                kind=kind, subject_id=subject_id, year=year, pilot_id=pilot_id
+            ).delete()
+
+        table = cls.__table__
+
+        stmt = insert(table).values(
+            kind=kind,
+            subject_id=subject_id,
+            year=year,
+            flights=flights - old_flights,
+            pilots=pilots,
+            distance=distance - old_distance,
+            duration=duration - old_duration,
+        )
+
+        db.session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[table.c.kind, table.c.subject_id, table.c.year],
+                set_=dict(
+                    flights=table.c.flights + stmt.excluded.flights,
+                    pilots=table.c.pilots + stmt.excluded.pilots,
+                    distance=table.c.distance + stmt.excluded.distance,
+                    duration=table.c.duration + stmt.excluded.duration,
+                ),
+            )
+        )
+
+        cls.query(kind=kind, subject_id=subject_id, year=year, flights=0).delete()
+
+    @classmethod
+    def rebuild(cls):
+        """Replaces all rows by the aggregates of the `flights` table."""
+
+        cls.query().delete()
+        StatisticsPilot.query().delete()
+
+        pilot_table = StatisticsPilot.__table__
+        pilot_columns = [
+            pilot_table.c.kind,
+            pilot_table.c.subject_id,
+            pilot_table.c.year,
+            pilot_table.c.pilot_id,
+            pilot_table.c.flights,
+            pilot_table.c.distance,
+            pilot_table.c.duration,
+        ]
+
+        pilot_id = func.coalesce(Flight.pilot_id, NO_PILOT)
+        year = func.date_part("year", Flight.date_local).cast(Integer)
+
+        for kind in [cls.Kind.GLOBAL] + list(cls.COLUMNS):
+            for all_years in (False, True):
+                # constants can't be grouped by
+                group_by = [pilot_id]
+
+                if kind == cls.Kind.GLOBAL:
+                    subject_id = literal(0, Integer)
+                else:
+                    subject_id = getattr(Flight, cls.COLUMNS[kind])
+                    group_by.append(subject_id)
+
+                if all_years:
+                    year_ = literal(ALL_YEARS, Integer)
+                else:
+                    year_ = year
+                    group_by.append(year)
+
+                query = (
+                    db.session.query(
+                        literal(kind, SmallInteger),
+                        subject_id,
+                        year_,
+                        pilot_id,
+                        *_aggregate_columns()
+                    )
+                    .filter(Flight.is_rankable())
+                    .filter(subject_id != None)
+                    .group_by(*group_by)
+                )
+
+                db.session.execute(
+                    pilot_table.insert().from_select(pilot_columns, query.statement)
+                )
+
+        rollups = db.session.query(
+            StatisticsPilot.kind,
+            StatisticsPilot.subject_id,
+            StatisticsPilot.year,
+            func.sum(StatisticsPilot.flights),
+            func.sum(case([(StatisticsPilot.pilot_id != NO_PILOT, 1)], else_=0)),
+            func.sum(StatisticsPilot.distance),
+            func.sum(StatisticsPilot.duration),
+        ).group_by(
+            StatisticsPilot.kind, StatisticsPilot.subject_id, StatisticsPilot.year
+        )
+
+        table = cls.__table__
+        db.session.execute(
+            table.insert().from_select(
+                [
+                    table.c.kind,
+                    table.c.subject_id,
+                    table.c.year,
+                    table.c.flights,
+                    table.c.pilots,
+                    table.c.distance,
+                    table.c.duration,
+                ],
+                rollups.statement,
+            )
+        )
+
+    @classmethod
+    def _filters(cls, kind, subject_id, year):
+        filters = []
+
+        if kind != cls.Kind.GLOBAL:
+            filters.append(getattr(Flight, cls.COLUMNS[kind]) == subject_id)
+
+        if year != ALL_YEARS:
+            filters.append(Flight.date_local >= date(year, 1, 1))
+            filters.append(Flight.date_local <= date(year, 12, 31))
+
+        return filters
+
+
+def _aggregate_columns():
+    """
+    Returns the number of flights and their total distance and duration in
+    seconds as aggregate columns.
+    """
+
+    duration = func.extract("epoch", Flight.landing_time - Flight.takeoff_time)
+
+    return [
+        func.count(Flight.id),
+        func.coalesce(func.sum(Flight.olc_classic_distance), 0).cast(BigInteger),
+        func.coalesce(func.sum(duration), 0).cast(BigInteger),
+    ]
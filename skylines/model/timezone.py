@@ -1,8 +1,14 @@
+from flask import current_app
 from pytz import timezone
 from sqlalchemy.types import Integer, String
 from geoalchemy2.types import Geometry
+from geoalchemy2.shape import to_shape
+from shapely.geometry import Point
+from shapely.prepared import prep
+from shapely.wkb import loads
 
 from skylines.database import db
+from skylines.lib.spatial_index import STRtreeIndex
 from skylines.lib.string import unicode_to_str
 
 
@@ -35,3 +41,62 @@ class TimeZone(db.Model):
             return None
 
         return timezone(zone)
+
+
+class TimeZoneIndex(STRtreeIndex):
+    """
+    The polygons of the timezones as prepared geometries. The polygons are
+    also pickled to `SKYLINES_INDEX_PATH` if it is configured.
+    """
+
+    model = TimeZone
+
+    def load(self):
+        polygons = self.read_cache("timezones")
+        if polygons is None:
+            polygons = []
+            query = db.session.query(TimeZone.tzid, TimeZone.the_geom).filter(
+                TimeZone.the_geom != None
+            )
+
+            for tzid, geom in query:
+                # single polygons have smaller envelopes in the tree
+                for polygon in to_shape(geom).geoms:
+                    polygons.append((polygon.wkb, tzid))
+
+            self.write_cache("timezones", polygons)
+
+        rows = []
+        for wkb, tzid in polygons:
+            polygon = loads(wkb)
+            rows.append((polygon, (prep(polygon), tzid)))
+
+        return rows
+
+    def get(self, location):
+        """Returns the tzid of the timezone at the location or None."""
+
+        point = Point(location.longitude, location.latitude)
+        for geom, (prepared, tzid) in self.query(point):
+            if prepared.contains(point):
+                return tzid
+
+
+timezone_index = TimeZoneIndex()
+
+
+def get_timezone(location):
+    """
+    Returns the timezone at the location like `TimeZone.by_location()`, but
+    looks it up in the in-memory `TimeZoneIndex` unless `SKYLINES_TIMEZONE_INDEX`
+    is disabled.
+    """
+
+    if not current_app.config.get("SKYLINES_TIMEZONE_INDEX", True):
+        return TimeZone.by_location(location)
+
+    tzid = timezone_index.get(location)
+    if tzid is None:
+        return None
+
+    return timezone(tzid)
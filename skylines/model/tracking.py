@@ -3,7 +3,7 @@
 from datetime import datetime, timedelta
 
 from sqlalchemy.types import Integer, REAL, DateTime, SmallInteger, Unicode, BigInteger
-from sqlalchemy.dialects.postgresql import INET
+from sqlalchemy.dialects.postgresql import INET, insert
 from geoalchemy2.types import Geometry
 from geoalchemy2.shape import to_shape, from_shape
 from shapely.geometry import Point
@@ -14,6 +14,13 @@ from skylines.lib.string import unicode_to_str
 from .geo import Location
 
 
+def _max_age_limit(max_age):
+    if is_int(max_age) or isinstance(max_age, float):
+        max_age = timedelta(hours=max_age)
+
+    return datetime.utcnow() - max_age
+
+
 class TrackingFix(db.Model):
     __tablename__ = "tracking_fixes"
 
@@ -75,36 +82,44 @@ class TrackingFix(db.Model):
         value that will be interpreted as hours.
         """
 
-        if is_int(max_age) or isinstance(max_age, float):
-            max_age = timedelta(hours=max_age)
-
-        return cls.time >= datetime.utcnow() - max_age
+        return cls.time >= _max_age_limit(max_age)
 
     @classmethod
     def get_latest(cls, max_age=timedelta(hours=6)):
-        # Add a db.Column to the inner query with
-        # numbers ordered by time for each pilot
-        row_number = db.over(
-            db.func.row_number(), partition_by=cls.pilot_id, order_by=cls.time.desc()
-        )
+        """
+        Returns a query for the latest visible fix with a location of every
+        pilot, based on the `LatestTrackingFix` table.
+        """
+
+        now = datetime.utcnow()
 
-        # Create inner query
-        subq = (
-            db.session.query(cls.id, row_number.label("row_number"))
-            .join(cls.pilot)
+        # If the newest fix of a pilot is not visible yet because of the
+        # tracking delay we have to look up the latest visible fix instead
+        delayed_fix_id = (
+            db.session.query(cls.id)
+            .filter(cls.pilot_id == LatestTrackingFix.pilot_id)
             .filter(cls.max_age_filter(max_age))
-            .filter(cls.time_visible <= datetime.utcnow())
+            .filter(cls.time_visible <= now)
             .filter(cls.location_wkt != None)
-            .subquery()
+            .order_by(cls.time.desc())
+            .limit(1)
+            .correlate(LatestTrackingFix)
+            .as_scalar()
+        )
+
+        fix_id = db.case(
+            [(LatestTrackingFix.time_visible <= now, LatestTrackingFix.fix_id)],
+            else_=delayed_fix_id,
+        )
+
+        subq = db.session.query(fix_id).filter(
+            LatestTrackingFix.time >= _max_age_limit(max_age)
         )
 
-        # Create outer query that orders by time and
-        # only selects the latest fix
         query = (
             cls.query()
             .options(db.joinedload(cls.pilot))
-            .filter(cls.id == subq.c.id)
-            .filter(subq.c.row_number == 1)
+            .filter(cls.id.in_(subq))
             .order_by(cls.time.desc())
         )
 
@@ -114,6 +129,80 @@ class TrackingFix(db.Model):
 db.Index("tracking_fixes_pilot_time", TrackingFix.pilot_id, TrackingFix.time)
 
 
+class LatestTrackingFix(db.Model):
+    """
+    The newest fix with a location of every pilot.
+
+    This table is updated together with the `tracking_fixes` table, so that
+    the live tracking views don't have to search the whole `tracking_fixes`
+    table for the latest fix of every pilot.
+    """
+
+    __tablename__ = "tracking_fixes_latest"
+
+    pilot_id = db.Column(
+        Integer, db.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True
+    )
+
+    fix_id = db.Column(
+        Integer, db.ForeignKey("tracking_fixes.id", ondelete="CASCADE"), nullable=False,
+    )
+
+    time = db.Column(DateTime, nullable=False, index=True)
+    time_visible = db.Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return unicode_to_str(
+            "<LatestTrackingFix: pilot_id={} fix_id={}>".format(
+                self.pilot_id, self.fix_id
+            )
+        )
+
+    @classmethod
+    def update(cls, fixes):
+        """
+        Records the given fixes as latest fixes of their pilots, unless newer
+        fixes have been recorded already.
+
+        The fixes need to have `id`, `pilot_id`, `time` and `time_visible`
+        attributes and must have a location.
+        """
+
+        latest = {}
+        for fix in fixes:
+            if fix.pilot_id not in latest or latest[fix.pilot_id].time < fix.time:
+                latest[fix.pilot_id] = fix
+
+        if not latest:
+            return
+
+        table = cls.__table__
+
+        stmt = insert(table).values(
+            [
+                dict(
+                    pilot_id=fix.pilot_id,
+                    fix_id=fix.id,
+                    time=fix.time,
+                    time_visible=fix.time_visible,
+                )
+                for fix in latest.values()
+            ]
+        )
+
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.pilot_id],
+            set_=dict(
+                fix_id=stmt.excluded.fix_id,
+                time=stmt.excluded.time,
+                time_visible=stmt.excluded.time_visible,
+            ),
+            where=(table.c.time <= stmt.excluded.time),
+        )
+
+        db.session.execute(stmt)
+
+
 class TrackingSession(db.Model):
     __tablename__ = "tracking_sessions"
 
@@ -13,7 +13,7 @@ from sqlalchemy.types import (
     Interval,
     String,
 )
-from sqlalchemy.sql.expression import cast, case
+from sqlalchemy.sql.expression import cast, case, or_
 from sqlalchemy.dialects.postgresql import INET
 from sqlalchemy.ext.hybrid import hybrid_property, hybrid_method
 
@@ -278,13 +278,32 @@ class User(db.Model):
     ##############################
 
     def delete(self):
+        from skylines.model.flight import Flight
         from skylines.model.igcfile import IGCFile
+        from skylines.model.ranking import RankingAggregate
+        from skylines.model.statistics import StatisticsRollup
+
+        # the flights of the owned files are deleted by the database and the
+        # other flights of the pilot lose their pilot
+        flights = (
+            db.session.query(Flight)
+            .join(Flight.igc_file)
+            .filter(or_(IGCFile.owner_id == self.id, Flight.pilot_id == self.id))
+            .all()
+        )
+
+        ranking_keys = RankingAggregate.keys(*flights)
+        statistics_keys = StatisticsRollup.keys(*flights)
 
         for row in db.session.query(IGCFile).filter_by(owner_id=self.id):
             files.delete_file(row.filename)
 
         db.session.query(IGCFile).filter_by(owner_id=self.id).delete()
         db.session.delete(self)
+        db.session.flush()
+
+        RankingAggregate.update(ranking_keys)
+        StatisticsRollup.update(statistics_keys)
 
 
 db.Index(
@@ -0,0 +1,131 @@
+from __future__ import absolute_import
+
+import time
+from collections import namedtuple, OrderedDict
+
+from flask import current_app
+from redis import StrictRedis
+from redis.exceptions import RedisError
+
+from skylines.database import db
+from skylines.model import User, Follower
+
+# Redis channel on which the API announces tracking keys that have to be
+# reloaded from the database by the tracking server(s)
+INVALIDATION_CHANNEL = "skylines:tracking:invalidate"
+
+CachedPilot = namedtuple("CachedPilot", ["id", "name", "club_id", "tracking_delay"])
+
+# marker for keys that are not cached at all (`None` means "unknown key")
+_MISSING = object()
+
+
+def load_pilot(key):
+    """
+    Returns the `CachedPilot` for the given tracking key or `None` if no user
+    with that tracking key exists.
+    """
+
+    row = (
+        db.session.query(User.id, User.name, User.club_id, User.tracking_delay)
+        .filter(User.tracking_key == key)
+        .first()
+    )
+
+    if row is None:
+        return None
+
+    return CachedPilot(*row)
+
+
+def load_followees(pilot_id):
+    """Returns the ids of the users that the given pilot follows."""
+
+    query = db.session.query(Follower.destination_id).filter(
+        Follower.source_id == pilot_id
+    )
+
+    return frozenset(row[0] for row in query)
+
+
+class PilotCache(object):
+    """
+    Bounded LRU cache of tracking key -> `CachedPilot` lookups for the
+    tracking server.
+
+    Entries expire after `ttl` seconds, so changes that were not announced
+    via `invalidate()` are picked up eventually. Unknown keys are cached too,
+    because misconfigured clients tend to send them with every fix.
+    """
+
+    def __init__(self, load=load_pilot, max_size=10000, ttl=300, clock=time.time):
+        self.load = load
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        now = self.clock()
+
+        expires, pilot = self._entries.pop(key, (None, _MISSING))
+        if pilot is not _MISSING and expires > now:
+            self.hits += 1
+        else:
+            self.misses += 1
+            pilot = self.load(key)
+            expires = now + self.ttl
+
+        # (re)insert at the end to keep the dict in least-recently-used order
+        self._entries[key] = (expires, pilot)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+        return pilot
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return dict(
+            size=len(self._entries),
+            hits=self.hits,
+            misses=self.misses,
+            evictions=self.evictions,
+        )
+
+
+def invalidate_tracking_keys(*keys):
+    """
+    Tells the running tracking servers to drop their cached lookups for the
+    given tracking keys.
+
+    Has to be called whenever the tracking key of a user or any of the
+    attributes in `CachedPilot` change.
+    """
+
+    url = current_app.config.get("SKYLINES_TRACKING_REDIS_URL")
+    if not url:
+        return
+
+    try:
+        redis = StrictRedis.from_url(url)
+        for key in keys:
+            if key is not None:
+                redis.publish(INVALIDATION_CHANNEL, key)
+
+    except RedisError as e:
+        current_app.logger.info("Cannot publish to Redis server: %s" % e)
@@ -0,0 +1,192 @@
+"""
+Encoding and decoding of the packets of the SkyLines live tracking protocol.
+
+More information about this protocol can be found in the XCSoar source code,
+source file src/Tracking/SkyLines/Protocol.hpp
+"""
+
+from __future__ import absolute_import
+
+import struct
+
+from crc16 import crc16xmodem
+
+
+MAGIC = 0x5DF4B67B
+TYPE_PING = 1
+TYPE_ACK = 2
+TYPE_FIX = 3
+TYPE_TRAFFIC_REQUEST = 4
+TYPE_TRAFFIC_RESPONSE = 5
+TYPE_USER_NAME_REQUEST = 6
+TYPE_USER_NAME_RESPONSE = 7
+
+FLAG_ACK_BAD_KEY = 0x1
+
+FLAG_LOCATION = 0x1
+FLAG_TRACK = 0x2
+FLAG_GROUND_SPEED = 0x4
+FLAG_AIRSPEED = 0x8
+FLAG_ALTITUDE = 0x10
+FLAG_VARIO = 0x20
+FLAG_ENL = 0x40
+
+# for TYPE_TRAFFIC_REQUEST
+TRAFFIC_FLAG_FOLLOWEES = 0x1
+TRAFFIC_FLAG_CLUB = 0x2
+TRAFFIC_FLAG_NEAR = 0x4
+
+USER_FLAG_NOT_FOUND = 0x1
+
+# magic, crc, type, key
+HEADER = struct.Struct("!IHHQ")
+CRC = struct.Struct("!H")
+CRC_OFFSET = 4
+
+# id, reserved, reserved2
+PING = struct.Struct("!HHI")
+ACK = PING
+
+# flags, time, latitude, longitude, reserved, track, ground speed, airspeed,
+# altitude, vario, engine noise level
+FIX = struct.Struct("!IIiiIHHHhhH")
+
+# flags, reserved
+TRAFFIC_REQUEST = struct.Struct("!II")
+
+# reserved, reserved2, count, reserved3
+TRAFFIC_RESPONSE = struct.Struct("!HBBI")
+
+# pilot id, time, latitude, longitude, altitude, reserved, reserved2
+TRAFFIC = struct.Struct("!IIiihHI")
+
+# user id, reserved
+USER_NAME_REQUEST = struct.Struct("!II")
+
+# user id, flags, club id, name length, reserved, reserved2, reserved3,
+# reserved4, reserved5
+USER_NAME_RESPONSE = struct.Struct("!IIIBBBBII")
+
+MAX_TRAFFIC = 255
+MAX_NAME_LENGTH = 255
+
+_crc = CRC.pack
+_unpack_header = HEADER.unpack_from
+_unpack_fix = FIX.unpack_from
+
+
+def decode_header(data):
+    """
+    Returns a `(type, key)` tuple for a valid packet or None if the magic
+    number or the checksum don't match.
+    """
+
+    if len(data) < HEADER.size:
+        return None
+
+    magic, crc, packet_type, key = _unpack_header(data)
+    if magic != MAGIC:
+        return None
+
+    # the checksum is calculated with a zeroed checksum field
+    expected = crc16xmodem(data[:CRC_OFFSET])
+    expected = crc16xmodem(b"\0\0", expected)
+    expected = crc16xmodem(data[CRC_OFFSET + CRC.size :], expected)
+    if crc != expected:
+        return None
+
+    return packet_type, key
+
+
+def decode_ping(data):
+    """Returns the id of a ping packet or None."""
+
+    if len(data) != HEADER.size + PING.size:
+        return None
+
+    return PING.unpack_from(data, HEADER.size)[0]
+
+
+def decode_fix(data):
+    """
+    Returns the fields of a fix packet as a tuple (see `FIX`) or None.
+    """
+
+    if len(data) != HEADER.size + FIX.size:
+        return None
+
+    return _unpack_fix(data, HEADER.size)
+
+
+def decode_traffic_request(data):
+    """Returns the flags of a traffic request packet or None."""
+
+    if len(data) != HEADER.size + TRAFFIC_REQUEST.size:
+        return None
+
+    return TRAFFIC_REQUEST.unpack_from(data, HEADER.size)[0]
+
+
+def decode_user_name_request(data):
+    """Returns the requested user id of a user name request packet or None."""
+
+    if len(data) != HEADER.size + USER_NAME_REQUEST.size:
+        return None
+
+    return USER_NAME_REQUEST.unpack_from(data, HEADER.size)[0]
+
+
+def encode_ack(id, flags):
+    return _finish(HEADER.pack(MAGIC, 0, TYPE_ACK, 0) + ACK.pack(id, 0, flags))
+
+
+def encode_traffic(pilot_id, time, latitude, longitude, altitude):
+    """
+    Encodes the traffic record of a single pilot for
+    `encode_traffic_response()`.
+
+    The records are supposed to be encoded once when the fix is received
+    and reused for all traffic responses containing the pilot.
+    """
+
+    return TRAFFIC.pack(
+        pilot_id,
+        time.hour * 3600000
+        + time.minute * 60000
+        + time.second * 1000
+        + time.microsecond // 1000,
+        int(latitude * 1000000),
+        int(longitude * 1000000),
+        int(altitude),
+        0,
+        0,
+    )
+
+
+def encode_traffic_response(records):
+    """Encodes a traffic response from `encode_traffic()` records."""
+
+    records = records[:MAX_TRAFFIC]
+
+    return _finish(
+        HEADER.pack(MAGIC, 0, TYPE_TRAFFIC_RESPONSE, 0)
+        + TRAFFIC_RESPONSE.pack(0, 0, len(records), 0)
+        + b"".join(records)
+    )
+
+
+def encode_user_name_response(user_id, flags=0, club_id=0, name=b""):
+    """Encodes a user name response, `name` has to be UTF-8 encoded."""
+
+    name = name[:MAX_NAME_LENGTH]
+
+    return _finish(
+        HEADER.pack(MAGIC, 0, TYPE_USER_NAME_RESPONSE, 0)
+        + USER_NAME_RESPONSE.pack(user_id, flags, club_id, len(name), 0, 0, 0, 0, 0)
+        + name
+    )
+
+
+def _finish(data):
+    # the checksum field is still zero at this point
+    return data[:CRC_OFFSET] + _crc(crc16xmodem(data)) + data[CRC_OFFSET + CRC.size :]
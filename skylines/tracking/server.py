@@ -1,47 +1,61 @@
 from __future__ import absolute_import, print_function
 
 import sys
-import struct
+import time
 from datetime import datetime, timedelta
+from random import random
 
+import gevent
 import sentry_sdk
-from gevent.server import DatagramServer
-
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.sql.expression import or_
-
-from skylines.database import db
-from skylines.model import User, TrackingFix, Follower, Elevation
-from skylines.tracking.crc import check_crc, set_crc
+from gevent.server import DatagramServer, StreamServer
+from redis import StrictRedis
+from redis.exceptions import RedisError
+
+from skylines.model import User, TrackingFix, Location
+from skylines.tracking.cache import PilotCache, INVALIDATION_CHANNEL, load_followees
+from skylines.tracking.protocol import (
+    MAGIC,
+    HEADER,
+    TYPE_PING,
+    TYPE_FIX,
+    TYPE_TRAFFIC_REQUEST,
+    TYPE_USER_NAME_REQUEST,
+    FLAG_ACK_BAD_KEY,
+    FLAG_LOCATION,
+    FLAG_TRACK,
+    FLAG_GROUND_SPEED,
+    FLAG_AIRSPEED,
+    FLAG_ALTITUDE,
+    FLAG_VARIO,
+    FLAG_ENL,
+    TRAFFIC_FLAG_FOLLOWEES,
+    TRAFFIC_FLAG_CLUB,
+    TRAFFIC_FLAG_NEAR,
+    USER_FLAG_NOT_FOUND,
+    decode_header,
+    decode_ping,
+    decode_fix,
+    decode_traffic_request,
+    decode_user_name_request,
+    encode_ack,
+    encode_traffic_response,
+    encode_user_name_response,
+)
+
+# the types of the sent packets are still available from this module
+from skylines.tracking.protocol import TYPE_ACK, TYPE_TRAFFIC_RESPONSE  # noqa
 from skylines.tracking.datetime import ms_to_time
+from skylines.tracking.stats import Metrics, parse_address, respond
+from skylines.tracking.traffic import TrafficIndex, create_traffic_fix
+from skylines.tracking.writer import FixWriter, COLUMNS
 
-# More information about this protocol can be found in the XCSoar
-# source code, source file src/Tracking/SkyLines/Protocol.hpp
-
-MAGIC = 0x5DF4B67B
-TYPE_PING = 1
-TYPE_ACK = 2
-TYPE_FIX = 3
-TYPE_TRAFFIC_REQUEST = 4
-TYPE_TRAFFIC_RESPONSE = 5
-TYPE_USER_NAME_REQUEST = 6
-TYPE_USER_NAME_RESPONSE = 7
-
-FLAG_ACK_BAD_KEY = 0x1
-
-FLAG_LOCATION = 0x1
-FLAG_TRACK = 0x2
-FLAG_GROUND_SPEED = 0x4
-FLAG_AIRSPEED = 0x8
-FLAG_ALTITUDE = 0x10
-FLAG_VARIO = 0x20
-FLAG_ENL = 0x40
-
-# for TYPE_TRAFFIC_REQUEST
-TRAFFIC_FLAG_FOLLOWEES = 0x1
-TRAFFIC_FLAG_CLUB = 0x2
 
-USER_FLAG_NOT_FOUND = 0x1
+PACKET_NAMES = {
+    TYPE_PING: "ping",
+    TYPE_FIX: "fix",
+    TYPE_TRAFFIC_REQUEST: "traffic_request",
+    TYPE_USER_NAME_REQUEST: "user_name_request",
+}
 
 
 def log(message):
@@ -53,239 +67,354 @@ class TrackingServer(DatagramServer):
     def init_app(self, app):
         self.app = app
 
-    def ping_received(self, host, port, key, payload):
-        if len(payload) != 8:
+        self.pilots = PilotCache(
+            max_size=app.config.get("SKYLINES_TRACKING_CACHE_SIZE", 10000),
+            ttl=app.config.get("SKYLINES_TRACKING_CACHE_TTL", 300),
+        )
+
+        self.fix_writer = FixWriter(
+            app,
+            batch_size=app.config.get("SKYLINES_TRACKING_BATCH_SIZE", 100),
+            interval=app.config.get("SKYLINES_TRACKING_BATCH_INTERVAL", 0.5),
+            max_size=app.config.get("SKYLINES_TRACKING_QUEUE_SIZE", 10000),
+        )
+
+        self.traffic = TrafficIndex()
+        self.traffic_radius = app.config.get("SKYLINES_TRACKING_TRAFFIC_RADIUS", 50000)
+
+        # the followees are not invalidated by the API, so keep them briefly
+        self.followees = PilotCache(load=load_followees, ttl=60)
+
+        # seconds between reloads of the traffic index from the database,
+        # needed if the fixes are spread across multiple processes
+        self.traffic_refresh_interval = None
+
+        # fixes that became visible before this time have already been loaded
+        self.traffic_loaded = None
+
+        self.metrics = Metrics()
+
+        # fraction of the received packets that are logged
+        self.log_rate = app.config.get("SKYLINES_TRACKING_LOG_RATE", 1.0)
+
+        # local `host:port` address serving the `stats()` over HTTP
+        stats_address = app.config.get("SKYLINES_TRACKING_STATS_ADDRESS")
+        self.stats_address = stats_address and parse_address(stats_address)
+        self.stats_server = None
+
+    def log_packet(self, message, *args):
+        """Logs a message about a single packet, if it is sampled."""
+
+        if self.log_rate >= 1 or random() < self.log_rate:
+            log(message % args)
+
+    def load_traffic(self):
+        """
+        Adds the latest fixes from the database to the traffic index. The
+        query runs in the thread of the fix writer and only returns the
+        fixes that became visible since the previous call.
+        """
+
+        now = datetime.utcnow()
+        fixes = self.fix_writer.apply(self.query_traffic, self.traffic_loaded)
+
+        for fix in fixes:
+            self.traffic.add(fix, now)
+
+        # fixes may be written late by the write-behind queues of the other
+        # processes, the fixes that are loaded twice are ignored by the index
+        self.traffic_loaded = now - timedelta(minutes=1)
+
+    def query_traffic(self, visible_since=None):
+        """
+        Returns the latest visible fixes from the database as `TrafficFix`
+        tuples. The pilots of the fixes are joined by `get_latest()`.
+        """
+
+        query = TrackingFix.get_latest(max_age=self.traffic.max_age)
+        if visible_since is not None:
+            query = query.filter(TrackingFix.time_visible > visible_since)
+
+        fixes = []
+        for fix in query:
+            location = fix.location
+            fixes.append(
+                create_traffic_fix(
+                    fix.pilot_id,
+                    fix.pilot.club_id,
+                    fix.time,
+                    fix.time_visible,
+                    location.latitude,
+                    location.longitude,
+                    fix.altitude,
+                )
+            )
+
+        return fixes
+
+    def refresh_traffic(self):
+        """Periodically loads the fixes received by other processes."""
+
+        while True:
+            gevent.sleep(self.traffic_refresh_interval)
+
+            try:
+                self.load_traffic()
+
+            except Exception:
+                sentry_sdk.capture_exception()
+
+    def stats(self):
+        """
+        Returns the counters and gauges of the server. The `latency`
+        histograms are measured in milliseconds.
+        """
+
+        return dict(
+            packets=dict(self.metrics.counters),
+            latency=dict(
+                (name, histogram.as_dict())
+                for name, histogram in self.metrics.histograms.items()
+            ),
+            pilots=self.pilots.stats(),
+            fixes=dict(
+                queued=len(self.fix_writer),
+                written=self.fix_writer.written,
+                failed=self.fix_writer.failed,
+                dropped=self.fix_writer.dropped,
+                write_time=self.fix_writer.write_time.as_dict(),
+            ),
+            traffic=dict(pilots=len(self.traffic)),
+        )
+
+    def stats_requested(self, socket, address):
+        respond(socket, self.stats())
+
+    def listen_for_invalidations(self):
+        """Drops cached pilots whose tracking key is announced by the API."""
+
+        url = self.app.config.get("SKYLINES_TRACKING_REDIS_URL")
+        if not url:
+            return
+
+        pubsub = None
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = StrictRedis.from_url(url).pubsub(
+                        ignore_subscribe_messages=True
+                    )
+                    pubsub.subscribe(INVALIDATION_CHANNEL)
+
+                    # we might have missed messages while we were disconnected
+                    self.pilots.clear()
+
+                message = pubsub.get_message()
+                while message:
+                    self.pilots.invalidate(int(message["data"]))
+                    message = pubsub.get_message()
+
+            except RedisError as e:
+                log("redis error: " + str(e))
+                pubsub = None
+                gevent.sleep(10)
+
+            gevent.sleep(1)
+
+    def ping_received(self, host, port, key, data):
+        id = decode_ping(data)
+        if id is None:
             return
-        id, reserved, reserved2 = struct.unpack("!HHI", payload)
 
         flags = 0
 
-        pilot = User.by_tracking_key(key)
+        pilot = self.pilots.get(key)
         if not pilot:
-            log("%s PING unknown pilot (key: %x)" % (host, key))
+            self.metrics.incr("unknown_key")
+            self.log_packet("%s PING unknown pilot (key: %x)", host, key)
             flags |= FLAG_ACK_BAD_KEY
         else:
-            log("%s PING %s -> PONG" % (host, pilot.name.encode("utf8", "ignore")))
+            self.log_packet(
+                "%s PING %s -> PONG", host, pilot.name.encode("utf8", "ignore")
+            )
 
-        data = struct.pack("!IHHQHHI", MAGIC, 0, TYPE_ACK, 0, id, 0, flags)
-        data = set_crc(data)
-        self.socket.sendto(data, (host, port))
+        self.socket.sendto(encode_ack(id, flags), (host, port))
 
-    def fix_received(self, host, key, payload):
-        if len(payload) != 32:
+    def fix_received(self, host, key, data):
+        packet = decode_fix(data)
+        if packet is None:
             return
 
-        pilot = User.by_tracking_key(key)
+        (
+            flags,
+            time_ms,
+            latitude,
+            longitude,
+            _,
+            track,
+            ground_speed,
+            airspeed,
+            altitude,
+            vario,
+            enl,
+        ) = packet
+
+        pilot = self.pilots.get(key)
         if not pilot:
-            log("%s FIX unknown pilot (key: %x)" % (host, key))
+            self.metrics.incr("unknown_key")
+            self.log_packet("%s FIX unknown pilot (key: %x)", host, key)
             return
 
-        data = struct.unpack("!IIiiIHHHhhH", payload)
-
-        fix = TrackingFix()
-        fix.ip = host
-        fix.pilot = pilot
+        fix = dict.fromkeys(COLUMNS)
+        fix["ip"] = host
+        fix["pilot_id"] = pilot.id
 
         # import the time stamp from the packet if it's within a
         # certain range
-        time_of_day_ms = data[1] % (24 * 3600 * 1000)
+        time_of_day_ms = time_ms % (24 * 3600 * 1000)
         time_of_day_s = time_of_day_ms / 1000
-        time_of_day = ms_to_time(data[1])
+        time_of_day = ms_to_time(time_ms)
 
         now = datetime.utcnow()
         now_s = ((now.hour * 60) + now.minute) * 60 + now.second
         if now_s - 1800 < time_of_day_s < now_s + 180:
-            fix.time = datetime.combine(now.date(), time_of_day)
+            fix["time"] = datetime.combine(now.date(), time_of_day)
         elif now_s < 1800 and time_of_day_s > 23 * 3600:
             # midnight rollover occurred
-            fix.time = datetime.combine(now.date(), time_of_day) - timedelta(days=1)
+            fix["time"] = datetime.combine(now.date(), time_of_day) - timedelta(days=1)
         else:
-            log("bad time stamp: " + str(time_of_day))
-            fix.time = datetime.utcnow()
+            self.metrics.incr("bad_time")
+            self.log_packet("bad time stamp: %s", time_of_day)
+            fix["time"] = datetime.utcnow()
 
-        fix.time_visible = fix.time + timedelta(minutes=pilot.tracking_delay)
+        fix["time_visible"] = fix["time"] + timedelta(minutes=pilot.tracking_delay)
 
-        flags = data[0]
-        if flags & FLAG_LOCATION:
-            latitude = data[2] / 1000000.0
-            longitude = data[3] / 1000000.0
-            fix.set_location(longitude, latitude)
+        location = None
 
-            fix.elevation = Elevation.get(fix.location_wkt)
+        if flags & FLAG_LOCATION:
+            location = Location(
+                latitude=latitude / 1000000.0, longitude=longitude / 1000000.0,
+            )
+            fix["location"] = location
 
         if flags & FLAG_TRACK:
-            fix.track = data[5]
+            fix["track"] = track
 
         if flags & FLAG_GROUND_SPEED:
-            fix.ground_speed = data[6] / 16.0
+            fix["ground_speed"] = ground_speed / 16.0
 
         if flags & FLAG_AIRSPEED:
-            fix.airspeed = data[7] / 16.0
+            fix["airspeed"] = airspeed / 16.0
 
         if flags & FLAG_ALTITUDE:
-            fix.altitude = data[8]
+            fix["altitude"] = altitude
 
         if flags & FLAG_VARIO:
-            fix.vario = data[9] / 256.0
+            fix["vario"] = vario / 256.0
 
         if flags & FLAG_ENL:
-            fix.engine_noise_level = data[10]
+            fix["engine_noise_level"] = enl
+
+        self.log_packet(
+            "%s FIX %s %s %s",
+            host,
+            pilot.name.encode("utf8", "ignore"),
+            fix["time"] and fix["time"].time(),
+            location,
+        )
 
-        log(
-            "{} FIX {} {} {}".format(
-                host,
-                pilot.name.encode("utf8", "ignore"),
-                fix.time and fix.time.time(),
-                fix.location,
+        if location is not None:
+            self.traffic.add(
+                create_traffic_fix(
+                    pilot.id,
+                    pilot.club_id,
+                    fix["time"],
+                    fix["time_visible"],
+                    location.latitude,
+                    location.longitude,
+                    fix["altitude"],
+                ),
+                datetime.utcnow(),
             )
-        )
 
-        db.session.add(fix)
-        try:
-            db.session.commit()
-        except SQLAlchemyError as e:
-            log("database error:" + str(e))
-            db.session.rollback()
+        if not self.fix_writer.add(fix):
+            self.log_packet(
+                "%s FIX dropped, %d fixes queued", host, len(self.fix_writer)
+            )
 
-    def traffic_request_received(self, host, port, key, payload):
-        if len(payload) != 8:
+    def traffic_request_received(self, host, port, key, data):
+        flags = decode_traffic_request(data)
+        if flags is None:
             return
 
-        pilot = User.by_tracking_key(key)
+        pilot = self.pilots.get(key)
         if pilot is None:
-            log("%s TRAFFIC_REQUEST unknown pilot (key: %x)" % (host, key))
+            self.metrics.incr("unknown_key")
+            self.log_packet("%s TRAFFIC_REQUEST unknown pilot (key: %x)", host, key)
             return
 
-        data = struct.unpack("!II", payload)
-        or_filters = []
-
-        flags = data[0]
-        if flags & TRAFFIC_FLAG_FOLLOWEES:
-            subq = (
-                db.session.query(Follower.destination_id)
-                .filter(Follower.source_id == pilot.id)
-                .subquery()
-            )
-
-            or_filters.append(TrackingFix.pilot_id.in_(subq))
-
-        if flags & TRAFFIC_FLAG_CLUB:
-            subq = (
-                db.session.query(User.id)
-                .filter(User.club_id == pilot.club_id)
-                .subquery()
-            )
-
-            or_filters.append(TrackingFix.pilot_id.in_(subq))
+        now = datetime.utcnow()
 
-        if len(or_filters) == 0:
+        if not flags & (TRAFFIC_FLAG_FOLLOWEES | TRAFFIC_FLAG_CLUB | TRAFFIC_FLAG_NEAR):
             return
 
-        # Add a db.Column to the inner query with
-        # numbers ordered by time for each pilot
-        row_number = db.over(
-            db.func.row_number(),
-            partition_by=TrackingFix.pilot_id,
-            order_by=TrackingFix.time.desc(),
-        )
+        fixes = []
 
-        # Create inner query
-        subq = (
-            db.session.query(TrackingFix.id, row_number.label("row_number"))
-            .join(TrackingFix.pilot)
-            .filter(TrackingFix.pilot_id != pilot.id)
-            .filter(TrackingFix.max_age_filter(2))
-            .filter(TrackingFix.time_visible <= datetime.utcnow())
-            .filter(TrackingFix.location_wkt != None)
-            .filter(TrackingFix.altitude != None)
-            .filter(or_(*or_filters))
-            .subquery()
+        if flags & TRAFFIC_FLAG_FOLLOWEES:
+            fixes.extend(self.traffic.get(self.followees.get(pilot.id), now))
+
+        if flags & TRAFFIC_FLAG_CLUB and pilot.club_id is not None:
+            fixes.extend(self.traffic.club(pilot.club_id, now))
+
+        if flags & TRAFFIC_FLAG_NEAR:
+            position = self.traffic.position(pilot.id)
+            if position is not None:
+                fixes.extend(
+                    self.traffic.near(
+                        position.latitude, position.longitude, self.traffic_radius, now
+                    )
+                )
+
+        fixes = dict(
+            (fix.pilot_id, fix)
+            for fix in fixes
+            if fix.pilot_id != pilot.id and fix.record is not None
         )
 
-        # Create outer query that orders by time and
-        # only selects the latest fix
-        query = (
-            TrackingFix.query()
-            .filter(TrackingFix.id == subq.c.id)
-            .filter(subq.c.row_number == 1)
-            .order_by(TrackingFix.time.desc())
-            .limit(32)
-        )
+        fixes = sorted(fixes.values(), key=lambda fix: fix.time, reverse=True)[:32]
 
-        response = ""
-        count = 0
-        for fix in query:
-            location = fix.location
-            if location is None:
-                continue
-
-            t = fix.time
-            t = (
-                t.hour * 3600000
-                + t.minute * 60000
-                + t.second * 1000
-                + t.microsecond / 1000
-            )
-            response += struct.pack(
-                "!IIiihHI",
-                fix.pilot_id,
-                t,
-                int(location.latitude * 1000000),
-                int(location.longitude * 1000000),
-                int(fix.altitude),
-                0,
-                0,
-            )
-            count += 1
-
-        response = struct.pack("!HBBI", 0, 0, count, 0) + response
-        response = struct.pack("!IHHQ", MAGIC, 0, TYPE_TRAFFIC_RESPONSE, 0) + response
-        response = set_crc(response)
+        response = encode_traffic_response([fix.record for fix in fixes])
         self.socket.sendto(response, (host, port))
 
-        log(
-            "%s TRAFFIC_REQUEST %s -> %d locations"
-            % (host, pilot.name.encode("utf8", "ignore"), count)
+        self.log_packet(
+            "%s TRAFFIC_REQUEST %s -> %d locations",
+            host,
+            pilot.name.encode("utf8", "ignore"),
+            len(fixes),
         )
 
-    def username_request_received(self, host, port, key, payload):
+    def username_request_received(self, host, port, key, data):
         """The client asks for the display name of a user account."""
 
-        if len(payload) != 8:
+        user_id = decode_user_name_request(data)
+        if user_id is None:
             return
 
-        pilot = User.by_tracking_key(key)
+        pilot = self.pilots.get(key)
         if pilot is None:
-            log("%s USER_NAME_REQUEST unknown pilot (key: %x)" % (host, key))
+            self.metrics.incr("unknown_key")
+            self.log_packet("%s USER_NAME_REQUEST unknown pilot (key: %x)", host, key)
             return
 
-        data = struct.unpack("!II", payload)
-        user_id = data[0]
-
         user = User.get(user_id)
         if user is None:
-            response = struct.pack(
-                "!IHHQIIIBBBBII",
-                MAGIC,
-                0,
-                TYPE_USER_NAME_RESPONSE,
-                0,
-                user_id,
-                USER_FLAG_NOT_FOUND,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-                0,
-            )
-            response = set_crc(response)
-            self.transport.write(response, (host, port))
+            response = encode_user_name_response(user_id, flags=USER_FLAG_NOT_FOUND)
+            self.socket.sendto(response, (host, port))
 
-            log(
-                "%s, USER_NAME_REQUEST %s -> NOT_FOUND"
-                % (host, pilot.name.encode("utf8", "ignore"))
+            self.log_packet(
+                "%s, USER_NAME_REQUEST %s -> NOT_FOUND",
+                host,
+                pilot.name.encode("utf8", "ignore"),
             )
 
             return
@@ -293,65 +422,77 @@ class TrackingServer(DatagramServer):
         name = user.name[:64].encode("utf8", "ignore")
         club_id = user.club_id or 0
 
-        response = struct.pack(
-            "!IHHQIIIBBBBII",
-            MAGIC,
-            0,
-            TYPE_USER_NAME_RESPONSE,
-            0,
-            user_id,
-            0,
-            club_id,
-            len(name),
-            0,
-            0,
-            0,
-            0,
-            0,
-        )
-        response += name
-        response = set_crc(response)
+        response = encode_user_name_response(user_id, club_id=club_id, name=name)
         self.socket.sendto(response, (host, port))
 
-        log(
-            "%s USER_NAME_REQUEST %s -> %s"
-            % (
-                host,
-                pilot.name.encode("utf8", "ignore"),
-                user.name.encode("utf8", "ignore"),
-            )
+        self.log_packet(
+            "%s USER_NAME_REQUEST %s -> %s",
+            host,
+            pilot.name.encode("utf8", "ignore"),
+            user.name.encode("utf8", "ignore"),
         )
 
     def __handle(self, data, address):
-        if len(data) < 16:
-            return
+        """Handles a packet and returns the name of its type."""
 
-        header = struct.unpack("!IHHQ", data[:16])
-        if header[0] != MAGIC:
-            return
-        if not check_crc(data):
-            return
+        header = decode_header(data)
+        if header is None:
+            if len(data) >= HEADER.size and HEADER.unpack_from(data)[0] == MAGIC:
+                return "bad_crc"
 
+            return "invalid"
+
+        packet_type, key = header
         (host, port) = address
 
         with self.app.app_context():
-            if header[2] == TYPE_FIX:
-                self.fix_received(host, header[3], data[16:])
-            elif header[2] == TYPE_PING:
-                self.ping_received(host, port, header[3], data[16:])
-            elif header[2] == TYPE_TRAFFIC_REQUEST:
-                self.traffic_request_received(host, port, header[3], data[16:])
-            elif header[2] == TYPE_USER_NAME_REQUEST:
-                self.username_request_received(host, port, header[3], data[16:])
+            if packet_type == TYPE_FIX:
+                self.fix_received(host, key, data)
+            elif packet_type == TYPE_PING:
+                self.ping_received(host, port, key, data)
+            elif packet_type == TYPE_TRAFFIC_REQUEST:
+                self.traffic_request_received(host, port, key, data)
+            elif packet_type == TYPE_USER_NAME_REQUEST:
+                self.username_request_received(host, port, key, data)
+
+        return PACKET_NAMES.get(packet_type, "unknown_type")
 
     def handle(self, data, address):
+        start = time.time()
+
         try:
-            self.__handle(data, address)
+            name = self.__handle(data, address)
         except Exception:
             sentry_sdk.capture_exception()
+            name = "error"
+
+        self.metrics.incr(name)
+        self.metrics.add(name, (time.time() - start) * 1000)
 
     def serve_forever(self, **kwargs):
         if not self.app:
             raise RuntimeError("application not registered on server instance")
 
+        self.load_traffic()
+
+        gevent.spawn(self.listen_for_invalidations)
+
+        if self.traffic_refresh_interval:
+            gevent.spawn(self.refresh_traffic)
+
+        self.fix_writer.start()
+
+        if self.stats_address:
+            self.stats_server = StreamServer(self.stats_address, self.stats_requested)
+            self.stats_server.start()
+
         super(TrackingServer, self).serve_forever(**kwargs)
+
+    def stop(self, *args, **kwargs):
+        super(TrackingServer, self).stop(*args, **kwargs)
+
+        if self.stats_server is not None:
+            self.stats_server.stop()
+
+        # write the fixes that are still queued before shutting down
+        self.fix_writer.close()
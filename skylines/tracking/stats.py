@@ -0,0 +1,105 @@
+from __future__ import absolute_import
+
+import json
+import socket
+from bisect import bisect_left
+from collections import defaultdict
+
+# upper bounds of the histogram buckets in milliseconds
+BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000)
+
+
+class Histogram(object):
+    """
+    Counts values in buckets, so that the histograms of multiple processes
+    can be added up.
+    """
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def add(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        buckets = dict(
+            ("%g" % bucket, count) for bucket, count in zip(self.buckets, self.counts)
+        )
+        buckets["inf"] = self.counts[-1]
+
+        return dict(count=self.count, sum=self.sum, buckets=buckets)
+
+
+class Metrics(object):
+    """Named counters and histograms of the tracking server."""
+
+    def __init__(self):
+        self.counters = defaultdict(int)
+        self.histograms = defaultdict(Histogram)
+
+    def incr(self, name, value=1):
+        self.counters[name] += value
+
+    def add(self, name, value):
+        self.histograms[name].add(value)
+
+
+def parse_address(address):
+    """Converts a `host:port` string to a `(host, port)` tuple."""
+
+    host, _, port = address.rpartition(":")
+    return host, int(port)
+
+
+def http_response(stats):
+    """Returns a minimal HTTP response containing the stats as JSON."""
+
+    body = json.dumps(stats, sort_keys=True).encode("utf8")
+
+    return (
+        b"HTTP/1.0 200 OK\r\n"
+        b"Content-Type: application/json\r\n"
+        b"Content-Length: " + str(len(body)).encode("ascii") + b"\r\n"
+        b"\r\n" + body
+    )
+
+
+def listen(address):
+    """Returns a listening TCP socket for `serve_request()`."""
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(address)
+    sock.listen(8)
+    return sock
+
+
+def serve_request(listener, stats, timeout=1):
+    """
+    Accepts a single connection on the `listener` socket and answers it
+    with the `stats`.
+    """
+
+    conn, _ = listener.accept()
+    respond(conn, stats, timeout)
+
+
+def respond(conn, stats, timeout=1):
+    """
+    Answers any request on the connection with the `stats` and closes it.
+    Slow clients are disconnected after `timeout` seconds.
+    """
+
+    try:
+        conn.settimeout(timeout)
+        conn.recv(4096)
+        conn.sendall(http_response(stats))
+    except socket.error:
+        pass
+    finally:
+        conn.close()
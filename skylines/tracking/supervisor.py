@@ -0,0 +1,239 @@
+from __future__ import absolute_import, print_function
+
+import errno
+import json
+import os
+import select
+import signal
+import sys
+import time
+import traceback
+
+import gevent
+from gevent import socket
+
+from skylines.tracking.stats import listen, serve_request
+
+# not exposed by the socket module of all Python versions
+SO_REUSEPORT = getattr(socket, "SO_REUSEPORT", 15)
+
+
+def log(message):
+    print(message)
+    sys.stdout.flush()
+
+
+def reuseport_socket(host, port):
+    """
+    Returns a UDP socket bound to the given address that may be shared with
+    other processes. The kernel distributes the incoming datagrams between
+    all processes by their source address.
+    """
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    return sock
+
+
+def merge_stats(total, stats):
+    """Adds the numbers of the `stats` dict to the `total` dict."""
+
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            merge_stats(total.setdefault(key, {}), value)
+        else:
+            total[key] = total.get(key, 0) + value
+
+    return total
+
+
+class Worker(object):
+    def __init__(self, pid, fd):
+        self.pid = pid
+        self.fd = fd
+        self.started = time.time()
+
+        self.buffer = b""
+        self.stats = {}
+
+    def read(self):
+        data = os.read(self.fd, 65536)
+        if not data:
+            return
+
+        lines = (self.buffer + data).split(b"\n")
+        self.buffer = lines.pop()
+
+        if lines:
+            self.stats = json.loads(lines[-1].decode("utf8"))
+
+
+class Supervisor(object):
+    """
+    Runs `workers` tracking server processes sharing the same UDP port and
+    restarts them if they die.
+
+    `create_server` is called in every worker process and has to return an
+    initialized `TrackingServer`, so that every worker has its own database
+    connections. The workers report their `stats()` through a pipe every
+    `report_interval` seconds and the supervisor logs the sum of all workers
+    every `stats_interval` seconds. If a `stats_address` is given, the sum
+    is also served over HTTP on that address.
+    """
+
+    def __init__(
+        self,
+        create_server,
+        workers,
+        stats_interval=60,
+        report_interval=10,
+        stats_address=None,
+    ):
+        self.create_server = create_server
+        self.num_workers = workers
+        self.stats_interval = stats_interval
+        self.report_interval = report_interval
+        self.stats_address = stats_address
+
+        self.workers = {}
+        self.stopping = False
+        self.stats_socket = None
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        if self.stats_address:
+            self.stats_socket = listen(self.stats_address)
+
+        for i in range(self.num_workers):
+            self.spawn()
+
+        last_stats = time.time()
+
+        while self.workers:
+            self.read_stats(timeout=1)
+            self.reap()
+
+            if time.time() - last_stats >= self.stats_interval:
+                self.log_stats()
+                last_stats = time.time()
+
+    def stop(self, *args):
+        if self.stopping:
+            return
+
+        log("Stopping %d workers" % len(self.workers))
+        self.stopping = True
+
+        for worker in self.workers.values():
+            try:
+                os.kill(worker.pid, signal.SIGTERM)
+            except OSError:
+                pass
+
+    def spawn(self):
+        read_fd, write_fd = os.pipe()
+
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            for worker in self.workers.values():
+                os.close(worker.fd)
+
+            if self.stats_socket is not None:
+                self.stats_socket.close()
+
+            try:
+                self.run_worker(write_fd)
+            except BaseException:
+                traceback.print_exc()
+                os._exit(1)
+
+            os._exit(0)
+
+        os.close(write_fd)
+        self.workers[pid] = Worker(pid, read_fd)
+
+        log("Started worker %d" % pid)
+
+    def run_worker(self, fd):
+        gevent.reinit()
+
+        # the supervisor tells us when to stop
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+
+        server = self.create_server()
+        gevent.signal(signal.SIGTERM, server.stop)
+        gevent.spawn(self.report_stats, server, fd)
+
+        server.serve_forever()
+
+    def report_stats(self, server, fd):
+        while True:
+            gevent.sleep(self.report_interval)
+            os.write(fd, json.dumps(server.stats()).encode("utf8") + b"\n")
+
+    def read_stats(self, timeout):
+        fds = dict((worker.fd, worker) for worker in self.workers.values())
+
+        sockets = list(fds)
+        if self.stats_socket is not None:
+            sockets.append(self.stats_socket)
+
+        try:
+            readable, _, _ = select.select(sockets, [], [], timeout)
+        except (select.error, OSError) as e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+            return
+
+        for fd in readable:
+            if fd is self.stats_socket:
+                serve_request(self.stats_socket, self.total_stats())
+            else:
+                fds[fd].read()
+
+    def reap(self):
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except OSError as e:
+                if e.args[0] == errno.EINTR:
+                    continue
+
+                raise
+
+            if pid == 0:
+                return
+
+            worker = self.workers.pop(pid, None)
+            if worker is None:
+                continue
+
+            os.close(worker.fd)
+
+            if self.stopping:
+                continue
+
+            log("Worker %d died with status %d, restarting" % (pid, status))
+
+            # don't restart crashing workers in a tight loop
+            if time.time() - worker.started < 1:
+                time.sleep(1)
+
+            self.spawn()
+
+    def total_stats(self):
+        total = {}
+        for worker in self.workers.values():
+            merge_stats(total, worker.stats)
+
+        return total
+
+    def log_stats(self):
+        total = self.total_stats()
+        log("%d workers: %s" % (len(self.workers), json.dumps(total, sort_keys=True)))
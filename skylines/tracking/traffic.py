@@ -0,0 +1,249 @@
+from __future__ import absolute_import
+
+import heapq
+import math
+from collections import defaultdict, deque, namedtuple
+from datetime import timedelta
+
+from skylines.lib.geo import geographic_distance, METERS_PER_DEGREE
+from skylines.model import Location
+from skylines.tracking.protocol import encode_traffic
+
+TrafficFix = namedtuple(
+    "TrafficFix",
+    [
+        "pilot_id",
+        "club_id",
+        "time",
+        "time_visible",
+        "latitude",
+        "longitude",
+        "altitude",
+        "record",
+    ],
+)
+
+
+def create_traffic_fix(
+    pilot_id, club_id, time, time_visible, latitude, longitude, altitude
+):
+    """
+    Returns a `TrafficFix` including its encoded record for traffic responses,
+    if the fix has an altitude.
+    """
+
+    record = None
+    if altitude is not None:
+        record = encode_traffic(pilot_id, time, latitude, longitude, altitude)
+
+    return TrafficFix(
+        pilot_id, club_id, time, time_visible, latitude, longitude, altitude, record
+    )
+
+
+class TrafficIndex(object):
+    """
+    In-memory index of the latest visible position of every active pilot,
+    which is used to answer traffic requests without querying the database.
+
+    Fixes that are delayed by the tracking delay of the pilot are kept until
+    their `time_visible` has passed. The heap of pending fixes has at most
+    one entry per pilot, pointing to the oldest pending fix of the pilot.
+    The visible positions are sorted into a grid of `cell_size` x `cell_size`
+    degrees and are forgotten after `max_age`.
+    """
+
+    def __init__(self, cell_size=0.5, max_age=timedelta(hours=2)):
+        self.cell_size = cell_size
+        self.max_age = max_age
+
+        # heap of (time_visible, pilot_id) tuples of the first fix in
+        # `_pending`, entries of pilots without pending fixes are skipped
+        self._heap = []
+        self._pending = {}
+
+        self._newest = {}
+        self._visible = {}
+        self._cells = defaultdict(set)
+        self._clubs = defaultdict(set)
+
+        self._last_expiry = None
+
+    def __len__(self):
+        return len(self._visible)
+
+    def add(self, fix, now):
+        """
+        Adds a `TrafficFix` to the index. Fixes that are older than the
+        newest fix of the pilot are ignored, e.g. when the same fixes are
+        loaded from the database again.
+        """
+
+        newest = self._newest.get(fix.pilot_id)
+        if newest is not None and newest.time > fix.time:
+            return
+
+        self._newest[fix.pilot_id] = fix
+
+        if fix.time_visible <= now:
+            self._pending.pop(fix.pilot_id, None)
+            self._publish(fix)
+
+        else:
+            pending = self._pending.get(fix.pilot_id)
+            if pending is None:
+                pending = self._pending[fix.pilot_id] = deque()
+                heapq.heappush(self._heap, (fix.time_visible, fix.pilot_id))
+
+            # a fix with the same time replaces the previous one
+            if pending and pending[-1].time == fix.time:
+                pending.pop()
+
+            pending.append(fix)
+
+        self.update(now)
+
+    def position(self, pilot_id):
+        """
+        Returns the newest fix of the given pilot, regardless of whether it
+        is visible yet.
+        """
+
+        return self._newest.get(pilot_id)
+
+    def update(self, now):
+        """
+        Publishes all fixes that are visible at `now` and removes fixes that
+        are older than `max_age`.
+        """
+
+        while self._heap and self._heap[0][0] <= now:
+            time_visible, pilot_id = heapq.heappop(self._heap)
+
+            pending = self._pending.get(pilot_id)
+            if not pending or pending[0].time_visible != time_visible:
+                continue
+
+            # only the newest visible fix of the pilot is published
+            fix = None
+            while pending and pending[0].time_visible <= now:
+                fix = pending.popleft()
+
+            self._publish(fix)
+
+            if pending:
+                heapq.heappush(self._heap, (pending[0].time_visible, pilot_id))
+            else:
+                del self._pending[pilot_id]
+
+        if self._last_expiry is None or self._last_expiry < now - timedelta(minutes=1):
+            self._expire(now - self.max_age)
+            self._last_expiry = now
+
+    def get(self, pilot_ids, now):
+        """Returns the visible fixes of the given pilots."""
+
+        self.update(now)
+
+        fixes = (self._visible.get(pilot_id) for pilot_id in pilot_ids)
+        return [fix for fix in fixes if fix is not None and self._alive(fix, now)]
+
+    def club(self, club_id, now):
+        """Returns the visible fixes of all pilots of the given club."""
+
+        self.update(now)
+
+        return self.get(list(self._clubs.get(club_id, ())), now)
+
+    def near(self, latitude, longitude, radius, now):
+        """
+        Returns the visible fixes within `radius` meters of the given
+        coordinates.
+        """
+
+        self.update(now)
+
+        dlat = radius / METERS_PER_DEGREE
+        dlon = dlat / max(math.cos(math.radians(latitude)), 0.01)
+
+        min_row, min_column = self._cell(latitude - dlat, longitude - dlon)
+        max_row, max_column = self._cell(latitude + dlat, longitude + dlon)
+
+        # the columns are wrapped around at the antimeridian
+        columns = int(round(360 / self.cell_size))
+        first_column = self._cell(0, -180)[1]
+
+        column_range = range(min_column, max_column + 1)
+        if len(column_range) >= columns:
+            column_range = range(first_column, first_column + columns)
+
+        location = Location(latitude=latitude, longitude=longitude)
+
+        fixes = []
+        for row in range(min_row, max_row + 1):
+            for column in column_range:
+                column = (column - first_column) % columns + first_column
+                for pilot_id in self._cells.get((row, column), ()):
+                    fix = self._visible[pilot_id]
+                    if not self._alive(fix, now):
+                        continue
+
+                    if geographic_distance(fix, location) <= radius:
+                        fixes.append(fix)
+
+        return fixes
+
+    def _cell(self, latitude, longitude):
+        return (
+            int(math.floor(latitude / self.cell_size)),
+            int(math.floor(longitude / self.cell_size)),
+        )
+
+    def _alive(self, fix, now):
+        return fix.time >= now - self.max_age
+
+    def _publish(self, fix):
+        current = self._visible.get(fix.pilot_id)
+        if current is not None:
+            if current.time > fix.time:
+                return
+
+            self._remove(current)
+
+        self._visible[fix.pilot_id] = fix
+        self._cells[self._cell(fix.latitude, fix.longitude)].add(fix.pilot_id)
+
+        if fix.club_id is not None:
+            self._clubs[fix.club_id].add(fix.pilot_id)
+
+    def _remove(self, fix):
+        del self._visible[fix.pilot_id]
+
+        _discard(self._cells, self._cell(fix.latitude, fix.longitude), fix.pilot_id)
+
+        if fix.club_id is not None:
+            _discard(self._clubs, fix.club_id, fix.pilot_id)
+
+    def _expire(self, limit):
+        for fix in list(self._visible.values()):
+            if fix.time < limit:
+                self._remove(fix)
+
+        for pilot_id, fix in list(self._newest.items()):
+            if fix.time < limit:
+                del self._newest[pilot_id]
+
+        # the heap entries of the removed pilots are skipped by `update()`
+        for pilot_id, pending in list(self._pending.items()):
+            if pending[-1].time < limit:
+                del self._pending[pilot_id]
+
+
+def _discard(index, key, pilot_id):
+    pilot_ids = index.get(key)
+    if pilot_ids is None:
+        return
+
+    pilot_ids.discard(pilot_id)
+    if not pilot_ids:
+        del index[key]
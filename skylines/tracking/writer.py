@@ -0,0 +1,216 @@
+from __future__ import absolute_import
+
+import time
+from collections import deque
+
+import gevent
+import sentry_sdk
+from gevent.event import Event
+from gevent.threadpool import ThreadPool
+
+from skylines.database import db
+from skylines.model import TrackingFix, LatestTrackingFix, Elevation
+from skylines.tracking.stats import Histogram
+
+COLUMNS = [
+    "time",
+    "time_visible",
+    "location",
+    "track",
+    "ground_speed",
+    "airspeed",
+    "altitude",
+    "elevation",
+    "vario",
+    "engine_noise_level",
+    "pilot_id",
+    "ip",
+]
+
+
+class FixWriter(object):
+    """
+    Write-behind queue for the fixes received by the tracking server.
+
+    Fixes are collected in a bounded buffer and inserted with a single
+    multi-row INSERT statement once `batch_size` fixes are queued or the
+    oldest queued fix is older than `interval` seconds. The database work
+    runs in a separate OS thread, so the gevent loop receiving the datagrams
+    is not blocked by Postgres.
+
+    If the buffer is full, `add()` waits up to `timeout` seconds for the
+    writer to catch up before the fix is dropped.
+    """
+
+    def __init__(self, app, batch_size=100, interval=0.5, max_size=10000, timeout=1):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_size = max_size
+        self.timeout = timeout
+
+        self.queue = deque()
+        self.queued_since = None
+
+        self._pending = Event()
+        self._space = Event()
+        self._space.set()
+
+        self._pool = None
+        self._greenlet = None
+        self._closing = False
+
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+
+        # milliseconds per written batch
+        self.write_time = Histogram()
+
+    def __len__(self):
+        return len(self.queue)
+
+    def add(self, fix):
+        """
+        Queues a fix (a dict with the keys in `COLUMNS`) for insertion.
+        The `location` of the fix is expected to be a `Location` instance.
+        Returns False if the fix had to be dropped.
+        """
+
+        if len(self.queue) >= self.max_size:
+            self._space.clear()
+            self._space.wait(self.timeout)
+
+            if len(self.queue) >= self.max_size:
+                self.dropped += 1
+                return False
+
+        if not self.queue:
+            self.queued_since = time.time()
+
+        self.queue.append(fix)
+
+        if len(self.queue) >= self.batch_size:
+            self._pending.set()
+
+        return True
+
+    def start(self):
+        if self._greenlet is not None:
+            return
+
+        self._pool = ThreadPool(1)
+        self._greenlet = gevent.spawn(self._run)
+
+    def close(self):
+        """Stops the background writer and writes all remaining fixes."""
+
+        if self._greenlet is not None:
+            # wait for the batch that is currently written by the thread
+            self._closing = True
+            self._pending.set()
+            self._greenlet.join()
+            self._greenlet = None
+            self._closing = False
+
+            self._pool.kill()
+            self._pool = None
+
+        with self.app.app_context():
+            self.flush()
+
+    def apply(self, func, *args):
+        """
+        Calls `func` in an app context in the thread of the writer, so that
+        other database queries don't block the gevent loop either. The
+        function is called directly if the writer is not started.
+        """
+
+        if self._pool is None:
+            return self._call_in_app_context(func, *args)
+
+        return self._pool.apply(self._call_in_app_context, (func,) + args)
+
+    def flush(self):
+        """Synchronously writes all queued fixes to the database."""
+
+        while self.queue:
+            self.write(self._take_batch())
+
+    def write(self, fixes):
+        if not fixes:
+            return
+
+        start = time.time()
+
+        # any error only fails the batch, so that the writer keeps running
+        try:
+            for fix in fixes:
+                location = fix["location"]
+                if location is not None:
+                    if fix["elevation"] is None:
+                        fix["elevation"] = Elevation.by_location(location)
+
+                    fix["location"] = location.to_wkt_element()
+
+            table = TrackingFix.__table__
+            result = db.session.execute(
+                table.insert()
+                .values(fixes)
+                .returning(
+                    table.c.id,
+                    table.c.pilot_id,
+                    table.c.time,
+                    table.c.time_visible,
+                    table.c.location,
+                )
+            )
+
+            LatestTrackingFix.update(
+                row for row in result.fetchall() if row.location is not None
+            )
+
+            db.session.commit()
+            self.written += len(fixes)
+
+        except Exception:
+            sentry_sdk.capture_exception()
+            db.session.rollback()
+            self.failed += len(fixes)
+
+        self.write_time.add((time.time() - start) * 1000)
+
+    def _take_batch(self):
+        batch = []
+        while self.queue and len(batch) < self.batch_size:
+            batch.append(self.queue.popleft())
+
+        self.queued_since = time.time() if self.queue else None
+        self._space.set()
+
+        return batch
+
+    def _call_in_app_context(self, func, *args):
+        with self.app.app_context():
+            return func(*args)
+
+    def _run(self):
+        while not self._closing:
+            if self.queued_since is None:
+                timeout = self.interval
+            else:
+                timeout = self.queued_since + self.interval - time.time()
+
+            self._pending.wait(max(timeout, 0))
+            self._pending.clear()
+
+            if self._closing or not self.queue:
+                continue
+
+            if (
+                len(self.queue) < self.batch_size
+                and time.time() < self.queued_since + self.interval
+            ):
+                continue
+
+            self.apply(self.write, self._take_batch())
@@ -1,11 +1,20 @@
 from __future__ import absolute_import
 from celery.utils.log import get_task_logger
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.sql.expression import and_, or_
 
 from skylines.database import db
-from skylines.lib.xcsoar_ import analysis
+from skylines.lib import upload
+from skylines.lib.xcsoar_ import analysis, encoded_path
 from skylines.worker.celery import celery
-from skylines.model import Flight, FlightPathChunks, FlightMeetings
+from skylines.model import (
+    User,
+    Flight,
+    FlightPathChunks,
+    FlightMeetings,
+    RankingAggregate,
+    StatisticsRollup,
+)
 
 logger = get_task_logger(__name__)
 
@@ -14,8 +23,20 @@ logger = get_task_logger(__name__)
 def analyse_flight(flight_id, full=2048, triangle=6144, sprint=512):
     logger.info("Analysing flight %d" % flight_id)
 
-    if analysis.analyse_flight(Flight.get(flight_id), full, triangle, sprint):
+    flight = Flight.get(flight_id)
+
+    # the takeoff date and the score of the flight may change
+    keys = RankingAggregate.keys(flight)
+    statistics_keys = StatisticsRollup.keys(flight)
+
+    if analysis.analyse_flight(flight, full, triangle, sprint):
+        db.session.flush()
+        RankingAggregate.update(keys + RankingAggregate.keys(flight))
+        StatisticsRollup.update(statistics_keys + StatisticsRollup.keys(flight))
         db.session.commit()
+
+        # encode the flight path for the flight map in advance
+        encoded_path.get_flight_path(flight)
     else:
         logger.warn("Analysis of flight %d failed." % flight_id)
 
@@ -56,3 +77,39 @@ def find_meetings(flight_id):
             )
 
     db.session.commit()
+
+
+@celery.task
+def process_upload(
+    name, filename, md5, prefix, owner_id, pilot_id, pilot_name, club_id
+):
+    """
+    Creates a flight from an uploaded file, which has already been stored by
+    the API. Returns the `UploadResult` as a dict.
+    """
+
+    logger.info("Processing uploaded file %s" % filename)
+
+    args = (
+        name,
+        filename,
+        md5,
+        prefix,
+        User.get(owner_id),
+        pilot_id,
+        pilot_name,
+        club_id,
+    )
+
+    try:
+        result = upload.process_file(*args)
+        db.session.commit()
+
+    except IntegrityError:
+        # the same file was processed by another task at the same time,
+        # the second attempt reports it as duplicate
+        db.session.rollback()
+        result = upload.process_file(*args)
+        db.session.commit()
+
+    return result.to_dict()
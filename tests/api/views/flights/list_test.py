@@ -0,0 +1,157 @@
+from datetime import date
+
+from skylines.lib.table_tools import cached_count
+from skylines.model import Flight
+from tests.data import add_fixtures, add_flight, flight_comments, users
+
+
+def add_flights(db_session, n):
+    john = users.john()
+
+    return [
+        add_flight(db_session, john, "%032x" % i, date_local=date(2011, 6, 1 + i))
+        for i in range(n)
+    ]
+
+
+def test_list_all(db_session, client):
+    flights_ = add_flights(db_session, 3)
+
+    res = client.get("/flights/all")
+    assert res.status_code == 200
+    assert res.json["count"] == 3
+    assert [f["id"] for f in res.json["flights"]] == [f.id for f in reversed(flights_)]
+    assert "nextCursor" not in res.json
+
+
+def test_num_comments(db_session, client):
+    flight, other = add_flights(db_session, 2)
+
+    comment = flight_comments.yeah(flight=flight)
+    add_fixtures(db_session, comment, flight_comments.emoji(flight=flight))
+
+    res = client.get("/flights/all")
+    assert [f["numComments"] for f in res.json["flights"]] == [0, 2]
+
+    db_session.delete(comment)
+    db_session.commit()
+
+    res = client.get("/flights/all")
+    assert [f["numComments"] for f in res.json["flights"]] == [0, 1]
+
+
+def test_cursor(app, db_session, client):
+    flights_ = add_flights(db_session, 5)
+    expected = [f.id for f in reversed(flights_)]
+
+    display_length = app.config.get("SKYLINES_LISTS_DISPLAY_LENGTH")
+    app.config["SKYLINES_LISTS_DISPLAY_LENGTH"] = 2
+    try:
+        ids = []
+
+        res = client.get("/flights/all")
+        while True:
+            assert res.status_code == 200
+            assert res.json["count"] == 5
+
+            ids.extend(f["id"] for f in res.json["flights"])
+            if "nextCursor" not in res.json:
+                break
+
+            res = client.get("/flights/all?cursor=%d" % res.json["nextCursor"])
+
+        # the cursor gives the same order as the pages
+        res = client.get("/flights/all?page=2")
+        assert [f["id"] for f in res.json["flights"]] == expected[2:4]
+
+    finally:
+        app.config["SKYLINES_LISTS_DISPLAY_LENGTH"] = display_length
+
+    assert ids == expected
+
+
+def test_cursor_full_page(app, db_session, client):
+    flights_ = add_flights(db_session, 4)
+
+    display_length = app.config.get("SKYLINES_LISTS_DISPLAY_LENGTH")
+    app.config["SKYLINES_LISTS_DISPLAY_LENGTH"] = 2
+    try:
+        res = client.get("/flights/all")
+        assert [f["id"] for f in res.json["flights"]] == [
+            flights_[3].id,
+            flights_[2].id,
+        ]
+
+        res = client.get("/flights/all?cursor=%d" % res.json["nextCursor"])
+        assert [f["id"] for f in res.json["flights"]] == [
+            flights_[1].id,
+            flights_[0].id,
+        ]
+
+        # the last page is full, but there is no next page
+        assert "nextCursor" not in res.json
+
+    finally:
+        app.config["SKYLINES_LISTS_DISPLAY_LENGTH"] = display_length
+
+
+def test_cursor_sorted_with_nulls(app, db_session, client):
+    flights_ = add_flights(db_session, 4)
+    flights_[1].olc_classic_distance = 100000
+    flights_[3].olc_classic_distance = 200000
+    db_session.commit()
+
+    res = client.get("/flights/all?column=distance&order=asc")
+    expected = [f["id"] for f in res.json["flights"]]
+    assert expected[:2] == [flights_[1].id, flights_[3].id]
+
+    display_length = app.config.get("SKYLINES_LISTS_DISPLAY_LENGTH")
+    app.config["SKYLINES_LISTS_DISPLAY_LENGTH"] = 1
+    try:
+        ids = []
+
+        res = client.get("/flights/all?column=distance&order=asc")
+        while "nextCursor" in res.json:
+            ids.extend(f["id"] for f in res.json["flights"])
+            res = client.get(
+                "/flights/all?column=distance&order=asc&cursor=%d"
+                % res.json["nextCursor"]
+            )
+
+        ids.extend(f["id"] for f in res.json["flights"])
+
+    finally:
+        app.config["SKYLINES_LISTS_DISPLAY_LENGTH"] = display_length
+
+    assert ids == expected
+
+
+def test_invalid_cursor(db_session, client):
+    add_flights(db_session, 1)
+
+    res = client.get("/flights/all?cursor=abc")
+    assert res.status_code == 400
+
+    res = client.get("/flights/all?cursor=123456")
+    assert res.status_code == 400
+
+
+def test_cached_count(app, db_session):
+    flights_ = add_flights(db_session, 3)
+
+    timeout = app.config.get("SKYLINES_LISTS_COUNT_CACHE_TIMEOUT")
+    app.config["SKYLINES_LISTS_COUNT_CACHE_TIMEOUT"] = 60
+    try:
+        query = Flight.query().filter(Flight.date_local >= date(2011, 6, 1))
+        assert cached_count(query) == 3
+
+        db_session.delete(flights_[0])
+        db_session.commit()
+        assert cached_count(query) == 3
+
+        # a different filter has its own count
+        query = Flight.query().filter(Flight.date_local >= date(2011, 6, 2))
+        assert cached_count(query) == 2
+
+    finally:
+        app.config["SKYLINES_LISTS_COUNT_CACHE_TIMEOUT"] = timeout
@@ -1,8 +1,11 @@
+import os
 from datetime import datetime
 
+from mock import patch
 from pytest_voluptuous import S
 from voluptuous.validators import Unordered
 
+from skylines.lib.xcsoar_ import encoded_path
 from skylines.model import FlightMeetings, Flight
 from tests.api import auth_for
 from tests.voluptuous import Approx
@@ -113,6 +116,50 @@ def test_basic_flight_json(db_session, client):
     )
 
 
+def test_flight_json_cache(db_session, client):
+    john = users.john()
+    db_session.add(john)
+    db_session.commit()
+
+    data = dict(files=(igcs.simple_path,))
+    res = client.post("/flights/upload", headers=auth_for(john), data=data)
+    assert res.status_code == 200
+    flight_id = res.json["results"][0]["flight"]["id"]
+
+    res = client.get("/flights/{id}/json".format(id=flight_id), headers=auth_for(john))
+    assert res.status_code == 200
+
+    # the second request is answered from the stored flight path
+    with patch.object(encoded_path, "encode_flight_path") as encode:
+        cached = client.get(
+            "/flights/{id}/json".format(id=flight_id), headers=auth_for(john)
+        )
+        assert not encode.called
+
+    assert cached.status_code == 200
+    assert cached.json == res.json
+
+    flight = Flight.get(flight_id)
+    path = encoded_path.cache_path(flight)
+    assert os.path.exists(path)
+
+    # a new analysis changes the stored path, the outdated one is removed
+    # when the new path is encoded
+    flight.time_modified = datetime(2020, 1, 1, 12, 0, 0)
+    db_session.commit()
+
+    res = client.get("/flights/{id}/json".format(id=flight_id), headers=auth_for(john))
+    assert res.status_code == 200
+
+    new_path = encoded_path.cache_path(flight)
+    assert new_path != path
+    assert os.path.exists(new_path)
+    assert not os.path.exists(path)
+
+    encoded_path.invalidate(flight)
+    assert not os.path.exists(new_path)
+
+
 def test_filled_flight(db_session, client):
     lva = clubs.lva()
     john = users.john(club=lva)
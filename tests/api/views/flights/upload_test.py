@@ -1,12 +1,19 @@
+import os
+
+from mock import Mock, patch
 from pytest_voluptuous import S
 from voluptuous.validators import ExactSequence, Datetime, Match, IsTrue
 from werkzeug.datastructures import MultiDict
 
 from skylines.lib.compat import text_type
+from skylines.worker import tasks
 
 from tests.api import auth_for
 from tests.data import users, igcs
 
+# the files are stored by their MD5 hash
+STORED_FILENAME = r"[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{32}\.igc$"
+
 
 def test_upload(db_session, client):
     john = users.john()
@@ -51,7 +58,7 @@ def test_upload(db_session, client):
                                 u"model": u"ASK13",
                                 u"registration": u"LY-KDR",
                                 u"competitionId": None,
-                                u"filename": Match(r"simple(_\d+)?.igc"),
+                                u"filename": Match(STORED_FILENAME),
                             },
                             u"landingAirport": None,
                             u"triangleDistance": 4003,
@@ -118,7 +125,7 @@ def test_upload_zips(db_session, client):
                                 u"model": u"Duo Discus (PAS)",
                                 u"registration": u"D-9041",
                                 u"competitionId": u"TH",
-                                u"filename": Match(r"2018-04-14-fla-6ng-01.*\.igc"),
+                                u"filename": Match(STORED_FILENAME),
                             },
                             u"landingAirport": None,
                             u"triangleDistance": 68997,
@@ -172,7 +179,7 @@ def test_upload_zips(db_session, client):
                                 u"model": None,
                                 u"registration": u"F-CAEN",
                                 u"competitionId": u"5L",
-                                u"filename": Match(r"792xaaa1.*\.igc"),
+                                u"filename": Match(STORED_FILENAME),
                             },
                             u"landingAirport": None,
                             u"triangleDistance": 3685,
@@ -249,7 +256,7 @@ def test_upload_multiple(db_session, client):
                                 u"model": u"ASK13",
                                 u"registration": u"LY-KDR",
                                 u"competitionId": None,
-                                u"filename": Match(r"simple.*\.igc"),
+                                u"filename": Match(STORED_FILENAME),
                             },
                             u"landingAirport": None,
                             u"triangleDistance": 4003,
@@ -295,7 +302,7 @@ def test_upload_multiple(db_session, client):
                                 u"model": u"Duo Discus (PAS)",
                                 u"registration": u"D-9041",
                                 u"competitionId": u"TH",
-                                u"filename": Match(r"2018-04-14-fla-6ng-01.*\.igc"),
+                                u"filename": Match(STORED_FILENAME),
                             },
                             u"landingAirport": None,
                             u"triangleDistance": 68997,
@@ -317,3 +324,128 @@ def test_upload_multiple(db_session, client):
             ),
         }
     )
+
+
+def test_upload_zips_in_parallel(db_session, client, app):
+    john = users.john()
+    db_session.add(john)
+    db_session.commit()
+
+    # the second ZIP file contains the same IGC files
+    data = dict(files=[(igcs.zip_path,), (igcs.zip_path,)])
+
+    app.config["SKYLINES_UPLOAD_PROCESSES"] = 2
+    try:
+        res = client.post("/flights/upload", headers=auth_for(john), data=data)
+    finally:
+        app.config["SKYLINES_UPLOAD_PROCESSES"] = None
+
+    assert res.status_code == 200
+
+    results = res.json["results"]
+    assert [result["status"] for result in results] == [0, 0, 1, 1]
+    assert results[2]["flight"]["id"] == results[0]["flight"]["id"]
+    assert results[3]["flight"]["id"] == results[1]["flight"]["id"]
+    assert results[0]["trace"]["igc_start_time"] == u"2018-04-14T10:12:31+00:00"
+
+
+def test_upload_compressed(db_session, client, app):
+    john = users.john()
+    db_session.add(john)
+    db_session.commit()
+
+    data = dict(files=(igcs.simple_path,))
+
+    app.config["SKYLINES_FILES_COMPRESSION"] = "gzip"
+    try:
+        res = client.post("/flights/upload", headers=auth_for(john), data=data)
+    finally:
+        app.config["SKYLINES_FILES_COMPRESSION"] = None
+
+    assert res.status_code == 200
+
+    result = res.json["results"][0]
+    assert result["status"] == 0
+    assert result["flight"]["registration"] == u"LY-KDR"
+
+    path = os.path.join(
+        app.config["SKYLINES_FILES_PATH"], result["flight"]["igcFile"]["filename"]
+    )
+    assert not os.path.exists(path)
+    assert os.path.exists(path + ".gz")
+
+
+def test_upload_async(db_session, client):
+    john = users.john()
+    db_session.add(john)
+    db_session.commit()
+
+    data = {"files": [(igcs.simple_path,), (igcs.simple_path,)], "async": "true"}
+
+    queued = []
+
+    def delay(*args):
+        queued.append(args)
+        return tasks.process_upload.AsyncResult("task-%d" % len(queued))
+
+    with patch.object(tasks.process_upload, "delay", side_effect=delay):
+        res = client.post("/flights/upload", headers=auth_for(john), data=data)
+
+    assert res.status_code == 200
+    assert res.json["job"]
+
+    results = res.json["results"]
+    assert all(result["name"].endswith(u"simple.igc") for result in results)
+    assert [result["status"] for result in results] == [6, 6]
+    assert len(queued) == 2
+
+    job_url = "/flights/upload/jobs/" + res.json["job"]
+
+    pending = Mock(ready=Mock(return_value=False))
+    with patch.object(tasks.process_upload, "AsyncResult", return_value=pending):
+        res = client.get(job_url, headers=auth_for(john))
+
+    assert res.status_code == 200
+    assert res.json["done"] is False
+
+    # run the queued tasks like the worker would
+    results = dict(
+        ("task-%d" % (i + 1), tasks.process_upload.apply(args))
+        for i, args in enumerate(queued)
+    )
+
+    with patch.object(
+        tasks.process_upload, "AsyncResult", side_effect=lambda id: results[id]
+    ):
+        res = client.get(job_url, headers=auth_for(john))
+
+    assert res.status_code == 200
+    assert res.json["done"] is True
+
+    first, second = res.json["results"]
+    assert first["status"] == 0
+    assert first["flight"]["registration"] == u"LY-KDR"
+    assert second["status"] == 1
+    assert second["flight"]["id"] == first["flight"]["id"]
+
+
+def test_upload_job_of_other_user(db_session, client):
+    john = users.john()
+    jane = users.jane()
+    db_session.add_all([john, jane])
+    db_session.commit()
+
+    data = {"files": (igcs.simple_path,), "async": "true"}
+
+    with patch.object(
+        tasks.process_upload,
+        "delay",
+        side_effect=lambda *args: tasks.process_upload.AsyncResult("task"),
+    ):
+        res = client.post("/flights/upload", headers=auth_for(john), data=data)
+
+    assert res.status_code == 200
+
+    job_url = "/flights/upload/jobs/" + res.json["job"]
+    assert client.get(job_url, headers=auth_for(jane)).status_code == 404
+    assert client.get(job_url + "x", headers=auth_for(john)).status_code == 404
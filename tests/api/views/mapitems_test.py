@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from geoalchemy2.shape import from_shape
+from shapely.geometry import Point
+
+from skylines.model import MountainWaveProject
+from skylines.model.geo import Location
+from tests.data import add_fixtures, airspace
+
+
+def test_empty(db_session, client):
+    res = client.get("/mapitems?lat=30&lon=25")
+    assert res.status_code == 200
+    assert res.json == {"airspaces": [], "waves": []}
+
+
+def test_invalid_location(db_session, client):
+    res = client.get("/mapitems?lat=foo&lon=25")
+    assert res.status_code == 400
+
+
+def test_mapitems(db_session, client):
+    wave = MountainWaveProject(
+        name=u"Test Wave",
+        main_wind_direction=u"270",
+        location=from_shape(Point(25.01, 30.01), srid=4326),
+    )
+    far_wave = MountainWaveProject(
+        name=u"Far Wave", location=from_shape(Point(25.1, 30.1), srid=4326)
+    )
+    add_fixtures(db_session, airspace.test_airspace(), wave, far_wave)
+
+    res = client.get("/mapitems?lat=30&lon=25")
+    assert res.status_code == 200
+    assert res.json == {
+        "airspaces": [
+            {
+                "name": "TestAirspace",
+                "class": "WAVE",
+                "top": "FL100",
+                "base": "4500ft",
+                "countryCode": "de",
+            }
+        ],
+        "waves": [{"name": "Test Wave", "main_wind_direction": u"270°"}],
+    }
+
+    res = client.get("/mapitems?lat=5&lon=5")
+    assert res.status_code == 200
+    assert res.json == {"airspaces": [], "waves": []}
+
+
+def test_wave_radius(db_session, client):
+    # 4998 m and 5009 m away on the spheroid, but more than 5 km on a sphere
+    near_wave = MountainWaveProject(
+        name=u"Near Wave", location=from_shape(Point(25, 0.0452), srid=4326)
+    )
+    far_wave = MountainWaveProject(
+        name=u"Far Wave", location=from_shape(Point(25, 0.0453), srid=4326)
+    )
+    add_fixtures(db_session, near_wave, far_wave)
+
+    res = client.get("/mapitems?lat=0&lon=25")
+    assert [w["name"] for w in res.json["waves"]] == ["Near Wave"]
+
+    # the same waves as in the database
+    location = Location(latitude=0, longitude=25)
+    assert [w.name for w in MountainWaveProject.by_location(location)] == ["Near Wave"]
+
+
+def test_import(db_session, client):
+    res = client.get("/mapitems?lat=30&lon=25")
+    assert res.json["airspaces"] == []
+
+    # the index is reloaded after new airspace has been imported
+    add_fixtures(db_session, airspace.test_airspace())
+
+    res = client.get("/mapitems?lat=30&lon=25")
+    assert [a["name"] for a in res.json["airspaces"]] == ["TestAirspace"]
@@ -0,0 +1,53 @@
+from skylines.model import RankingAggregate
+from tests.api import auth_for
+from tests.data import add_fixtures, flights, igcs, users
+
+
+def test_pilots(db_session, client):
+    john = users.john()
+    jane = users.jane()
+
+    add_fixtures(
+        db_session,
+        flights.one(igc_file=igcs.simple(owner=john, md5="a" * 32), olc_plus_score=100),
+        flights.one(igc_file=igcs.simple(owner=john, md5="b" * 32), olc_plus_score=50),
+        flights.one(igc_file=igcs.simple(owner=jane, md5="c" * 32), olc_plus_score=200),
+    )
+
+    RankingAggregate.rebuild()
+    db_session.commit()
+
+    res = client.get("/ranking/pilots?year=2011")
+    assert res.status_code == 200
+    assert res.json["total"] == 2
+    assert [
+        (row["user"]["id"], row["rank"], row["flights"], row["points"])
+        for row in res.json["ranking"]
+    ] == [(jane.id, 1, 1, 200), (john.id, 2, 2, 150)]
+
+    res = client.get("/ranking/pilots?year=2012")
+    assert res.status_code == 200
+    assert res.json["total"] == 0
+    assert res.json["ranking"] == []
+
+
+def test_flight_changes(db_session, client):
+    john = users.john()
+    flight = flights.one(igc_file=igcs.simple(owner=john), olc_plus_score=100)
+    add_fixtures(db_session, flight)
+
+    res = client.post(
+        "/flights/{id}".format(id=flight.id),
+        headers=auth_for(john),
+        json={"pilotId": john.id},
+    )
+    assert res.status_code == 200
+
+    res = client.get("/ranking/pilots?year=2011")
+    assert [row["user"]["id"] for row in res.json["ranking"]] == [john.id]
+
+    res = client.delete("/flights/{id}".format(id=flight.id), headers=auth_for(john))
+    assert res.status_code == 200
+
+    res = client.get("/ranking/pilots?year=2011")
+    assert res.json["ranking"] == []
@@ -0,0 +1,48 @@
+from skylines.model import StatisticsRollup
+from tests.data import add_flight, clubs, users
+
+
+def test_statistics(db_session, client):
+    lva = clubs.lva()
+    john = users.john(club=lva)
+    jane = users.jane()
+
+    add_flight(db_session, john, "a" * 32, club=lva, olc_classic_distance=100000)
+    add_flight(db_session, jane, "b" * 32, olc_classic_distance=50000)
+
+    StatisticsRollup.rebuild()
+    db_session.commit()
+
+    res = client.get("/statistics")
+    assert res.status_code == 200
+    assert res.json == {
+        u"name": None,
+        u"sumPilots": 2,
+        u"years": [
+            {
+                u"year": 2011,
+                u"flights": 2,
+                u"pilots": 2,
+                u"distance": 150000,
+                u"duration": 514,
+                u"average_distance": 75000,
+                u"average_duration": 257.0,
+            }
+        ],
+    }
+
+    res = client.get("/statistics/club/{id}".format(id=lva.id))
+    assert res.status_code == 200
+    assert res.json["name"] == u"LV Aachen"
+    assert res.json["sumPilots"] == 1
+    assert [(y["year"], y["flights"], y["distance"]) for y in res.json["years"]] == [
+        (2011, 1, 100000)
+    ]
+
+    res = client.get("/statistics/pilot/{id}".format(id=jane.id))
+    assert res.status_code == 200
+    assert res.json["sumPilots"] == 0
+    assert [y["pilots"] for y in res.json["years"]] == [1]
+
+    res = client.get("/statistics/foo/1")
+    assert res.status_code == 404
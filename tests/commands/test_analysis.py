@@ -0,0 +1,117 @@
+from mock import patch
+
+from skylines.commands.flights import analysis
+from skylines.database import db
+from skylines.model import Flight, RankingAggregate, StatisticsRollup
+from tests.data import add_flight, clubs, users
+
+
+def add_flights(db_session, n):
+    john = users.john()
+    return [add_flight(db_session, john, "%032x" % i) for i in range(n)]
+
+
+def fake_analyse_flight(flight):
+    flight.olc_classic_distance = 1000
+    flight.olc_plus_score = 10
+    flight.needs_analysis = False
+    return True
+
+
+def test_keyset_batches(db_session):
+    flights = add_flights(db_session, 5)
+
+    q = db.session.query(Flight.id).filter(Flight.needs_analysis == True)
+
+    batches = []
+    for ids in analysis.keyset_batches(q, 2):
+        batches.append(ids)
+
+        # analysed flights leave the result set without skipping others
+        Flight.query().filter(Flight.id.in_(ids)).update(
+            dict(needs_analysis=False), synchronize_session=False
+        )
+
+    assert batches == [
+        [flights[0].id, flights[1].id],
+        [flights[2].id, flights[3].id],
+        [flights[4].id],
+    ]
+
+
+def test_failing_flight(db_session):
+    flights = add_flights(db_session, 3)
+    ids = [flight.id for flight in flights]
+
+    def analyse_flight(flight):
+        fake_analyse_flight(flight)
+        if flight.id == ids[1]:
+            raise RuntimeError("broken flight")
+
+        return True
+
+    with patch.object(analysis, "analyse_flight", side_effect=analyse_flight):
+        assert analysis.analyse_batch(ids) == (ids[2], 2, 1)
+
+    db_session.expire_all()
+
+    # the other flights of the batch are committed
+    assert [flight.olc_classic_distance for flight in flights] == [1000, None, 1000]
+    assert [flight.needs_analysis for flight in flights] == [False, True, False]
+    assert RankingAggregate.check() == []
+
+
+def test_resume(db_session, tmpdir):
+    flights = add_flights(db_session, 4)
+
+    resume = tmpdir.join("resume")
+    resume.write("%d\n" % flights[1].id)
+
+    analysed = []
+
+    def analyse_flight(flight):
+        analysed.append(flight.id)
+        return fake_analyse_flight(flight)
+
+    with patch.object(analysis, "analyse_flight", side_effect=analyse_flight):
+        analysis.Analyze().run(force=True, jobs=1, batch_size=1, resume=str(resume))
+
+    # the flights up to the id in the file are skipped
+    assert analysed == [flights[2].id, flights[3].id]
+    assert resume.read() == "%d\n" % flights[3].id
+
+    # a finished run has nothing left to do
+    del analysed[:]
+    with patch.object(analysis, "analyse_flight", side_effect=analyse_flight):
+        analysis.Analyze().run(force=True, jobs=1, batch_size=1, resume=str(resume))
+
+    assert analysed == []
+
+
+def test_jobs(db_session, tmpdir):
+    lva = clubs.lva()
+    john = users.john(club=lva)
+    jane = users.jane(club=lva)
+
+    # the flights of both pilots share the club rows
+    flights = [
+        add_flight(db_session, [john, jane][i % 2], "%032x" % i, club=lva)
+        for i in range(6)
+    ]
+
+    resume = tmpdir.join("resume")
+
+    # the forked workers analyse the flights with the patched function
+    with patch.object(analysis, "analyse_flight", side_effect=fake_analyse_flight):
+        analysis.Analyze().run(force=True, jobs=2, batch_size=2, resume=str(resume))
+
+    db_session.expire_all()
+
+    assert [flight.olc_classic_distance for flight in flights] == [1000] * 6
+    assert resume.read() == "%d\n" % flights[-1].id
+
+    assert RankingAggregate.check() == []
+    assert RankingAggregate.get((RankingAggregate.Kind.CLUB, 2011, lva.id)).count == 6
+
+    rollup = StatisticsRollup.get((StatisticsRollup.Kind.GLOBAL, 0, 2011))
+    assert (rollup.flights, rollup.pilots, rollup.distance) == (6, 2, 6000)
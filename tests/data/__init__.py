@@ -1,3 +1,17 @@
+from . import flights, igcs
+
+
 def add_fixtures(db_session, *fixtures):
     db_session.add_all(fixtures)
     db_session.commit()
+
+
+def add_flight(db_session, owner, md5, **kwargs):
+    """
+    Adds a flight of the owner to the database. The md5 has to be unique for
+    every IGC file.
+    """
+
+    flight = flights.one(igc_file=igcs.simple(owner=owner, md5=md5), **kwargs)
+    add_fixtures(db_session, flight)
+    return flight
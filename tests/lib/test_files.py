@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
 
+import hashlib
+import os
+from io import BytesIO
+
 import pytest
 
 from skylines.lib import files
 from skylines.lib.types import is_unicode
+from tests.data import igcs
 
 
 @pytest.mark.parametrize(
@@ -20,3 +25,61 @@ def test_sanitise_filename(input, expected):
 
     assert is_unicode(output)
     assert output == expected
+
+
+@pytest.mark.usefixtures("files_folder")
+def test_add_file(app):
+    with open(igcs.simple_path, "rb") as f:
+        content = f.read()
+
+    with app.app_context():
+        filename, md5 = files.add_file(u"Simple.IGC", BytesIO(content))
+
+        assert md5 == hashlib.md5(content).hexdigest()
+        assert filename == u"%s/%s/%s.igc" % (md5[:2], md5[2:4], md5)
+
+        with files.open_file(filename) as f:
+            assert f.read() == content
+
+        with files.local_path(filename) as path:
+            assert path == files.filename_to_path(filename)
+
+        # the same content is stored only once
+        assert files.add_file(u"other.igc", BytesIO(content)) == (filename, md5)
+        assert os.listdir(app.config["SKYLINES_FILES_PATH"]) == [md5[:2]]
+
+        files.delete_file(filename)
+        assert not os.path.exists(files.filename_to_path(filename))
+
+
+@pytest.mark.usefixtures("files_folder")
+def test_add_compressed_file(app):
+    with open(igcs.simple_path, "rb") as f:
+        content = f.read()
+
+    with app.app_context():
+        app.config["SKYLINES_FILES_COMPRESSION"] = "gzip"
+        try:
+            filename, md5 = files.add_file(u"simple.igc", BytesIO(content))
+        finally:
+            app.config["SKYLINES_FILES_COMPRESSION"] = None
+
+        path = files.filename_to_path(filename)
+        assert not os.path.exists(path)
+        assert os.path.getsize(path + ".gz") < len(content)
+
+        with files.open_file(filename) as f:
+            assert f.read() == content
+
+        with files.local_path(filename) as tmp_path:
+            with open(tmp_path, "rb") as f:
+                assert f.read() == content
+
+        assert not os.path.exists(tmp_path)
+
+        # uncompressed copies of the file are not stored
+        assert files.add_file(u"simple.igc", BytesIO(content)) == (filename, md5)
+        assert not os.path.exists(path)
+
+        files.delete_file(filename)
+        assert not os.path.exists(path + ".gz")
@@ -2,7 +2,7 @@
 
 import pytest
 
-from skylines.lib.geo import geographic_distance
+from skylines.lib.geo import geographic_distance, spheroid_distance
 from skylines.model.geo import Location
 
 
@@ -24,3 +24,26 @@ from skylines.model.geo import Location
 def test_geographic_distance(loc1, loc2, expected):
     result = geographic_distance(loc1, loc2)
     assert result == pytest.approx(expected)
+
+
+@pytest.mark.parametrize(
+    "lat1,lon1,lat2,lon2,expected",
+    [
+        (0.0, 0.0, 0.0, 0.0, 0.0),
+        # Flinders Peak to Buninyong, the example of Vincenty's paper
+        (
+            -37.95103341666667,
+            144.42486788888889,
+            -37.65282113888889,
+            143.92649552777777,
+            54972.271,
+        ),
+        (0.0, 0.0, 0.0, 1.0, 111319.491),
+        # meridian arc, integrated numerically
+        (50.0, 6.0, 51.0, 6.0, 111238.681),
+    ],
+)
+def test_spheroid_distance(lat1, lon1, lat2, lon2, expected):
+    assert spheroid_distance(lat1, lon1, lat2, lon2) == pytest.approx(
+        expected, abs=0.001
+    )
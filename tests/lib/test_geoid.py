@@ -2,7 +2,13 @@
 
 import pytest
 
-from skylines.lib.geoid import egm96_height, load_geoid
+from skylines.lib.geoid import (
+    GRID_PATH,
+    compile_geoid,
+    egm96_height,
+    egm96_heights,
+    load_geoid,
+)
 from skylines.model.geo import Location
 
 
@@ -31,3 +37,29 @@ def test_geoid():
     assert egm96_height(Location(-0.4667440, 0.0023000)) == pytest.approx(
         17.330, abs=0.25
     )
+
+
+def test_negative_longitude():
+    assert egm96_height(Location(47.5, -10.25)) == pytest.approx(
+        egm96_height(Location(47.5, 349.75))
+    )
+
+
+def test_geoid_heights():
+    latitudes = [38.6281550, -14.6212170, 46.8743190]
+    longitudes = [269.7791550, 305.0211140, 102.4487290]
+
+    assert egm96_heights(latitudes, longitudes) == [
+        egm96_height(Location(latitude, longitude))
+        for latitude, longitude in zip(latitudes, longitudes)
+    ]
+
+    assert egm96_heights([], []) == []
+
+
+def test_compiled_grid(tmpdir):
+    path = str(tmpdir.join("geoid.bin"))
+    compile_geoid(path=path)
+
+    with open(path, "rb") as f1, open(GRID_PATH, "rb") as f2:
+        assert f1.read() == f2.read()
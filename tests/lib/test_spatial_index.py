@@ -0,0 +1,52 @@
+from mock import patch
+from shapely.geometry import Point, box
+
+from skylines.lib import spatial_index
+
+
+class ExampleIndex(spatial_index.STRtreeIndex):
+    def __init__(self, rows):
+        super(ExampleIndex, self).__init__()
+        self.rows = rows
+        self.loaded = 0
+
+    def load(self):
+        self.loaded += 1
+        return self.rows
+
+
+def test_query(app):
+    index = ExampleIndex([(box(0, 0, 1, 1), "a"), (box(2, 2, 3, 3), "b")])
+
+    with app.app_context(), patch.object(
+        spatial_index, "table_version", return_value="1"
+    ):
+        assert [item for geom, item in index.query(Point(0.5, 0.5))] == ["a"]
+        assert [item for geom, item in index.query(Point(1.5, 1.5))] == []
+        assert sorted(item for geom, item in index.query(box(0, 0, 3, 3))) == [
+            "a",
+            "b",
+        ]
+
+    assert index.loaded == 1
+
+
+def test_reload(app):
+    index = ExampleIndex([(box(0, 0, 1, 1), "a")])
+
+    with app.app_context(), patch.object(
+        spatial_index, "table_version", return_value="1"
+    ):
+        index.query(Point(0.5, 0.5))
+        index.query(Point(0.5, 0.5))
+
+    assert index.loaded == 1
+
+    index.rows = [(box(0, 0, 1, 1), "c")]
+
+    with app.app_context(), patch.object(
+        spatial_index, "table_version", return_value="2"
+    ):
+        assert [item for geom, item in index.query(Point(0.5, 0.5))] == ["c"]
+
+    assert index.loaded == 2
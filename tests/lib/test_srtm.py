@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+
+import struct
+
+import pytest
+
+from skylines.lib.srtm import ElevationSampler, tile_name, VOID
+
+
+def write_tile(path, rows):
+    with open(path, "wb") as f:
+        for row in rows:
+            f.write(struct.pack(">%dh" % len(row), *row))
+
+
+@pytest.fixture
+def sampler(tmpdir):
+    # 3x3 samples, i.e. a resolution of half a degree, north-west corner first
+    write_tile(
+        str(tmpdir.join("N47E011.hgt")),
+        [[1000, 1010, 1020], [1100, 1110, 1120], [1200, 1210, VOID]],
+    )
+
+    return ElevationSampler(str(tmpdir), max_tiles=1)
+
+
+@pytest.mark.parametrize(
+    "latitude,longitude,expected",
+    [
+        (47.9, 11.1, "N47E011.hgt"),
+        (47.0, 11.0, "N47E011.hgt"),
+        (-33.5, -70.2, "S34W071.hgt"),
+        (0.5, 179.5, "N00E179.hgt"),
+    ],
+)
+def test_tile_name(latitude, longitude, expected):
+    assert tile_name(latitude, longitude) == expected
+
+
+def test_get(sampler):
+    assert sampler.get(47.0, 11.0) == pytest.approx(1200)
+    assert sampler.get(47.5, 11.0) == pytest.approx(1100)
+    assert sampler.get(47.999, 11.999) == pytest.approx(1020, abs=0.5)
+    assert sampler.get(47.5, 11.5) == pytest.approx(1110)
+    assert sampler.get(47.75, 11.25) == pytest.approx(1055)
+    assert sampler.get(47.875, 11.75) == pytest.approx(1040)
+
+
+def test_get_void(sampler):
+    assert sampler.get(47.25, 11.75) is None
+    assert sampler.get(47.25, 11.25) == pytest.approx(1155)
+
+
+def test_get_missing_tile(sampler):
+    assert sampler.get(10.5, 10.5) is None
+
+
+def test_get_many(sampler):
+    elevations = sampler.get_many(
+        [(47.75, 11.25), (10.5, 10.5), (47.5, 11.5), (47.25, 11.75)]
+    )
+
+    assert elevations[0] == pytest.approx(1055)
+    assert elevations[1] is None
+    assert elevations[2] == pytest.approx(1110)
+    assert elevations[3] is None
+
+    assert len(sampler._tiles) == 1
+
+
+def test_has_tiles(sampler):
+    assert sampler.has_tiles([(47.75, 11.25), (47.5, 11.5)])
+    assert not sampler.has_tiles([(47.75, 11.25), (10.5, 10.5)])
+    assert sampler.has_tiles([])
+
+
+def test_evicted_tile(sampler):
+    tile = sampler.get_tile(47.5, 11.5)
+
+    # the tile is evicted from the cache, but still readable by its users
+    assert sampler.get_tile(10.5, 10.5) is None
+    assert list(sampler._tiles) == [(10, 10)]
+    assert tile.get(47.5, 11.5) == pytest.approx(1110)
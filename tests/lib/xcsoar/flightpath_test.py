@@ -1,6 +1,15 @@
+import pickle
+import random
 from datetime import datetime
 
-from skylines.lib.xcsoar_ import FlightPathFix
+from mock import patch
+
+from skylines.lib.geo import haversine_distance
+from skylines.lib.xcsoar_ import FlightPath, FlightPathFix, flight_path
+from skylines.lib.xcsoar_ import flightpath
+from skylines.lib.xcsoar_.flightpath import cumulative_distance
+from skylines.model import Location
+from tests.data import igcs
 
 from pytest import approx
 
@@ -62,3 +71,112 @@ def test_kwargs():
     assert fix.ias == None
     assert fix.siu == 8
     assert fix.elevation == None
+
+
+def test_flight_path_coordinates():
+    fp = FlightPath(
+        [
+            FlightPathFix(location=dict(latitude=50.8, longitude=6.2)),
+            FlightPathFix(location=dict(latitude=50.9, longitude=6.3)),
+        ]
+    )
+
+    assert fp.coordinates == [(6.2, 50.8), (6.3, 50.9)]
+
+    copy = pickle.loads(pickle.dumps(fp))
+    assert isinstance(copy, FlightPath)
+    assert copy == fp
+    assert copy.coordinates == fp.coordinates
+
+
+def test_flight_path_reduce():
+    fp = flight_path(igcs.hornet_path, max_points=None)
+    datetimes = set(fp.datetimes)
+
+    # XCSoar may pick slightly different fixes than for the IGC file, since
+    # the coordinates are converted again
+    for max_points in (1000, 3000):
+        reduced = fp.reduce(max_points)
+
+        assert 0 < len(reduced) <= max_points
+        assert all(fix.datetime in datetimes for fix in reduced)
+        assert reduced[0].datetime == fp[0].datetime
+        assert reduced[-1].datetime == fp[-1].datetime
+
+    assert len(fp.reduce(1000)) == len(flight_path(igcs.hornet_path))
+    assert fp.reduce(1000) is fp.reduce(1000)
+
+
+def test_flight_path_computed_once():
+    fixes = [
+        FlightPathFix(
+            datetime=datetime(2016, 5, 4, 8, 0, i),
+            location=dict(latitude=50 + i * 0.01, longitude=7 + i * 0.01),
+        )
+        for i in range(10)
+    ]
+
+    fp = FlightPath(fixes)
+
+    with patch.object(
+        flightpath, "haversine_distance", wraps=haversine_distance
+    ) as distance:
+        assert fp.distances is fp.distances
+        assert cumulative_distance(fp, 0, 9) == approx(sum(fp.distances))
+
+    assert distance.call_count == 9
+    assert fp.coordinates is fp.coordinates
+    assert fp.datetimes is fp.datetimes
+
+    # every reduced path is only calculated once by XCSoar
+    with patch.object(flightpath, "Flight") as flight:
+        flight.return_value.path.return_value = [tuple(fixes[0]), tuple(fixes[9])]
+
+        assert fp.reduce(2) is fp.reduce(2)
+        assert fp.reduce(2) == [fixes[0], fixes[9]]
+
+    assert flight.call_count == 1
+    flight.return_value.reduce.assert_called_once_with(threshold=0, max_points=2)
+
+
+def legacy_cumulative_distance(fixes, start_fix, end_fix):
+    distance = 0
+    last_location = None
+
+    for fix in fixes[start_fix : end_fix + 1]:
+        location = Location(
+            longitude=fix.location["longitude"], latitude=fix.location["latitude"]
+        )
+
+        if last_location:
+            distance += location.geographic_distance(last_location)
+
+        last_location = location
+
+    return distance
+
+
+def test_cumulative_distance():
+    rnd = random.Random(1)
+
+    fixes = [
+        FlightPathFix(
+            datetime=datetime(2016, 5, 4, 8, 0, i % 60),
+            location=dict(
+                latitude=50 + rnd.uniform(-1, 1), longitude=7 + rnd.uniform(-1, 1)
+            ),
+        )
+        for i in range(200)
+    ]
+
+    fp = FlightPath(fixes)
+
+    for start_fix, end_fix in [(0, 199), (0, 1), (17, 123), (150, 199)]:
+        expected = legacy_cumulative_distance(fixes, start_fix, end_fix)
+
+        assert cumulative_distance(fp, start_fix, end_fix) == expected
+        assert cumulative_distance(fixes, start_fix, end_fix) == expected
+
+    assert cumulative_distance(fp, 5, 5) == 0
+    assert cumulative_distance(fp, 6, 5) == 0
+    assert fp.datetimes == [fix.datetime for fix in fixes]
@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+import random
+from datetime import datetime
+
+from geoalchemy2.shape import from_shape
+from pytest import approx
+from shapely.geometry import Point
+
+from skylines.lib.geo import geographic_distance, spheroid_distance
+from skylines.model import Airport, Location
+from skylines.model.airport import KDTree, airport_index, to_vector
+from tests.data import add_fixtures, airports
+
+
+def test_kdtree_nearest():
+    rnd = random.Random(1)
+    locations = [
+        Location(latitude=rnd.uniform(-90, 90), longitude=rnd.uniform(-180, 180))
+        for i in range(500)
+    ]
+
+    tree = KDTree(
+        (to_vector(location.latitude, location.longitude), i)
+        for i, location in enumerate(locations)
+    )
+
+    for i in range(50):
+        location = Location(
+            latitude=rnd.uniform(-90, 90), longitude=rnd.uniform(-180, 180)
+        )
+
+        expected = min(
+            range(len(locations)),
+            key=lambda j: geographic_distance(location, locations[j]),
+        )
+
+        point, chord = tree.nearest(to_vector(location.latitude, location.longitude))
+        assert point[1] == expected
+
+
+def test_kdtree_filter():
+    tree = KDTree(
+        [(to_vector(0, 0), "a"), (to_vector(0, 1), "b"), (to_vector(0, 2), "c")]
+    )
+
+    assert tree.nearest(to_vector(0, 0.1))[0][1] == "a"
+    assert tree.nearest(to_vector(0, 0.1), accept=lambda x: x != "a")[0][1] == "b"
+    assert tree.nearest(to_vector(0, 0.1), max_chord=1e-5) == (None, None)
+    assert KDTree([]).nearest(to_vector(0, 0)) == (None, None)
+
+
+def test_kdtree_within():
+    rnd = random.Random(2)
+    locations = [
+        Location(latitude=rnd.uniform(40, 60), longitude=rnd.uniform(0, 20))
+        for i in range(500)
+    ]
+
+    tree = KDTree(
+        (to_vector(location.latitude, location.longitude), i)
+        for i, location in enumerate(locations)
+    )
+
+    location = Location(latitude=50, longitude=10)
+    vector = to_vector(location.latitude, location.longitude)
+
+    for chord in (0.001, 0.01, 0.1):
+        expected = [
+            i
+            for i, other in enumerate(locations)
+            if sum((a - b) ** 2 for a, b in zip(vector, tree_vector(other)))
+            <= chord ** 2
+        ]
+
+        assert sorted(point[1] for point in tree.within(vector, chord)) == expected
+
+    assert tree.within(vector, 0.1, accept=lambda i: False) == []
+
+
+def tree_vector(location):
+    return to_vector(location.latitude, location.longitude)
+
+
+def test_nearest(db_session):
+    merzbrueck = airports.merzbrueck()
+    old = airports.merzbrueck(
+        name=u"Old Merzbrück",
+        location_wkt=from_shape(Point(6.187, 50.823), srid=4326),
+        valid_until=datetime(2015, 1, 1),
+    )
+    add_fixtures(db_session, merzbrueck, old)
+
+    location = Location(latitude=50.823, longitude=6.187)
+
+    airport, distance = airport_index.nearest(location)
+    assert airport.id == merzbrueck.id
+    assert airport.name == u"Aachen Merzbruck"
+    assert distance == approx(
+        spheroid_distance(
+            location.latitude,
+            location.longitude,
+            merzbrueck.location.latitude,
+            merzbrueck.location.longitude,
+        )
+    )
+    assert distance == approx(merzbrueck.distance(location), abs=0.01)
+
+    airport, distance = airport_index.nearest(location, date=datetime(2014, 1, 1))
+    assert airport.id == old.id
+    assert distance == approx(0, abs=0.01)
+
+    assert airport_index.nearest(location, distance_threshold=0.0001) == (None, None)
+
+    results = airport_index.nearest_many(
+        [location, None, Location(latitude=-50, longitude=-100)],
+        distance_threshold=0.025,
+    )
+    assert [result[0] and result[0].id for result in results] == [
+        merzbrueck.id,
+        None,
+        None,
+    ]
+
+
+def test_nearest_in_degrees(db_session):
+    # "east" is nearer on the sphere, but "north" is nearer in degrees
+    east = airports.merzbrueck(
+        name=u"East", location_wkt=from_shape(Point(10.02, 60.0), srid=4326)
+    )
+    north = airports.merzbrueck(
+        name=u"North", location_wkt=from_shape(Point(10.0, 60.015), srid=4326)
+    )
+    add_fixtures(db_session, east, north)
+
+    location = Location(latitude=60.0, longitude=10.0)
+    assert geographic_distance(location, east.location) < geographic_distance(
+        location, north.location
+    )
+
+    airport, distance = airport_index.nearest(location, distance_threshold=0.025)
+    assert airport.id == north.id == Airport.by_location(location).id
+    assert distance == approx(north.distance(location), abs=0.01)
+
+    assert airport_index.nearest(location, distance_threshold=0.01) == (None, None)
+    assert Airport.by_location(location, distance_threshold=0.01) is None
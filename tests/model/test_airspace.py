@@ -0,0 +1,53 @@
+from geoalchemy2.shape import from_shape
+from mock import patch
+from shapely.geometry import LineString, box
+
+from skylines.model import airspace
+from skylines.lib.xcsoar_ import flight_path
+from tests.data import igcs
+from tests.data import airspace as airspace_data
+
+
+def test_tiles_in_bounds():
+    assert airspace.tiles_in_bounds((7.1, 51.2, 11.3, 52.0)) == [(1, 10), (2, 10)]
+    assert airspace.tiles_in_bounds((-0.5, -0.5, 0.5, 0.5)) == [
+        (-1, -1),
+        (-1, 0),
+        (0, -1),
+        (0, 0),
+    ]
+
+
+def test_tile_bounds():
+    assert airspace.tile_bounds((1, 10)) == (5, 50, 10, 55)
+    assert airspace.tile_bounds((-1, -1)) == (-5, -5, 0, 0)
+
+
+def test_airspace_infringements(db_session):
+    fp = flight_path(igcs.simple_path, max_points=None)
+
+    bounds = LineString(fp.coordinates).bounds
+    ctr = airspace_data.test_airspace(
+        airspace_class="CTR",
+        base="GND",
+        top="FL 100",
+        the_geom=from_shape(box(*bounds).buffer(0.1), srid=4326),
+    )
+    db_session.add(ctr)
+    db_session.commit()
+
+    with patch.object(
+        airspace, "get_airspace_polygons", wraps=airspace.get_airspace_polygons,
+    ) as get_airspace_polygons:
+        assert list(airspace.get_airspace_infringements(fp).keys()) == [ctr.id]
+        calls = get_airspace_polygons.call_count
+        assert calls > 0
+
+        # the index is reused until the airspace is modified
+        assert list(airspace.get_airspace_infringements(fp).keys()) == [ctr.id]
+        assert get_airspace_polygons.call_count == calls
+
+    db_session.delete(ctr)
+    db_session.commit()
+
+    assert airspace.get_airspace_infringements(fp) == {}
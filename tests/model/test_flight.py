@@ -0,0 +1,55 @@
+from pytest import approx
+
+from skylines.model import Flight
+from skylines.model.flight import calculate_index_score
+
+from tests.data import add_fixtures, aircraft_models, flights, igcs, users
+
+
+def test_calculate_index_score():
+    assert calculate_index_score(None, 100) is None
+    assert calculate_index_score(800, None) == 800
+    assert calculate_index_score(800, 0) == 800
+    assert calculate_index_score(800, 125) == approx(640)
+
+
+def test_index_score(db_session):
+    flight = flights.filled(
+        igc_file=igcs.filled(owner=users.john()), model=aircraft_models.nimeta()
+    )
+    add_fixtures(db_session, flight)
+
+    assert flight.index_score == approx(799 * 100.0 / 112)
+
+    flight.olc_plus_score = 560
+    db_session.commit()
+    assert flight.index_score == approx(500)
+
+    hornet = aircraft_models.hornet()
+    add_fixtures(db_session, hornet)
+
+    flight.model_id = hornet.id
+    db_session.commit()
+    assert flight.index_score == approx(560)
+
+    flight.model = None
+    db_session.commit()
+    assert flight.index_score == approx(560)
+
+    flight.olc_plus_score = None
+    db_session.commit()
+    assert flight.index_score is None
+
+
+def test_update_index_scores(db_session):
+    model = aircraft_models.nimeta()
+    flight = flights.filled(igc_file=igcs.filled(owner=users.john()), model=model)
+    add_fixtures(db_session, flight)
+
+    model.dmst_index = 100
+    db_session.commit()
+    assert flight.index_score == approx(799 * 100.0 / 112)
+
+    assert Flight.update_index_scores(Flight.model_id == model.id) == 1
+    db_session.commit()
+    assert flight.index_score == approx(799)
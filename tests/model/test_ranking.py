@@ -0,0 +1,97 @@
+from datetime import date
+
+from pytest import approx
+
+from skylines.model import Flight, RankingAggregate
+from tests.data import add_flight, clubs, users
+
+PILOT = RankingAggregate.Kind.PILOT
+CLUB = RankingAggregate.Kind.CLUB
+
+
+def rows():
+    return dict(
+        ((row.kind, row.year, row.subject_id), (row.count, row.total))
+        for row in RankingAggregate.query()
+    )
+
+
+def test_keys(db_session):
+    lva = clubs.lva()
+    john = users.john(club=lva)
+    flight = add_flight(db_session, john, "a" * 32, club=lva)
+
+    assert sorted(RankingAggregate.keys(flight)) == [
+        (PILOT, 2011, john.id),
+        (CLUB, 2011, lva.id),
+    ]
+
+    flight.privacy_level = Flight.PrivacyLevel.PRIVATE
+    assert RankingAggregate.keys(flight) == []
+
+
+def test_update(db_session):
+    john = users.john()
+    flight1 = add_flight(db_session, john, "a" * 32, olc_plus_score=100)
+    flight2 = add_flight(db_session, john, "b" * 32, olc_plus_score=50)
+
+    key = (PILOT, 2011, john.id)
+
+    RankingAggregate.update([key])
+    assert rows() == {key: (2, approx(150))}
+
+    flight2.privacy_level = Flight.PrivacyLevel.PRIVATE
+    RankingAggregate.update([key])
+    assert rows() == {key: (1, approx(100))}
+
+    # flights of other years are counted in other rows
+    flight1.date_local = date(2012, 6, 18)
+    RankingAggregate.update([key, (PILOT, 2012, john.id)])
+    assert rows() == {(PILOT, 2012, john.id): (1, approx(100))}
+
+
+def test_rebuild_and_check(db_session):
+    lva = clubs.lva()
+    john = users.john(club=lva)
+    jane = users.jane()
+    add_flight(db_session, john, "a" * 32, club=lva, olc_plus_score=100)
+    add_flight(db_session, jane, "b" * 32, olc_plus_score=None)
+    flight = add_flight(db_session, jane, "c" * 32, date_local=date(2012, 1, 1))
+
+    assert RankingAggregate.check() == sorted(
+        [
+            (PILOT, 2011, john.id),
+            (PILOT, 2011, jane.id),
+            (PILOT, 2012, jane.id),
+            (CLUB, 2011, lva.id),
+        ]
+    )
+
+    RankingAggregate.rebuild()
+    assert RankingAggregate.check() == []
+    assert rows() == {
+        (PILOT, 2011, john.id): (1, approx(100)),
+        (PILOT, 2011, jane.id): (1, None),
+        (PILOT, 2012, jane.id): (1, None),
+        (CLUB, 2011, lva.id): (1, approx(100)),
+    }
+
+    db_session.delete(flight)
+    db_session.commit()
+    assert RankingAggregate.check() == [(PILOT, 2012, jane.id)]
+
+
+def test_delete_user(db_session):
+    john = users.john()
+    jane = users.jane()
+    add_flight(db_session, john, "a" * 32, olc_plus_score=100)
+    add_flight(db_session, jane, "b" * 32, pilot=john, olc_plus_score=50)
+
+    RankingAggregate.rebuild()
+    assert rows() == {(PILOT, 2011, john.id): (2, approx(150))}
+
+    john.delete()
+    db_session.commit()
+
+    assert rows() == {}
+    assert RankingAggregate.check() == []
@@ -0,0 +1,108 @@
+from datetime import date
+
+from skylines.model import Flight, StatisticsPilot, StatisticsRollup
+from skylines.model.statistics import ALL_YEARS
+from tests.data import add_flight, clubs, users
+
+GLOBAL = StatisticsRollup.Kind.GLOBAL
+PILOT = StatisticsRollup.Kind.PILOT
+CLUB = StatisticsRollup.Kind.CLUB
+
+
+def add_counted_flight(db_session, owner, md5, **kwargs):
+    flight = add_flight(db_session, owner, md5, **kwargs)
+    StatisticsRollup.update(StatisticsRollup.keys(flight))
+    return flight
+
+
+def rows():
+    rollups = sorted(
+        (row.kind, row.subject_id, row.year, row.flights, row.pilots, row.distance)
+        for row in StatisticsRollup.query()
+    )
+
+    pilots = sorted(
+        (row.kind, row.subject_id, row.year, row.pilot_id, row.flights)
+        for row in StatisticsPilot.query()
+    )
+
+    return rollups, pilots
+
+
+def rebuilt_rows():
+    StatisticsRollup.rebuild()
+    return rows()
+
+
+def test_keys(db_session):
+    lva = clubs.lva()
+    john = users.john(club=lva)
+    flight = add_counted_flight(db_session, john, "a" * 32, club=lva)
+
+    assert sorted(StatisticsRollup.keys(flight)) == [
+        (PILOT, john.id, ALL_YEARS, john.id),
+        (PILOT, john.id, 2011, john.id),
+        (CLUB, lva.id, ALL_YEARS, john.id),
+        (CLUB, lva.id, 2011, john.id),
+        (GLOBAL, 0, ALL_YEARS, john.id),
+        (GLOBAL, 0, 2011, john.id),
+    ]
+
+    flight.privacy_level = Flight.PrivacyLevel.PRIVATE
+    assert StatisticsRollup.keys(flight) == []
+
+
+def test_update(db_session):
+    lva = clubs.lva()
+    john = users.john(club=lva)
+    jane = users.jane(club=lva)
+
+    add_counted_flight(db_session, john, "a" * 32, club=lva, olc_classic_distance=100)
+    add_counted_flight(db_session, jane, "b" * 32, club=lva, olc_classic_distance=200)
+    flight = add_counted_flight(db_session, john, "c" * 32, date_local=date(2012, 1, 1))
+    add_counted_flight(db_session, john, "d" * 32, pilot=None, pilot_name=u"Max")
+
+    updated = rows()
+    assert updated == rebuilt_rows()
+
+    rollups, pilots = updated
+    assert (GLOBAL, 0, 2011, 3, 2, 300) in rollups
+    assert (GLOBAL, 0, ALL_YEARS, 4, 2, 300) in rollups
+    assert (CLUB, lva.id, 2011, 2, 2, 300) in rollups
+
+    # move the flight to another year and pilot
+    keys = StatisticsRollup.keys(flight)
+    flight.date_local = date(2011, 5, 1)
+    flight.pilot = jane
+    db_session.flush()
+    StatisticsRollup.update(keys + StatisticsRollup.keys(flight))
+
+    updated = rows()
+    assert updated == rebuilt_rows()
+
+    rollups, pilots = updated
+    assert (GLOBAL, 0, 2011, 4, 2, 300) in rollups
+    assert not any(row[2] == 2012 for row in rollups)
+
+    # delete the flight
+    keys = StatisticsRollup.keys(flight)
+    db_session.delete(flight)
+    db_session.flush()
+    StatisticsRollup.update(keys)
+
+    assert rows() == rebuilt_rows()
+
+
+def test_delete_user(db_session):
+    john = users.john()
+    jane = users.jane()
+    add_counted_flight(db_session, john, "a" * 32)
+    add_counted_flight(db_session, jane, "b" * 32, pilot=john)
+    add_counted_flight(db_session, jane, "c" * 32)
+
+    john.delete()
+    db_session.commit()
+
+    # the flight of jane remains without pilot
+    assert rows() == rebuilt_rows()
+    assert StatisticsRollup.get((GLOBAL, 0, ALL_YEARS)).pilots == 1
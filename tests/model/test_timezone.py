@@ -5,6 +5,7 @@ from geoalchemy2.shape import from_shape
 from shapely.geometry import Polygon, MultiPolygon
 
 from skylines.model import TimeZone, Location
+from skylines.model.timezone import get_timezone, timezone_index
 
 
 @pytest.fixture
@@ -38,3 +39,38 @@ def test_by_location_returns_timezone():
 @pytest.mark.usefixtures("berlin")
 def test_by_location_returns_none_by_default():
     assert TimeZone.by_location(Location(longitude=10, latitude=10)) is None
+
+
+@pytest.mark.usefixtures("berlin")
+def test_get_timezone():
+    tz = get_timezone(Location(longitude=20, latitude=30))
+    assert tz is not None
+    assert tz.zone == "Europe/Berlin"
+
+    assert get_timezone(Location(longitude=10, latitude=10)) is None
+
+
+@pytest.mark.usefixtures("berlin")
+def test_get_timezone_without_index(app):
+    app.config["SKYLINES_TIMEZONE_INDEX"] = False
+    try:
+        tz = get_timezone(Location(longitude=20, latitude=30))
+    finally:
+        app.config["SKYLINES_TIMEZONE_INDEX"] = True
+
+    assert tz.zone == "Europe/Berlin"
+
+
+@pytest.mark.usefixtures("berlin")
+def test_get_timezone_cache(app, tmpdir):
+    # reload the index
+    timezone_index.version = None
+
+    app.config["SKYLINES_INDEX_PATH"] = str(tmpdir)
+    try:
+        tz = get_timezone(Location(longitude=20, latitude=30))
+    finally:
+        app.config["SKYLINES_INDEX_PATH"] = None
+
+    assert tz.zone == "Europe/Berlin"
+    assert [path.basename.split("-")[0] for path in tmpdir.listdir()] == ["timezones"]
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime, timedelta
+
+from skylines.model import TrackingFix, LatestTrackingFix
+
+from tests.data import users
+
+
+def add_fix(db_session, pilot, minutes_ago, delay=0, location=True):
+    fix = TrackingFix(pilot=pilot, altitude=1000)
+    fix.time = datetime.utcnow() - timedelta(minutes=minutes_ago)
+    fix.time_visible = fix.time + timedelta(minutes=delay)
+    if location:
+        fix.set_location(7.52, 52.7)
+
+    db_session.add(fix)
+    db_session.flush()
+
+    if location:
+        LatestTrackingFix.update([fix])
+
+    return fix
+
+
+def latest_fix_id(db_session, pilot):
+    return (
+        db_session.query(LatestTrackingFix.fix_id)
+        .filter(LatestTrackingFix.pilot_id == pilot.id)
+        .scalar()
+    )
+
+
+def test_update(db_session):
+    john = users.john()
+    db_session.add(john)
+
+    first = add_fix(db_session, john, 10)
+    assert latest_fix_id(db_session, john) == first.id
+
+    second = add_fix(db_session, john, 5)
+    assert latest_fix_id(db_session, john) == second.id
+
+    # fixes that arrive out of order don't replace newer fixes
+    add_fix(db_session, john, 7)
+    add_fix(db_session, john, 1, location=False)
+    assert latest_fix_id(db_session, john) == second.id
+
+
+def test_get_latest(db_session):
+    john = users.john()
+    jane = users.jane()
+    max_user = users.max()
+    db_session.add_all([john, jane, max_user])
+
+    add_fix(db_session, john, 10)
+    john_fix = add_fix(db_session, john, 5)
+
+    # the newest fix of jane is not visible yet
+    jane_fix = add_fix(db_session, jane, 8, delay=5)
+    add_fix(db_session, jane, 2, delay=5)
+
+    # the fix of max is too old
+    add_fix(db_session, max_user, 60 * 7)
+
+    db_session.commit()
+
+    assert TrackingFix.get_latest().all() == [john_fix, jane_fix]
+    assert TrackingFix.get_latest(max_age=timedelta(minutes=6)).all() == [john_fix]
@@ -28,7 +28,7 @@ def test_user_delete_deletes_user(db_session):
 @pytest.mark.usefixtures("files_folder")
 def test_user_delete_deletes_owned_igc_files(db_session):
     with open(igcs.simple_path, "rb") as f:
-        filename = files.add_file("simple.igc", f)
+        filename, md5 = files.add_file("simple.igc", f)
 
     assert filename is not None
     assert os.path.isfile(files.filename_to_path(filename))
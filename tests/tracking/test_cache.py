@@ -0,0 +1,116 @@
+from mock import patch
+from redis.exceptions import TimeoutError
+
+from skylines.tracking.cache import (
+    PilotCache,
+    CachedPilot,
+    INVALIDATION_CHANNEL,
+    invalidate_tracking_keys,
+)
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def create_cache(**kwargs):
+    pilots = {
+        1: CachedPilot(id=10, name=u"John Doe", club_id=None, tracking_delay=0),
+        2: CachedPilot(id=20, name=u"Jane Doe", club_id=5, tracking_delay=2),
+        3: CachedPilot(id=30, name=u"Max Mustermann", club_id=5, tracking_delay=0),
+    }
+
+    loaded = []
+
+    def load(key):
+        loaded.append(key)
+        return pilots.get(key)
+
+    cache = PilotCache(load=load, **kwargs)
+    return cache, loaded
+
+
+def test_hit_and_miss():
+    cache, loaded = create_cache()
+
+    assert cache.get(1).name == u"John Doe"
+    assert cache.get(1).name == u"John Doe"
+    assert loaded == [1]
+
+    assert cache.stats() == dict(size=1, hits=1, misses=1, evictions=0)
+
+
+def test_unknown_keys_are_cached():
+    cache, loaded = create_cache()
+
+    assert cache.get(42) is None
+    assert cache.get(42) is None
+    assert loaded == [42]
+
+
+def test_ttl():
+    clock = FakeClock()
+    cache, loaded = create_cache(ttl=60, clock=clock)
+
+    cache.get(1)
+    clock.now += 59
+    cache.get(1)
+    assert loaded == [1]
+
+    clock.now += 2
+    cache.get(1)
+    assert loaded == [1, 1]
+
+
+def test_lru_eviction():
+    cache, loaded = create_cache(max_size=2)
+
+    cache.get(1)
+    cache.get(2)
+    cache.get(1)
+    cache.get(3)
+
+    assert len(cache) == 2
+    assert cache.stats()["evictions"] == 1
+
+    # 2 was the least recently used entry
+    cache.get(1)
+    cache.get(2)
+    assert loaded == [1, 2, 3, 2]
+
+
+def test_invalidate():
+    cache, loaded = create_cache()
+
+    cache.get(1)
+    cache.get(2)
+    cache.invalidate(1)
+    cache.invalidate(42)
+    cache.get(1)
+    cache.get(2)
+    assert loaded == [1, 2, 1]
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_invalidate_tracking_keys_redis_error(app):
+    url = app.config.get("SKYLINES_TRACKING_REDIS_URL")
+    app.config["SKYLINES_TRACKING_REDIS_URL"] = "redis://localhost:6379/0"
+    try:
+        with app.app_context(), patch("skylines.tracking.cache.StrictRedis") as redis:
+            redis.from_url.return_value.publish.side_effect = TimeoutError()
+
+            # the change has already been committed, so errors are only logged
+            invalidate_tracking_keys(123, None)
+
+            redis.from_url.return_value.publish.assert_called_once_with(
+                INVALIDATION_CHANNEL, 123
+            )
+
+    finally:
+        app.config["SKYLINES_TRACKING_REDIS_URL"] = url
@@ -0,0 +1,119 @@
+import struct
+from datetime import datetime
+
+from skylines.tracking import protocol
+from skylines.tracking.crc import set_crc, check_crc
+
+
+def test_decode_header():
+    message = set_crc(struct.pack("!IHHQHHI", protocol.MAGIC, 0, 1, 0x1234, 42, 0, 0))
+
+    assert protocol.decode_header(message) == (protocol.TYPE_PING, 0x1234)
+    assert protocol.decode_ping(message) == 42
+
+
+def test_decode_invalid_header():
+    message = set_crc(struct.pack("!IHHQHHI", protocol.MAGIC, 0, 1, 0x1234, 42, 0, 0))
+
+    assert protocol.decode_header(message[:15]) is None
+    assert protocol.decode_header(message[:-1] + b"\x01") is None
+    assert protocol.decode_header(set_crc(b"\0" * 4 + message[4:])) is None
+
+
+def test_decode_fix():
+    message = set_crc(
+        struct.pack(
+            "!IHHQIIiiIHHHhhH",
+            protocol.MAGIC,
+            0,
+            protocol.TYPE_FIX,
+            0x1234,
+            protocol.FLAG_LOCATION | protocol.FLAG_ALTITUDE,
+            45296000,
+            52700000,
+            7520000,
+            0,
+            234,
+            532,
+            512,
+            1234,
+            -576,
+            10,
+        )
+    )
+
+    assert protocol.decode_fix(message) == (
+        protocol.FLAG_LOCATION | protocol.FLAG_ALTITUDE,
+        45296000,
+        52700000,
+        7520000,
+        0,
+        234,
+        532,
+        512,
+        1234,
+        -576,
+        10,
+    )
+
+    assert protocol.decode_fix(message[:-1]) is None
+    assert protocol.decode_ping(message) is None
+
+
+def test_encode_ack():
+    expected = set_crc(
+        struct.pack("!IHHQHHI", protocol.MAGIC, 0, protocol.TYPE_ACK, 0, 42, 0, 0x1)
+    )
+
+    assert protocol.encode_ack(42, 0x1) == expected
+
+
+def test_encode_traffic_response():
+    records = [
+        protocol.encode_traffic(
+            1, datetime(2019, 5, 1, 12, 34, 56, 789000), 52.7, 7.52, 1000
+        ),
+        protocol.encode_traffic(2, datetime(2019, 5, 1, 1, 2, 3), -33.5, -70.25, -10),
+    ]
+
+    response = protocol.encode_traffic_response(records)
+    assert check_crc(response)
+
+    expected = struct.pack(
+        "!IHHQ", protocol.MAGIC, 0, protocol.TYPE_TRAFFIC_RESPONSE, 0
+    )
+    expected += struct.pack("!HBBI", 0, 0, 2, 0)
+    expected += struct.pack("!IIiihHI", 1, 45296789, 52700000, 7520000, 1000, 0, 0)
+    expected += struct.pack("!IIiihHI", 2, 3723000, -33500000, -70250000, -10, 0, 0)
+    assert response == set_crc(expected)
+
+    assert len(protocol.encode_traffic_response([])) == 24
+
+
+def test_encode_user_name_response():
+    response = protocol.encode_user_name_response(42, club_id=5, name=b"John Doe")
+    assert check_crc(response)
+
+    expected = struct.pack(
+        "!IHHQIIIBBBBII",
+        protocol.MAGIC,
+        0,
+        protocol.TYPE_USER_NAME_RESPONSE,
+        0,
+        42,
+        0,
+        5,
+        8,
+        0,
+        0,
+        0,
+        0,
+        0,
+    )
+    assert response == set_crc(expected + b"John Doe")
+
+    response = protocol.encode_user_name_response(
+        42, flags=protocol.USER_FLAG_NOT_FOUND
+    )
+    assert len(response) == 40
+    assert struct.unpack_from("!IIIB", response, 16) == (42, 1, 0, 0)
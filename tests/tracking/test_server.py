@@ -2,11 +2,12 @@ import pytest
 from mock import Mock, patch
 
 from skylines.database import db
-from skylines.model import TrackingFix
+from skylines.model import TrackingFix, LatestTrackingFix
 
 import struct
-from skylines.tracking import server as _server
+from skylines.tracking import server as _server, writer as _writer
 from skylines.tracking.crc import set_crc, check_crc
+from tests.data import users
 from datetime import datetime, timedelta
 from sqlalchemy.exc import SQLAlchemyError
 
@@ -17,7 +18,7 @@ HOST_PORT = ("127.0.0.1", 5597)
 def server(app, db_session):
     _server.TrackingServer.__init__ = Mock(return_value=None)
     server = _server.TrackingServer()
-    server.app = app
+    server.init_app(app)
     yield server
     TrackingFix.query().delete()
 
@@ -107,6 +108,45 @@ def test_ping_with_key(server, test_user):
     assert server.socket.sendto.called
 
 
+def test_ping_with_cached_key(server, test_user, db_session):
+    """ Tracking server caches tracking key lookups until invalidated """
+
+    ping_id = 42
+    message = struct.pack(
+        "!IHHQHHI",
+        _server.MAGIC,
+        0,
+        _server.TYPE_PING,
+        test_user.tracking_key,
+        ping_id,
+        0,
+        0,
+    )
+    message = set_crc(message)
+
+    server.socket = Mock()
+
+    def get_flags():
+        server.handle(message, HOST_PORT)
+        data = server.socket.sendto.call_args[0][0]
+        ping_id2, _, flags = struct.unpack("!HHI", data[16:])
+        return flags
+
+    assert not (get_flags() & _server.FLAG_ACK_BAD_KEY)
+
+    old_key = test_user.tracking_key
+    test_user.generate_tracking_key()
+    db_session.commit()
+
+    # the old key is still cached...
+    assert not (get_flags() & _server.FLAG_ACK_BAD_KEY)
+    assert server.pilots.stats()["hits"] == 1
+
+    # ... until the server is told that it has changed
+    server.pilots.invalidate(old_key)
+    assert get_flags() & _server.FLAG_ACK_BAD_KEY
+
+
 def create_fix_message(
     tracking_key,
     time,
@@ -193,6 +233,7 @@ def test_empty_tracking_key(server):
 
     # Send fake ping message
     server.handle(message, HOST_PORT)
+    server.fix_writer.flush()
 
     # Check if the message was properly received
     assert TrackingFix.query().count() == 0
@@ -216,6 +257,8 @@ def test_empty_fix(server, test_user):
         # Send fake ping message
         server.handle(message, HOST_PORT)
 
+    server.fix_writer.flush()
+
     # Check if the message was properly received and written to the database
     fixes = TrackingFix.query().all()
 
@@ -268,6 +311,8 @@ def test_real_fix(server, test_user):
         # Send fake ping message
         server.handle(message, HOST_PORT)
 
+    server.fix_writer.flush()
+
     # Check if the message was properly received and written to the database
     fixes = TrackingFix.query().all()
 
@@ -302,6 +347,228 @@ def test_failing_fix(server, test_user):
         # Send fake ping message
         server.handle(message, HOST_PORT)
 
+        server.fix_writer.flush()
+
     # Check if the message was properly received
     assert TrackingFix.query().count() == 0
     assert commitmock.called
+    assert server.fix_writer.failed == 1
+
+
+def test_failing_elevation(server, test_user):
+    """ Tracking server handles other errors of a batch gracefully """
+
+    now = datetime.utcnow()
+    now_s = ((now.hour * 60) + now.minute) * 60 + now.second
+
+    elevation = Mock(side_effect=IOError())
+    with patch.object(_writer.Elevation, "by_location", elevation):
+        message = create_fix_message(
+            test_user.tracking_key, now_s * 1000, latitude=52.7, longitude=7.52
+        )
+        server.handle(message, HOST_PORT)
+
+        server.fix_writer.flush()
+
+    assert elevation.called
+    assert TrackingFix.query().count() == 0
+    assert server.fix_writer.failed == 1
+
+    # the following batches are written again
+    message = create_fix_message(test_user.tracking_key, now_s * 1000)
+    server.handle(message, HOST_PORT)
+    server.fix_writer.flush()
+
+    assert TrackingFix.query().count() == 1
+
+
+def test_batched_fixes(server, test_user):
+    """ Tracking server writes queued fixes in batches """
+
+    now = datetime.utcnow()
+    now_s = ((now.hour * 60) + now.minute) * 60 + now.second
+
+    server.fix_writer.batch_size = 2
+
+    for i in range(3):
+        message = create_fix_message(
+            test_user.tracking_key,
+            (now_s - 10 + i) * 1000,
+            latitude=52.7,
+            longitude=7.52,
+            altitude=1000 + i,
+        )
+        server.handle(message, HOST_PORT)
+
+    assert len(server.fix_writer) == 3
+    assert TrackingFix.query().count() == 0
+
+    server.fix_writer.flush()
+
+    assert len(server.fix_writer) == 0
+    assert server.fix_writer.written == 3
+
+    fixes = TrackingFix.query().order_by(TrackingFix.time).all()
+    assert [fix.altitude for fix in fixes] == [1000, 1001, 1002]
+    assert all(fix.pilot_id == test_user.id for fix in fixes)
+
+    latest = LatestTrackingFix.get(test_user.id)
+    assert latest.fix_id == fixes[-1].id
+    assert latest.time == fixes[-1].time
+
+
+def test_full_queue(server, test_user):
+    """ Tracking server drops fixes if the queue is full """
+
+    now = datetime.utcnow()
+    now_s = ((now.hour * 60) + now.minute) * 60 + now.second
+
+    server.fix_writer.max_size = 1
+    server.fix_writer.timeout = 0
+
+    for i in range(2):
+        message = create_fix_message(test_user.tracking_key, (now_s - 10 + i) * 1000)
+        server.handle(message, HOST_PORT)
+
+    assert len(server.fix_writer) == 1
+    assert server.fix_writer.dropped == 1
+
+
+def test_traffic_near(server, test_user, db_session):
+    """ Tracking server answers traffic requests for nearby pilots """
+
+    john = users.john(tracking_key=654321, tracking_delay=0)
+    jane = users.jane(tracking_key=765432, tracking_delay=0)
+    db_session.add_all([john, jane])
+    db_session.commit()
+
+    now = datetime.utcnow()
+    now_s = ((now.hour * 60) + now.minute) * 60 + now.second
+
+    for key, latitude, longitude in [
+        (test_user.tracking_key, 52.7, 7.52),
+        (john.tracking_key, 52.8, 7.6),
+        (jane.tracking_key, 48.1, 11.5),
+    ]:
+        message = create_fix_message(
+            key,
+            (now_s - 10) * 1000,
+            latitude=latitude,
+            longitude=longitude,
+            altitude=1000,
+        )
+        server.handle(message, HOST_PORT)
+
+    message = struct.pack(
+        "!IHHQII",
+        _server.MAGIC,
+        0,
+        _server.TYPE_TRAFFIC_REQUEST,
+        test_user.tracking_key,
+        _server.TRAFFIC_FLAG_NEAR,
+        0,
+    )
+
+    server.socket = Mock()
+    server.handle(set_crc(message), HOST_PORT)
+
+    data = server.socket.sendto.call_args[0][0]
+    assert check_crc(data)
+
+    header = struct.unpack("!IHHQ", data[:16])
+    assert header[2] == _server.TYPE_TRAFFIC_RESPONSE
+
+    _, _, count, _ = struct.unpack("!HBBI", data[16:24])
+    assert count == 1
+
+    pilot_id, _, latitude, longitude, altitude, _, _ = struct.unpack(
+        "!IIiihHI", data[24:]
+    )
+    assert pilot_id == john.id
+    assert latitude == 52800000
+    assert longitude == 7600000
+    assert altitude == 1000
+
+
+def test_load_traffic(server, db_session):
+    """ Tracking server loads the traffic index from the database """
+
+    john = users.john(tracking_key=654321, tracking_delay=0)
+    db_session.add(john)
+    db_session.commit()
+
+    now = datetime.utcnow()
+    now_s = ((now.hour * 60) + now.minute) * 60 + now.second
+
+    message = create_fix_message(
+        john.tracking_key, (now_s - 10) * 1000, latitude=52.8, longitude=7.6
+    )
+    server.handle(message, HOST_PORT)
+    server.fix_writer.flush()
+
+    server.traffic = _server.TrafficIndex()
+    server.load_traffic()
+
+    assert [fix.pilot_id for fix in server.traffic.get([john.id], now)] == [john.id]
+    assert server.traffic_loaded is not None
+
+    # only the fixes that became visible since the previous call are loaded
+    assert len(server.query_traffic()) == 1
+    assert server.query_traffic(visible_since=now + timedelta(seconds=1)) == []
+
+
+def test_stats(server, test_user):
+    """ Tracking server reports the state of its caches and queues """
+
+    now = datetime.utcnow()
+    now_s = ((now.hour * 60) + now.minute) * 60 + now.second
+
+    message = create_fix_message(
+        test_user.tracking_key, now_s * 1000, latitude=52.7, longitude=7.52
+    )
+    server.handle(message, HOST_PORT)
+
+    stats = server.stats()
+    assert stats["pilots"]["misses"] == 1
+    assert stats["fixes"]["queued"] == 1
+    assert stats["fixes"]["written"] == 0
+
+    server.fix_writer.flush()
+
+    stats = server.stats()
+    assert stats["fixes"]["queued"] == 0
+    assert stats["fixes"]["written"] == 1
+    assert stats["fixes"]["write_time"]["count"] == 1
+
+
+def test_packet_stats(server, test_user):
+    """ Tracking server counts the received packets by type """
+
+    server.socket = Mock()
+
+    message = struct.pack("!IHHQHHI", _server.MAGIC, 0, _server.TYPE_PING, 0, 1, 0, 0)
+    server.handle(set_crc(message), HOST_PORT)
+
+    # bad checksum
+    server.handle(message, HOST_PORT)
+
+    # not a SkyLines packet at all
+    server.handle(b"GET / HTTP/1.0", HOST_PORT)
+
+    stats = server.stats()
+    assert stats["packets"] == dict(ping=1, unknown_key=1, bad_crc=1, invalid=1)
+    assert stats["latency"]["ping"]["count"] == 1
+
+
+def test_log_rate(server, test_user):
+    """ Tracking server logs only the sampled packets """
+
+    server.socket = Mock()
+    server.log_rate = 0
+
+    message = struct.pack("!IHHQHHI", _server.MAGIC, 0, _server.TYPE_PING, 0, 1, 0, 0)
+
+    with patch.object(_server, "log") as log:
+        server.handle(set_crc(message), HOST_PORT)
+
+    assert not log.called
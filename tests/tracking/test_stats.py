@@ -0,0 +1,81 @@
+import json
+import socket
+
+from skylines.tracking.stats import (
+    Histogram,
+    Metrics,
+    http_response,
+    listen,
+    parse_address,
+    serve_request,
+)
+from skylines.tracking.supervisor import merge_stats
+
+
+def test_histogram():
+    histogram = Histogram(buckets=(1, 10))
+    histogram.add(0.5)
+    histogram.add(1)
+    histogram.add(5)
+    histogram.add(50)
+
+    assert histogram.as_dict() == dict(
+        count=4, sum=56.5, buckets={"1": 2, "10": 1, "inf": 1}
+    )
+
+
+def test_merge_histograms():
+    first = Histogram()
+    first.add(3)
+    second = Histogram()
+    second.add(4)
+    second.add(2000)
+
+    total = merge_stats(merge_stats({}, first.as_dict()), second.as_dict())
+    assert total["count"] == 3
+    assert total["buckets"]["5"] == 2
+    assert total["buckets"]["inf"] == 1
+
+
+def test_metrics():
+    metrics = Metrics()
+    metrics.incr("fix")
+    metrics.incr("fix")
+    metrics.add("fix", 0.3)
+
+    assert metrics.counters == dict(fix=2)
+    assert metrics.histograms["fix"].count == 1
+
+
+def test_parse_address():
+    assert parse_address("127.0.0.1:5598") == ("127.0.0.1", 5598)
+    assert parse_address(":5598") == ("", 5598)
+
+
+def test_http_response():
+    response = http_response(dict(fix=1))
+
+    header, body = response.split(b"\r\n\r\n")
+    assert header.startswith(b"HTTP/1.0 200 OK\r\n")
+    assert b"Content-Length: 10" in header
+    assert json.loads(body.decode("utf8")) == dict(fix=1)
+
+
+def test_serve_request():
+    listener = listen(("127.0.0.1", 0))
+
+    client = socket.create_connection(listener.getsockname())
+    client.sendall(b"GET / HTTP/1.0\r\n\r\n")
+
+    serve_request(listener, dict(fix=1))
+
+    response = b""
+    data = client.recv(4096)
+    while data:
+        response += data
+        data = client.recv(4096)
+
+    assert response.endswith(b'{"fix": 1}')
+
+    client.close()
+    listener.close()
@@ -0,0 +1,22 @@
+from skylines.tracking.supervisor import merge_stats, reuseport_socket
+
+
+def test_merge_stats():
+    total = {}
+    merge_stats(total, dict(pilots=dict(hits=1, misses=2), fixes=dict(written=3)))
+    merge_stats(total, dict(pilots=dict(hits=4), traffic=dict(pilots=5)))
+
+    assert total == dict(
+        pilots=dict(hits=5, misses=2), fixes=dict(written=3), traffic=dict(pilots=5)
+    )
+
+
+def test_reuseport_socket():
+    first = reuseport_socket("127.0.0.1", 0)
+    port = first.getsockname()[1]
+
+    second = reuseport_socket("127.0.0.1", port)
+    assert second.getsockname()[1] == port
+
+    first.close()
+    second.close()
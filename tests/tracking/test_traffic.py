@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+
+from skylines.tracking.traffic import TrafficIndex, create_traffic_fix
+
+NOW = datetime(2019, 5, 1, 12, 0, 0)
+
+
+def create_fix(pilot_id, minutes_ago=0, delay=0, club_id=None, lat=52.7, lon=7.52):
+    time = NOW - timedelta(minutes=minutes_ago)
+    return create_traffic_fix(
+        pilot_id, club_id, time, time + timedelta(minutes=delay), lat, lon, 1000
+    )
+
+
+def pilot_ids(fixes):
+    return sorted(fix.pilot_id for fix in fixes)
+
+
+def test_get():
+    index = TrafficIndex()
+    index.add(create_fix(1, minutes_ago=5), NOW)
+    index.add(create_fix(2, minutes_ago=1), NOW)
+
+    assert pilot_ids(index.get([1, 2, 3], NOW)) == [1, 2]
+    assert len(index) == 2
+
+
+def test_latest_fix():
+    index = TrafficIndex()
+    newest = create_fix(1, minutes_ago=1, lat=53.0)
+    index.add(newest, NOW)
+    index.add(create_fix(1, minutes_ago=5), NOW)
+
+    assert index.get([1], NOW) == [newest]
+    assert index.near(52.7, 7.52, 1000, NOW) == []
+    assert index.near(53.0, 7.52, 1000, NOW) == [newest]
+
+
+def test_tracking_delay():
+    index = TrafficIndex()
+    visible = create_fix(1, minutes_ago=10, delay=5)
+    hidden = create_fix(1, minutes_ago=2, delay=5)
+    index.add(visible, NOW)
+    index.add(hidden, NOW)
+
+    assert index.get([1], NOW) == [visible]
+    assert index.position(1) == hidden
+
+    assert index.get([1], NOW + timedelta(minutes=3)) == [hidden]
+
+
+def test_club():
+    index = TrafficIndex()
+    index.add(create_fix(1, club_id=10), NOW)
+    index.add(create_fix(2, club_id=10), NOW)
+    index.add(create_fix(3, club_id=11), NOW)
+    index.add(create_fix(4), NOW)
+
+    assert pilot_ids(index.club(10, NOW)) == [1, 2]
+
+    # pilot 2 changed the club
+    index.add(create_fix(2, club_id=11), NOW)
+
+    assert pilot_ids(index.club(10, NOW)) == [1]
+    assert pilot_ids(index.club(11, NOW)) == [2, 3]
+
+
+def test_near():
+    index = TrafficIndex()
+    index.add(create_fix(1, lat=52.7, lon=7.52), NOW)
+    index.add(create_fix(2, lat=52.8, lon=7.6), NOW)
+    index.add(create_fix(3, lat=52.7, lon=8.4), NOW)
+    index.add(create_fix(4, lat=48.1, lon=11.5), NOW)
+
+    assert pilot_ids(index.near(52.7, 7.52, 20000, NOW)) == [1, 2]
+    assert pilot_ids(index.near(52.7, 7.52, 100000, NOW)) == [1, 2, 3]
+
+
+def test_max_age():
+    index = TrafficIndex(max_age=timedelta(hours=2))
+    index.add(create_fix(1, minutes_ago=60), NOW)
+    index.add(create_fix(2, minutes_ago=10), NOW)
+
+    later = NOW + timedelta(hours=1, minutes=30)
+    assert pilot_ids(index.get([1, 2], later)) == [2]
+    assert pilot_ids(index.near(52.7, 7.52, 1000, later)) == [2]
+    assert index.position(1) is None
+    assert len(index) == 1
+
+
+def test_pending_fixes():
+    index = TrafficIndex()
+    for minutes_ago in range(10, 0, -1):
+        index.add(create_fix(1, minutes_ago=minutes_ago, delay=5), NOW)
+
+    # the same fixes loaded again from the database are ignored
+    for minutes_ago in range(10, 0, -1):
+        index.add(create_fix(1, minutes_ago=minutes_ago, delay=5), NOW)
+
+    assert index.get([1], NOW)[0].time == NOW - timedelta(minutes=5)
+    assert len(index._heap) == 1
+    assert len(index._pending[1]) == 4
+
+    # the due fixes are published by `add()` without any traffic requests
+    index.add(create_fix(2), NOW + timedelta(minutes=5))
+
+    assert 1 not in index._pending
+    assert index._heap == []
+
+
+def test_expire_pending_fixes():
+    index = TrafficIndex(max_age=timedelta(hours=2))
+    index.add(create_fix(1, minutes_ago=10, delay=24 * 60), NOW)
+
+    index.update(NOW + timedelta(hours=3))
+    assert index._pending == {}
+    assert index.position(1) is None
+
+
+def test_near_antimeridian():
+    index = TrafficIndex()
+    index.add(create_fix(1, lat=-17.0, lon=179.9), NOW)
+    index.add(create_fix(2, lat=-17.0, lon=-179.9), NOW)
+    index.add(create_fix(3, lat=-17.0, lon=178.0), NOW)
+
+    assert pilot_ids(index.near(-17.0, 179.95, 20000, NOW)) == [1, 2]
+    assert pilot_ids(index.near(-17.0, -179.95, 20000, NOW)) == [1, 2]